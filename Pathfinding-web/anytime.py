@@ -0,0 +1,193 @@
+import heapq
+import time
+
+# Expansions between two deadline checks
+DEADLINE_CHECK_INTERVAL = 256
+
+
+class AnytimeSearch:
+    """
+    Anytime Repairing A* (ARA*) over a SearchGrid, for answers within a time budget.
+
+    The first round is a weighted A* with an inflated heuristic (epsilon > 1), which finds a path
+    quickly. Each following round lowers epsilon and repairs the previous search instead of starting
+    over, until epsilon reaches 1 and the path is optimal. Every finished round gives a path together
+    with a bound on how far its cost can be above the optimum. The heuristic is the octile lower bound
+    of SearchGrid.lower_bound, so the bounds are guaranteed.
+    """
+
+    def __init__(self, search_grid, initial_epsilon=3.0, epsilon_step=0.5):
+        sg = search_grid
+        self.search_grid = sg
+        self.initial_epsilon = initial_epsilon
+        self.epsilon_step = epsilon_step
+        self.passable = sg.passable.tolist()
+        self.moves = [(offset, entry.tolist()) for offset, entry in sg.moves]
+        self.vertical = sg.vertical_cost.tolist()
+        self.stair_links = sg.stair_links
+
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.nodes_updated = 0
+        self.reopened = 0
+        self.max_open_size = 0
+        self.heuristic_calls = 0
+        self.heuristic_time = 0.0
+        self.completed = False
+
+    def search(self, start, goals, time_budget):
+        """
+        Best path found within the time budget.
+
+        :param start: (x, y, z) start position
+        :param goals: List of (x, y, z) goal positions
+        :param time_budget: Seconds the search may take
+        :return: (path, cost, bound): bound is the factor by which the cost may exceed the optimum
+                 (1.0 when optimal). (None, None, None) if no path was found in time or none exists;
+                 self.completed tells the two apart.
+        """
+        best = (None, None, None)
+        for solution in self.solutions(start, goals, time.perf_counter() + time_budget):
+            best = solution
+        return best
+
+    def solutions(self, start, goals, deadline=None):
+        """
+        Generator of (path, cost, bound) for every improved solution, until the path is optimal or
+        the deadline (a time.perf_counter() value) passes. self.completed is True if the search
+        finished: either optimal or no goal reachable.
+        """
+        sg = self.search_grid
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.nodes_updated = 0
+        self.reopened = 0
+        self.max_open_size = 0
+        self.heuristic_calls = 0
+        self.heuristic_time = 0.0
+        self.completed = False
+        goals = [tuple(goal) for goal in goals if sg.contains(goal)]
+        if not sg.contains(start) or not goals:
+            self.completed = True
+            return
+        goal_indices = {sg.index(goal) for goal in goals}
+
+        h_cache = {}
+
+        def h(index):
+            value = h_cache.get(index)
+            if value is None:
+                started = time.perf_counter()
+                p = sg.position(index)
+                value = min(sg.lower_bound(p, goal) for goal in goals)
+                h_cache[index] = value
+                self.heuristic_calls += 1
+                self.heuristic_time += time.perf_counter() - started
+            return value
+
+        start_index = sg.index(start)
+        g = {start_index: 0.0}
+        parent = {start_index: None}
+        epsilon = self.initial_epsilon
+        open_set = {start_index}
+        inconsistent = set()
+        best_goal = start_index if start_index in goal_indices else None
+        last_cost = None
+
+        while True:
+            open_list = [(g[s] + epsilon * h(s), s) for s in open_set]
+            heapq.heapify(open_list)
+            closed = set()
+            timed_out = not self.improve_path(open_list, open_set, closed, inconsistent, g, parent, h, epsilon,
+                                              goal_indices, deadline)
+            for s in goal_indices:
+                if s in g and (best_goal is None or g[s] < g[best_goal]):
+                    best_goal = s
+            if timed_out:
+                if last_cost is None and best_goal is not None:
+                    # Unfinished first round: the path is valid but comes without a bound
+                    path = self.reconstruct_path(best_goal, parent)
+                    yield path, self.path_cost(path), None
+                return
+            if best_goal is None:
+                # Nothing left to expand and no goal reached
+                self.completed = True
+                return
+
+            # The parent chain can be cheaper than g, when a parent improved after its child was reached
+            path = self.reconstruct_path(best_goal, parent)
+            cost = self.path_cost(path)
+            remaining = open_set | inconsistent
+            lower = min((g[s] + h(s) for s in remaining), default=float('inf'))
+            bound = max(1.0, min(epsilon, cost / lower)) if lower > 0 else epsilon
+            if last_cost is None or cost < last_cost or bound == 1.0:
+                last_cost = cost
+                yield path, cost, bound
+            if bound <= 1.0 or epsilon <= 1.0:
+                self.completed = True
+                return
+
+            epsilon = max(1.0, epsilon - self.epsilon_step)
+            open_set |= inconsistent
+            inconsistent = set()
+
+    def improve_path(self, open_list, open_set, closed, inconsistent, g, parent, h, epsilon, goal_indices, deadline):
+        """One ARA* round; returns False if the deadline passed before the round finished."""
+        passable = self.passable
+        goal_cost = min((g[s] for s in goal_indices if s in g), default=float('inf'))
+        while open_list:
+            key, s = open_list[0]
+            if goal_cost <= key:
+                return True
+            heapq.heappop(open_list)
+            if s not in open_set or key != g[s] + epsilon * h(s):
+                continue  # Stale entry
+            open_set.discard(s)
+            closed.add(s)
+            self.nodes_expanded += 1
+            if deadline is not None and self.nodes_expanded % DEADLINE_CHECK_INTERVAL == 0 and \
+                    time.perf_counter() > deadline:
+                return False
+
+            d = g[s]
+            successors = [(s + offset, entry[s + offset]) for offset, entry in self.moves if passable[s + offset]]
+            successors += [(other, self.vertical[other]) for other in self.stair_links.get(s, ())]
+            for t, cost in successors:
+                nd = d + cost
+                if nd < g.get(t, float('inf')):
+                    g[t] = nd
+                    parent[t] = s
+                    if t in goal_indices and nd < goal_cost:
+                        goal_cost = nd
+                    if t in closed:
+                        self.reopened += 1
+                        inconsistent.add(t)
+                    else:
+                        if t in open_set:
+                            self.nodes_updated += 1
+                        open_set.add(t)
+                        self.nodes_pushed += 1
+                        heapq.heappush(open_list, (nd + epsilon * h(t), t))
+            self.max_open_size = max(self.max_open_size, len(open_set))
+        return True
+
+    def path_cost(self, path):
+        sg = self.search_grid
+        cost = 0.0
+        for a, b in zip(path, path[1:]):
+            index = sg.index(b)
+            if a[2] != b[2]:
+                cost += float(sg.vertical_cost[index])
+            elif a[0] != b[0] and a[1] != b[1]:
+                cost += float(sg.diagonal_cost[index])
+            else:
+                cost += float(sg.straight_cost[index])
+        return cost
+
+    def reconstruct_path(self, index, parent):
+        sg = self.search_grid
+        path = []
+        while index is not None:
+            path.append(sg.position(index))
+            index = parent[index]
+        return path[::-1]
@@ -1,6 +1,11 @@
+import gzip
+import hashlib
 import subprocess
+import time
 import sys
 import threading
+from collections import OrderedDict
+from contextlib import nullcontext
 
 import ifcopenshell
 from flask import Flask, render_template, request, jsonify, Response, session
@@ -10,10 +15,28 @@ import json
 from ifc_processor import create_navigation_grid, calculate_bounding_box_and_floors, create_faux_3d_grid, all_types, \
     process_element, trim_and_pad_grids
 from grid_editor import InteractiveGridEditor
-import pathfinder
 from pathfinder import InteractiveBIMPathfinder
+from anytime import AnytimeSearch
+from cost_profiles import COST_PROFILES, UnknownCostProfile, cost_profile
+from distance_field import DistanceFieldCache
+from evacuation import EvacuationSimulation, random_agents
+from exits import find_exits
+from grid_codec import InvalidGridPayload, decode_grids, encode_grids
+from grid_store import GridStore, VersionConflict
+from heuristics import HeuristicMapCache
+from landmarks import LandmarkCache
+from path_cache import PathResultCache
+from rectangles import RectangleGraphCache
+from search_grid import encode_grid, grid_fingerprint
+from search_stats import SearchStats, StatsAggregator
+from waypoints import WaypointCompressor
 import numpy as np
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 app = Flask(__name__)
 app.secret_key = '1234'
 
@@ -25,6 +48,76 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 # Ensure the upload folder exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Distance fields toward recurring goal sets (e.g. the building exits), shared by all requests
+distance_fields = DistanceFieldCache(maxsize=16)
+# Per-goal distance fields of inspection tours, so a tour through the same points again needs no search
+tour_fields = DistanceFieldCache(maxsize=64)
+# Heuristic overlays per grid version, goal set, floor and heuristic options
+heuristic_maps = HeuristicMapCache(maxsize=16)
+# Last room/door abstraction per grid shape and cost options, for HPA* queries (see keep_search_state)
+hierarchies = OrderedDict()
+# Rectangle decompositions per grid version and cost options, for Rectangles queries
+rectangle_graphs = RectangleGraphCache(maxsize=8)
+# Landmark fields of the 'alt' heuristic style per grid version and cost options
+landmark_fields = LandmarkCache(maxsize=4)
+# Last D* Lite search state per grid shape and cost options, repaired by the next query after an edit
+incremental_planners = OrderedDict()
+# Most search states kept in hierarchies and in incremental_planners, the least recently used go first
+MAX_SEARCH_STATES = 8
+search_states_lock = threading.Lock()
+# Results of recent /find-path queries, so repeated clicks with the same query are answered directly
+path_results = PathResultCache(maxsize=128)
+# Grids of the buildings being edited, so requests can reference them by id instead of re-posting them
+grid_sessions = GridStore(maxsize=8)
+# Search counters and phase timings of all /find-path queries, per algorithm
+search_counters = StatsAggregator()
+
+
+def keep_search_state(states, key, state):
+    """
+    Put back a search state taken out with states.pop(key) for the next query with the same key. A state is
+    taken out while a search changes it, so concurrent requests never share one.
+    """
+    with search_states_lock:
+        states[key] = state
+        states.move_to_end(key)
+        while len(states) > MAX_SEARCH_STATES:
+            states.popitem(last=False)
+
+
+def request_grids(data):
+    # Grids arrive either as nested lists of element types or as a run-length encoded payload
+    if isinstance(data['grids'], dict):
+        return decode_grids(data['grids'])
+    return [np.array(grid, dtype=object) for grid in data['grids']]
+
+
+def grids_payload(grids, grid_format='json'):
+    if grid_format == 'rle':
+        return encode_grids(grids)
+    return [np.asarray(grid).tolist() for grid in grids]
+
+
+def compact_response(payload):
+    """JSON response with an ETag and gzip or brotli compression, as accepted by the client."""
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            response = Response(brotli.compress(body), content_type='application/json')
+            response.headers['Content-Encoding'] = 'br'
+        elif accepted['gzip']:
+            response = Response(gzip.compress(body, compresslevel=6), content_type='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(body, content_type='application/json')
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -44,16 +137,49 @@ def expand_mask(mask):
 @app.route('/apply-wall-buffer', methods=['POST'])
 def apply_wall_buffer_route():
     data = request.json
-    pathfinder.grids = data['grids']
-    pathfinder.wall_buffer = data['wall_buffer']
-    buffered_grids = pathfinder.apply_wall_buffer()
-    return jsonify({'buffered_grids': [grid.tolist() for grid in buffered_grids]})
+    grid_session = grid_sessions.get(data['session_id'])
+    if grid_session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    with grid_session.lock:
+        buffered_cells = grid_session.set_wall_buffer(data['wall_buffer'])
+    return jsonify({'version': grid_session.version, 'buffered_cells': buffered_cells})
 
-@app.route('/update-buffer', methods=['POST'])
-def update_buffer():
+
+@app.route('/sessions', methods=['POST'])
+def create_session():
     data = request.json
-    updated_floor = pathfinder.update_buffer_for_cells(data['floor'], data['affected_cells'], data['wall_buffer'])
-    return jsonify({'updated_floor': updated_floor.tolist()})
+    grid_session = grid_sessions.create(request_grids(data), data['grid_size'], data['floors'], data['bbox'])
+    return jsonify({'session_id': grid_session.session_id, 'version': grid_session.version})
+
+
+@app.route('/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    grid_session = grid_sessions.get(session_id)
+    if grid_session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    with grid_session.lock:
+        payload = grid_session.to_dict()
+        payload['grids'] = grids_payload(grid_session.grids, request.args.get('format', 'json'))
+    return compact_response(payload)
+
+
+@app.route('/sessions/<session_id>/edits', methods=['POST'])
+def edit_session(session_id):
+    data = request.json
+    grid_session = grid_sessions.get(session_id)
+    if grid_session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    with grid_session.lock:
+        old_version = grid_session.cache_version
+        try:
+            cells, stairs_changed, buffered_cells = grid_session.apply_edits(data['edits'], data.get('base_version'))
+        except VersionConflict as e:
+            return jsonify({'error': str(e), 'version': e.version}), 409
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        # Keep the cached paths this edit cannot affect
+        path_results.invalidate(old_version, grid_session.cache_version, cells, stairs_changed)
+    return jsonify({'version': grid_session.version, 'buffered_cells': buffered_cells})
 
 def apply_wall_buffer(grid, buffer_distance):
     buffered_grid = grid.copy()
@@ -76,7 +202,7 @@ def index():
     return render_template('index.html')
 
 
-def process_ifc(file_path, grid_size):
+def process_ifc(file_path, grid_size, grid_format='json'):
     def event_stream():
         print("init " + os.path.dirname(os.path.realpath(__file__)))
 
@@ -109,8 +235,14 @@ def process_ifc(file_path, grid_size):
                     _, progress, message = line.strip().split(":", 2)
                     yield f"data: {json.dumps({'progress': float(progress), 'message': message})}\n\n"
                 elif line.startswith("{") and line.strip().endswith("}"):
-                    # This is likely the final JSON result
-                    yield f"data: {json.dumps({'complete': True, 'result': json.loads(line)})}\n\n"
+                    # This is likely the final JSON result, keep it on the server for later requests
+                    result = json.loads(line)
+                    grid_session = grid_sessions.create(result['grids'], result['grid_size'], result['floors'],
+                                                        result['bbox'])
+                    result['grids'] = grids_payload(grid_session.grids, grid_format)
+                    message = {'complete': True, 'result': result, 'session_id': grid_session.session_id,
+                               'version': grid_session.version}
+                    yield f"data: {json.dumps(message)}\n\n"
 
             print("Subprocess output finished")
 
@@ -152,26 +284,437 @@ def process_file_sse():
     grid_size = session.get('grid_size')
     if not filepath or not grid_size:
         return jsonify({'error': 'No file to process'}), 400
-    return process_ifc(filepath, grid_size)
+    return process_ifc(filepath, grid_size, request.args.get('format', 'json'))
+
+
+def grid_version(grids):
+    return grid_fingerprint([encode_grid(grid) for grid in grids])
 
 
 @app.route('/edit-grid', methods=['POST'])
 def edit_grid():
     data = request.json
-    editor = InteractiveGridEditor(data['grids'], data['grid_size'], data['floors'], data['bbox'])
+    grids = request_grids(data)
+    old_version = grid_version(grids)
+    stairs_changed = any(edit['element_type'] == 'stair' or grids[edit['floor']][edit['row'], edit['col']] == 'stair'
+                         for edit in data['edits'])
+    editor = InteractiveGridEditor(grids, data['grid_size'], data['floors'], data['bbox'])
     updated_grids = editor.edit_grid(data['edits'])
-    return jsonify({'grids': updated_grids})
+
+    # Keep the cached paths this edit cannot affect
+    cells = [(edit['row'], edit['col'], edit['floor']) for edit in data['edits']]
+    path_results.invalidate(old_version, grid_version(updated_grids), cells, stairs_changed)
+    return compact_response({'grids': grids_payload(updated_grids, data.get('format', 'json'))})
+
+
+def to_position(point):
+    # The client sends {'floor', 'row', 'col'} dicts, the pathfinder works with (row, col, floor) tuples
+    if isinstance(point, dict):
+        return (int(point['row']), int(point['col']), int(point['floor']))
+    return tuple(int(v) for v in point)
+
+
+def configure_pathfinder(pathfinder, data):
+    pathfinder.minimize_cost = data.get('minimize_cost', True)
+    # A named profile replaces minimize_cost; unknown names raise UnknownCostProfile (a 400 response)
+    pathfinder.cost_profile = cost_profile(data['cost_profile']).name if data.get('cost_profile') else None
+    pathfinder.allow_diagonal = data.get('allow_diagonal', True)
+    pathfinder.heuristic_style = data.get('heuristic_style', 'min').lower()
+    pathfinder.backend = data.get('backend', 'python')
+    wall_buffer = data.get('wall_buffer', pathfinder.wall_buffer)
+    if pathfinder.buffered_grids is None or wall_buffer != pathfinder.wall_buffer:
+        pathfinder.wall_buffer = wall_buffer
+        pathfinder.apply_wall_buffer()
+    return pathfinder
+
+
+def create_pathfinder(data, grids=None):
+    if grids is None:
+        grids = request_grids(data)
+    pathfinder = InteractiveBIMPathfinder(grids, data['grid_size'], data['floors'], data['bbox'])
+    pathfinder.landmark_cache = landmark_fields
+    return configure_pathfinder(pathfinder, data)
+
+
+def request_pathfinder(data):
+    """
+    Pathfinder for a request and the lock that guards it: the warm pathfinder of the referenced session,
+    or a new one for the posted grids. Returns (None, None) for an unknown session.
+    """
+    if 'session_id' in data:
+        grid_session = grid_sessions.get(data['session_id'])
+        if grid_session is None:
+            return None, None
+        return grid_session.pathfinder, grid_session.lock
+    return create_pathfinder(data), nullcontext()
+
+
+# Algorithms /find-path runs; hazard routes and tours take their own options and have their own endpoints
+PATH_ALGORITHMS = ('A*', 'Distance Field', 'JPS', 'Bidirectional', 'Anytime', 'HPA*', 'Rectangles', 'D* Lite')
+OTHER_ENDPOINTS = {'Hazard': '/hazard-route', 'Tour': '/tour'}
+
+
+def run_query(pathfinder, algorithm, options, hierarchy_key=None, waypoints=False):
+    if algorithm == 'Distance Field':
+        path = pathfinder.run_distance_field(distance_fields)
+    elif algorithm == 'JPS':
+        path = pathfinder.run_jps()
+    elif algorithm == 'Bidirectional':
+        path = pathfinder.run_bidirectional(options['use_heuristic'])
+    elif algorithm == 'Anytime':
+        path = pathfinder.run_anytime(options['time_budget'])
+    elif algorithm == 'HPA*':
+        if hierarchy_key is None:
+            # A session pathfinder keeps its own abstraction between requests
+            path = pathfinder.run_hierarchical(pathfinder.hierarchy)
+        else:
+            # The abstraction of the previous grid with this shape is updated incrementally after edits;
+            # taken out while in use, as update() changes it
+            path = pathfinder.run_hierarchical(hierarchies.pop(hierarchy_key, None))
+            keep_search_state(hierarchies, hierarchy_key, pathfinder.hierarchy)
+    elif algorithm == 'Rectangles':
+        path = pathfinder.run_rectangles(rectangle_graphs)
+    elif algorithm == 'D* Lite':
+        if hierarchy_key is None:
+            path = pathfinder.run_incremental(pathfinder.incremental)
+        else:
+            # Taken out while in use, a planner is changed by every search
+            path = pathfinder.run_incremental(incremental_planners.pop(hierarchy_key, None))
+            keep_search_state(incremental_planners, hierarchy_key, pathfinder.incremental)
+    elif algorithm == 'A*':
+        path = pathfinder.run_astar()
+    else:
+        raise ValueError(f"Unknown algorithm {algorithm!r}")
+    result = {'path': path, 'length': pathfinder.pathlength, 'nodes_expanded': pathfinder.nodes_expanded,
+              'waypoints': None, 'metric_length': None, 'segments': None}
+    if algorithm == 'Anytime':
+        result.update(suboptimality=pathfinder.suboptimality, completed=pathfinder.search_completed)
+    if waypoints:
+        add_waypoints(result, pathfinder)
+    return result
+
+
+def add_waypoints(result, pathfinder):
+    """Fill in the waypoints, metric length and segments of a result with a path, in place."""
+    if result['path'] is not None:
+        compact = pathfinder.compress_path(result['path'])
+        result.update(waypoints=compact['waypoints'], metric_length=compact['length'], segments=compact['segments'])
+    return result
+
+
+def path_response(result, path_format, stats=None):
+    # With path_format 'waypoints' the cell-by-cell path is left out, the waypoints describe the same route
+    if path_format == 'waypoints':
+        result = {key: value for key, value in result.items() if key != 'path'}
+    if stats is not None:
+        result = {**result, 'stats': stats}
+    return jsonify(result)
+
+
+@app.errorhandler(UnknownCostProfile)
+def unknown_cost_profile(error):
+    return jsonify({'error': str(error)}), 400
+
+
+@app.errorhandler(InvalidGridPayload)
+def invalid_grid_payload(error):
+    return jsonify({'error': str(error)}), 400
+
+
+@app.route('/cost-profiles', methods=['GET'])
+def cost_profiles():
+    """The cost profiles a request can select with 'cost_profile'."""
+    return jsonify([profile.as_dict() for profile in COST_PROFILES.values()])
 
 
 @app.route('/find-path', methods=['POST'])
 def find_path():
     data = request.json
-    pathfinder = InteractiveBIMPathfinder(data['grids'], data['grid_size'], data['floors'], data['bbox'])
-    pathfinder.start = data['start']
-    pathfinder.goals = data['goals']
-    path = pathfinder.run_astar()
-    return jsonify({'path': path})
+    start = to_position(data['start'])
+    goals = [to_position(goal) for goal in data['goals']]
+    algorithm = data.get('algorithm', 'A*')
+    if algorithm in OTHER_ENDPOINTS:
+        return jsonify({'error': f"Use {OTHER_ENDPOINTS[algorithm]} for {algorithm} queries"}), 400
+    if algorithm not in PATH_ALGORITHMS:
+        return jsonify({'error': f"Unknown algorithm {algorithm!r}"}), 400
+    options = {}
+    if algorithm == 'Bidirectional':
+        options['use_heuristic'] = data.get('use_heuristic', True)
+    elif algorithm == 'Anytime':
+        options['time_budget'] = data.get('time_budget', 0.2)
+    elif algorithm == 'Distance Field':
+        # Both backends find optimal paths, but may break ties differently
+        options['backend'] = data.get('backend', 'python')
+
+    grid_session = None
+    if 'session_id' in data:
+        grid_session = grid_sessions.get(data['session_id'])
+        if grid_session is None:
+            return jsonify({'error': 'Unknown session'}), 404
+        version, grid_size = grid_session.cache_version, grid_session.pathfinder.grid_size
+        wall_buffer = data.get('wall_buffer', grid_session.pathfinder.wall_buffer)
+    else:
+        grids = request_grids(data)
+        version, grid_size = grid_version(grids), data['grid_size']
+        wall_buffer = data.get('wall_buffer', 0)
+    key = PathResultCache.key(version, start, goals, grid_size, data.get('minimize_cost', True),
+                              data.get('allow_diagonal', True), wall_buffer,
+                              data.get('heuristic_style', 'min').lower(), algorithm,
+                              cost_profile=data.get('cost_profile'), **options)
+    path_format = data.get('path_format', 'cells')
+    # Waypoints are only computed when asked for, so queries for cells do not wait for the compression
+    waypoints = path_format == 'waypoints'
+    result = path_results.get(key)
+    if result is not None:
+        # A cached result costs no search; the stats of the original query are in the counters
+        if waypoints and result['path'] is not None and result['waypoints'] is None:
+            # Cached by a query for cells: the cached entry gets the waypoints of its path
+            if grid_session is not None:
+                with grid_session.lock:
+                    add_waypoints(result, configure_pathfinder(grid_session.pathfinder, data))
+            else:
+                add_waypoints(result, create_pathfinder(data, grids))
+        stats = {**SearchStats().as_dict(), 'cached': True} if data.get('stats') else None
+        return path_response(result, path_format, stats)
+
+    if grid_session is not None:
+        with grid_session.lock:
+            grid_session.pathfinder.reset_stats()
+            pathfinder = configure_pathfinder(grid_session.pathfinder, data)
+            pathfinder.start = start
+            pathfinder.goals = goals
+            result = run_query(pathfinder, algorithm, options, waypoints=waypoints)
+            explored = pathfinder.explored
+            stats = pathfinder.stats
+    else:
+        pathfinder = create_pathfinder(data, grids)
+        pathfinder.start = start
+        pathfinder.goals = goals
+        hierarchy_key = (len(pathfinder.grids), pathfinder.grids[0].shape, pathfinder.active_cost_profile().name,
+                         pathfinder.allow_diagonal)
+        result = run_query(pathfinder, algorithm, options, hierarchy_key, waypoints)
+        explored = pathfinder.explored
+        stats = pathfinder.stats
+    search_counters.record(algorithm, stats)
+    if result.get('completed', True):
+        # An interrupted anytime search may find a better path next time, so it is not cached
+        path_results.put(key, result, explored)
+    return path_response(result, path_format, {**stats.as_dict(), 'cached': False} if data.get('stats') else None)
+
+
+@app.route('/stats', methods=['GET', 'DELETE'])
+def search_stats():
+    """Aggregated search counters per algorithm and the hit rates of the shared caches; DELETE resets the counters."""
+    if request.method == 'DELETE':
+        search_counters.clear()
+    return jsonify({
+        'algorithms': search_counters.snapshot(),
+        'path_results': {'hits': path_results.hits, 'misses': path_results.misses},
+        'distance_fields': {'hits': distance_fields.hits, 'misses': distance_fields.misses},
+        'rectangle_graphs': {'hits': rectangle_graphs.hits, 'misses': rectangle_graphs.misses},
+        'heuristic_maps': {'hits': heuristic_maps.hits, 'misses': heuristic_maps.misses},
+        'landmark_fields': {'hits': landmark_fields.hits, 'misses': landmark_fields.misses},
+        'tour_fields': {'hits': tour_fields.hits, 'misses': tour_fields.misses},
+    })
+
+
+@app.route('/heuristic-map', methods=['POST'])
+def heuristic_map():
+    """Heuristic value of every cell of a floor toward the posted goals, for the overlay; null on walls."""
+    data = request.json
+    pathfinder, lock = request_pathfinder(data)
+    if pathfinder is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    floor = int(data.get('floor', 0))
+    with lock:
+        configure_pathfinder(pathfinder, data)
+        if not 0 <= floor < len(pathfinder.grids):
+            return jsonify({'error': 'Unknown floor'}), 400
+        pathfinder.goals = [to_position(goal) for goal in data['goals']]
+        values = pathfinder.heuristic_map(floor, heuristic_maps)
+    if values is None:
+        return jsonify({'error': 'No goals'}), 400
+    finite = np.isfinite(values)
+    # Unreachable floors have infinite values, they are left out of the color range like walls
+    rounded = np.round(values, 3).astype(object)
+    rounded[~finite] = None
+    return compact_response({
+        'floor': floor,
+        'values': rounded.tolist(),
+        'min': float(values[finite].min()) if finite.any() else None,
+        'max': float(values[finite].max()) if finite.any() else None,
+    })
+
+
+@app.route('/find-path-anytime', methods=['POST'])
+def find_path_anytime():
+    """Stream every improved anytime solution until the path is optimal or time_limit seconds have passed."""
+    data = request.json
+    pathfinder, lock = request_pathfinder(data)
+    if pathfinder is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    with lock:
+        configure_pathfinder(pathfinder, data)
+        search_grid = pathfinder.compile_search_grid()
+    search = AnytimeSearch(search_grid, data.get('initial_epsilon', 3.0), data.get('epsilon_step', 0.5))
+    compressor = WaypointCompressor(search_grid, pathfinder.floors)
+    start = to_position(data['start'])
+    goals = [to_position(goal) for goal in data['goals']]
+    deadline = time.perf_counter() + data.get('time_limit', 10.0)
+
+    def event_stream():
+        for path, cost, bound in search.solutions(start, goals, deadline):
+            compact = compressor.compress(path)
+            message = {'waypoints': compact['waypoints'], 'metric_length': compact['length'],
+                       'segments': compact['segments'], 'length': cost, 'suboptimality': bound}
+            yield f"data: {json.dumps(message)}\n\n"
+        yield f"data: {json.dumps({'complete': True, 'completed': search.completed})}\n\n"
+
+    return Response(event_stream(), content_type='text/event-stream')
+
+
+# Options of EvacuationSimulation a request may set
+EVACUATION_OPTIONS = ['walking_speed', 'stair_speed', 'door_flow', 'max_density', 'jam_density',
+                      'congestion_weight', 'replan_interval', 'block_size', 'patience', 'time_step']
+
+
+@app.route('/evacuate', methods=['POST'])
+def evacuate():
+    """
+    Simulate a crowd leaving the building: 'agents' start cells, or 'count' agents on random floor cells,
+    toward the posted 'exits' or the exit doors of the building.
+    """
+    data = request.json
+    pathfinder, lock = request_pathfinder(data)
+    if pathfinder is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    with lock:
+        configure_pathfinder(pathfinder, data)
+        search_grid = pathfinder.compile_search_grid()
+        grids, buffered_grids, backend = pathfinder.grids, pathfinder.buffered_grids, pathfinder.backend
+    exits = [to_position(exit) for exit in data['exits']] if data.get('exits') else find_exits(grids)
+    if 'agents' in data:
+        agents = [to_position(agent) for agent in data['agents']]
+    else:
+        agents = random_agents(buffered_grids, data.get('count', 1000), data.get('seed', 0))
+    if not all(search_grid.contains(cell) for cell in exits + agents):
+        return jsonify({'error': 'Invalid grid coordinates'}), 400
+    options = {key: data[key] for key in EVACUATION_OPTIONS if key in data}
+    simulation = EvacuationSimulation(search_grid, exits, pathfinder.floors, backend=backend, **options)
+    result = simulation.run(agents, data.get('max_time', 3600.0), data.get('seed', 0))
+
+    egress = result['egress_times']
+    out = egress[np.isfinite(egress)]
+    return jsonify({
+        'agents': [list(agent) for agent in agents],
+        'exits': [list(exit) for exit in exits],
+        'egress_times': [float(t) if np.isfinite(t) else None for t in egress],
+        'percentiles': {str(p): float(np.percentile(out, p)) for p in (50, 90, 99)} if len(out) else None,
+        'evacuated': result['evacuated'],
+        'unreachable': result['unreachable'],
+        'stuck': result['stuck'],
+        'total_time': result['total_time'],
+        'block_cells': result['block_cells'],
+        'mean_density': np.round(result['mean_density'], 3).tolist(),
+        'max_density': np.round(result['max_density'], 3).tolist(),
+    })
+
+
+# Options of TimeDependentSearch a request may set
+HAZARD_OPTIONS = ['walking_speed', 'stair_speed', 'hazard_weight', 'lethal_level', 'time_resolution', 'max_duration']
+
+
+def to_ignition(point):
+    # An ignition is a position with an optional time in seconds, {'floor', 'row', 'col', 'time'} or [x, y, z, t]
+    if isinstance(point, dict):
+        return to_position(point) + (float(point.get('time', 0.0)),)
+    return to_position(point[:3]) + (float(point[3]) if len(point) > 3 else 0.0,)
+
+
+@app.route('/hazard-route', methods=['POST'])
+def hazard_route():
+    """
+    Route from 'start' at 'start_time' to the nearest goal through a fire scenario: 'ignitions' of the
+    spreading model (added to the session's scenario) or a 'hazard_levels' forecast with 'time_step'.
+    On a session, calling again as the person walks keeps the rest of the route while it is still good.
+    """
+    data = request.json
+    pathfinder, lock = request_pathfinder(data)
+    if pathfinder is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    options = {key: data[key] for key in HAZARD_OPTIONS if key in data}
+    with lock:
+        configure_pathfinder(pathfinder, data)
+        if 'hazard_levels' in data:
+            pathfinder.set_hazard(levels=data['hazard_levels'], time_step=data.get('time_step', 1.0))
+        elif 'ignitions' in data:
+            pathfinder.set_hazard([to_ignition(point) for point in data['ignitions']],
+                                  spread_rate=data.get('spread_rate', 0.1), ramp_time=data.get('ramp_time', 30.0))
+        pathfinder.start = to_position(data['start'])
+        pathfinder.goals = [to_position(goal) for goal in data['goals']]
+        path = pathfinder.run_hazard_route(data.get('start_time', 0.0), **options)
+        router = pathfinder.hazard_router
+        result = {'path': path, 'length': pathfinder.pathlength, 'arrival_times': pathfinder.hazard_times,
+                  'hazard_levels': None, 'searched': router.searched,
+                  'searches': router.searches, 'reuses': router.reuses}
+        if path is not None:
+            search_grid = pathfinder.hazard.search_grid
+            cells = np.array([search_grid.index(position) for position in path])
+            levels = pathfinder.hazard.level(cells, np.array(pathfinder.hazard_times))
+            result['hazard_levels'] = np.round(levels, 3).tolist()
+    return jsonify(result)
+
+
+@app.route('/tour', methods=['POST'])
+def tour():
+    """
+    Inspection route from 'start' through every one of 'goals' in the cheapest order found, back to the
+    start with 'closed'. Returns the visiting order as indices into goals, the stitched path, the total
+    length and per-leg lengths and timings; unreachable goals are listed and left out.
+    """
+    data = request.json
+    pathfinder, lock = request_pathfinder(data)
+    if pathfinder is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    with lock:
+        configure_pathfinder(pathfinder, data)
+        pathfinder.start = to_position(data['start'])
+        pathfinder.goals = [to_position(goal) for goal in data['goals']]
+        pathfinder.reset_stats()
+        path = pathfinder.run_tour(tour_fields, data.get('closed', False))
+        result = {**pathfinder.tour, 'path': path, 'length': pathfinder.pathlength}
+        stats = pathfinder.stats.as_dict()
+    result['stats'] = stats if data.get('stats') else None
+    return compact_response(result)
+
+
+@app.route('/find-paths', methods=['POST'])
+def find_paths():
+    data = request.json
+    pathfinder, lock = request_pathfinder(data)
+    if pathfinder is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    starts = [to_position(start) for start in data['starts']]
+    goal_sets = None
+    if 'goal_sets' in data:
+        goal_sets = [[to_position(goal) for goal in goals] for goals in data['goal_sets']]
+
+    # The compiled grid is taken under the session lock, the batch itself does not touch the session
+    with lock:
+        configure_pathfinder(pathfinder, data)
+        if goal_sets is None:
+            pathfinder.goals = [to_position(goal) for goal in data['goals']]
+        try:
+            results = pathfinder.find_paths(starts, goal_sets, distance_fields, data.get('workers'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
+    def event_stream():
+        for result in results:
+            yield f"data: {json.dumps(result)}\n\n"
+        yield f"data: {json.dumps({'complete': True, 'count': len(starts)})}\n\n"
+
+    return Response(event_stream(), content_type='text/event-stream')
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,62 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from distance_field import DistanceField
+
+
+def compute_field_arrays(search_grid, goals):
+    """Worker entry point: compute a distance field and return only its arrays, which are cheap to send back."""
+    field = DistanceField(search_grid, goals)
+    return field.cost, field.next_index
+
+
+def route_batch(search_grid, starts, goal_sets, cache=None, workers=None):
+    """
+    Route many starts at once, sharing one distance field per distinct goal set.
+
+    Starts are grouped by goal set. Each group needs a single reverse Dijkstra, after which every path
+    in the group is found by following next-step pointers. When several fields have to be computed
+    they are spread over a process pool, and results are yielded group by group as soon as the field
+    for that group is ready, so the caller can stream them.
+
+    :param search_grid: Compiled SearchGrid
+    :param starts: List of (x, y, z) start positions
+    :param goal_sets: List of goal lists, one per start
+    :param cache: Optional DistanceFieldCache to read fields from and store new fields in
+    :param workers: Maximum number of worker processes; 0 or 1 computes all fields in this process
+    :return: Generator of {'index', 'start', 'path', 'length'} dicts, in completion order
+    """
+    groups = OrderedDict()
+    for i, (start, goals) in enumerate(zip(starts, goal_sets)):
+        groups.setdefault(frozenset(tuple(goal) for goal in goals), []).append(i)
+
+    def results(goals, field):
+        for i in groups[goals]:
+            path = field.path_from(starts[i])
+            length = field.cost_to_goal(starts[i]) if path is not None else None
+            yield {'index': i, 'start': tuple(starts[i]), 'path': path, 'length': length}
+
+    pending = []
+    for goals in groups:
+        field = cache.lookup(search_grid, goals) if cache is not None else None
+        if field is None:
+            pending.append(goals)
+        else:
+            yield from results(goals, field)
+
+    if (workers is not None and workers <= 1) or len(pending) <= 1:
+        for goals in pending:
+            field = DistanceField(search_grid, goals)
+            if cache is not None:
+                cache.put(search_grid, goals, field)
+            yield from results(goals, field)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(compute_field_arrays, search_grid, list(goals)): goals for goals in pending}
+        for future in as_completed(futures):
+            goals = futures[future]
+            field = DistanceField(search_grid, goals, *future.result())
+            if cache is not None:
+                cache.put(search_grid, goals, field)
+            yield from results(goals, field)
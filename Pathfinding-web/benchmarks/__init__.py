@@ -0,0 +1,3 @@
+"""Benchmarks and differential checks for the pathfinding engines, on deterministic synthetic buildings."""
+from benchmarks.differential import DifferentialChecker, random_queries
+from benchmarks.generators import save_building, synthetic_building
@@ -0,0 +1,114 @@
+import numpy as np
+
+from pathfinder import InteractiveBIMPathfinder, Node
+
+# Engines of InteractiveBIMPathfinder, by the names used in run_algorithm
+ENGINES = {
+    'A*': lambda pathfinder: pathfinder.run_astar(),
+    'Distance Field': lambda pathfinder: pathfinder.run_distance_field(),
+    'JPS': lambda pathfinder: pathfinder.run_jps(),
+    'HPA*': lambda pathfinder: pathfinder.run_hierarchical(pathfinder.hierarchy),
+    'Bidirectional': lambda pathfinder: pathfinder.run_bidirectional(),
+    'Anytime': lambda pathfinder: pathfinder.run_anytime(time_budget=60.0),
+    'D* Lite': lambda pathfinder: pathfinder.run_incremental(pathfinder.incremental),
+    'Rectangles': lambda pathfinder: pathfinder.run_rectangles(),
+    'Hazard': lambda pathfinder: pathfinder.run_hazard_route(),  # Without a fire scenario
+}
+
+
+def make_pathfinder(building, wall_buffer=0.0, minimize_cost=True, allow_diagonal=True):
+    pathfinder = InteractiveBIMPathfinder([grid.copy() for grid in building['grids']], building['grid_size'],
+                                          building['floors'], building['bbox'])
+    pathfinder.wall_buffer = wall_buffer
+    pathfinder.minimize_cost = minimize_cost
+    pathfinder.allow_diagonal = allow_diagonal
+    pathfinder.apply_wall_buffer()
+    pathfinder.find_all_stairs()
+    return pathfinder
+
+
+def random_queries(pathfinder, count=20, max_goals=3, seed=0):
+    """(start, goals) pairs on random floor cells of the buffered grids, the same for a given seed."""
+    rng = np.random.default_rng(seed)
+    cells = [(int(x), int(y), z) for z, grid in enumerate(pathfinder.buffered_grids)
+             for x, y in np.argwhere(grid == 'floor')]
+    if not cells:
+        return []
+    queries = []
+    for _ in range(count):
+        picks = rng.choice(len(cells), size=1 + int(rng.integers(1, max_goals + 1)))
+        queries.append((cells[picks[0]], [cells[i] for i in picks[1:]]))
+    return queries
+
+
+class DifferentialChecker:
+    """
+    Compare the paths of a search engine with the optimal costs of a distance field (run_distance_field,
+    one exact reverse Dijkstra per query) on the same queries.
+
+    Every path is also checked on its own: it has to start at the start, end at a goal, take only
+    moves that get_neighbors allows, and its cost recomputed with get_cost has to match the reported
+    length. Reference costs are kept, so several engines can be checked against one set of fields.
+
+    The reference is optimal, so a path that is more expensive is a mismatch, and so is a cheaper one
+    (it can only come from a wrong cost or an invalid move).
+    """
+
+    def __init__(self, building, wall_buffer=0.0, minimize_cost=True, allow_diagonal=True, tolerance=1e-6):
+        self.pathfinder = make_pathfinder(building, wall_buffer, minimize_cost, allow_diagonal)
+        self.tolerance = tolerance
+        self.reference = {}
+
+    def reference_cost(self, start, goals):
+        key = (start, tuple(goals))
+        if key not in self.reference:
+            pathfinder = self.pathfinder
+            pathfinder.start, pathfinder.goals = start, list(goals)
+            path = pathfinder.run_distance_field()
+            self.reference[key] = pathfinder.pathlength if path is not None else None
+        return self.reference[key]
+
+    def path_error(self, path, start, goals, length):
+        """Why a path is not a valid path for the query, or None."""
+        pathfinder = self.pathfinder
+        if tuple(path[0]) != tuple(start):
+            return "path does not begin at the start"
+        if tuple(path[-1]) not in {tuple(goal) for goal in goals}:
+            return "path does not end at a goal"
+        cost = 0.0
+        for a, b in zip(path, path[1:]):
+            a, b = Node(tuple(a)), Node(tuple(b))
+            if b.position not in {n.position for n in pathfinder.get_neighbors(a)}:
+                return f"invalid move from {a.position} to {b.position}"
+            cost += pathfinder.get_cost(a, b)
+        if abs(cost - length) > self.tolerance * max(1.0, cost):
+            return f"reported length {length} differs from the path cost {cost}"
+        return None
+
+    def check(self, engine, queries):
+        """
+        :param engine: Name from ENGINES, or a callable that runs a search on the configured pathfinder
+                       (start and goals set) and returns the path, leaving its cost in pathlength
+        :param queries: List of (start, goals) pairs, e.g. from random_queries
+        :return: List of mismatch dicts with 'start', 'goals', 'expected', 'actual' and 'error'
+        """
+        run = ENGINES[engine] if isinstance(engine, str) else engine
+        pathfinder = self.pathfinder
+        mismatches = []
+        for start, goals in queries:
+            expected = self.reference_cost(start, goals)
+            pathfinder.start, pathfinder.goals = start, list(goals)
+            path = run(pathfinder)
+            actual = pathfinder.pathlength if path is not None else None
+            if path is None or expected is None:
+                error = None if path is None and expected is None else "reachability differs from the reference"
+            else:
+                error = self.path_error(path, start, goals, actual)
+                if error is None and actual > expected + self.tolerance * max(1.0, expected):
+                    error = "more expensive than the reference"
+                elif error is None and actual < expected - self.tolerance * max(1.0, expected):
+                    error = "cheaper than the reference"
+            if error is not None:
+                mismatches.append({'start': start, 'goals': list(goals), 'expected': expected, 'actual': actual,
+                                   'error': error})
+        return mismatches
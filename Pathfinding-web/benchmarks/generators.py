@@ -0,0 +1,93 @@
+import json
+
+import numpy as np
+
+
+def synthetic_building(width=40.0, depth=30.0, floors=2, grid_size=0.2, room_width=4.0, corridor_width=2.0,
+                       door_width=1.0, wall_thickness=0.2, stair_size=2.0, floor_height=3.0, seed=0):
+    """
+    Deterministic office-like building: a central corridor with rooms on both sides, a door from every
+    room to the corridor, exits at both corridor ends on the ground floor and a stairwell on every floor.
+
+    Sizes are in metres and converted to cells with grid_size, so the same building can be generated at
+    several resolutions. The seed only varies the room widths and door positions.
+
+    :return: Dict with 'grids', 'grid_size', 'floors' and 'bbox', like the bim_grids_*.json files
+    """
+    rng = np.random.default_rng(seed)
+
+    def cells(metres):
+        return max(1, int(round(metres / grid_size)))
+
+    t = cells(wall_thickness)
+    corridor = cells(corridor_width)
+    door = cells(door_width)
+    stair = cells(stair_size)
+    # One cell of empty space around the building, so exits lead outside
+    rows = cells(depth) + 2
+    cols = cells(width) + 2
+    if rows < 4 * t + corridor + 8 or cols < 2 * t + 2 * door + 4:
+        raise ValueError("Building is too small for its corridor and walls")
+
+    # Corridor walls, shared by all floors
+    corridor_top = (rows - corridor) // 2 - t
+    corridor_bottom = corridor_top + t + corridor
+    # Room partitions on either side of the corridor
+    sides = [(1 + t, corridor_top), (corridor_bottom + t, rows - 1 - t)]
+    partitions = []
+    col = 1 + t
+    while True:
+        col += cells(room_width * rng.uniform(0.75, 1.25))
+        if col + t + cells(room_width / 2) >= cols - 1 - t:
+            break
+        partitions.append(col)
+        col += t
+    room_bounds = list(zip([1 + t] + [p + t for p in partitions], partitions + [cols - 1 - t]))
+    doors = [[int(rng.integers(lo, max(lo + 1, hi - door + 1))) for lo, hi in room_bounds] for _ in sides]
+
+    grids = []
+    for z in range(floors):
+        grid = np.full((rows, cols), 'empty', dtype=object)
+        grid[1:-1, 1:-1] = 'wall'
+        grid[1 + t:-1 - t, 1 + t:-1 - t] = 'floor'
+        grid[corridor_top:corridor_top + t, 1:-1] = 'wall'
+        grid[corridor_bottom:corridor_bottom + t, 1:-1] = 'wall'
+        for side, (top, bottom) in enumerate(sides):
+            for p in partitions:
+                grid[top:bottom, p:p + t] = 'wall'
+            # Room doors through the corridor wall
+            wall_row = corridor_top if side == 0 else corridor_bottom
+            for d in doors[side]:
+                grid[wall_row:wall_row + t, d:d + door] = 'door'
+        # Stairwell in the first room above the corridor, at the same cells on every floor
+        top, bottom = sides[0]
+        stair_rows = slice(max(top, bottom - 1 - stair), bottom - 1)
+        stair_cols = slice(room_bounds[0][0], min(room_bounds[0][0] + stair, room_bounds[0][1]))
+        if floors > 1:
+            grid[stair_rows, stair_cols] = 'stair'
+        if z == 0:
+            # Exits at both ends of the corridor
+            exit_rows = slice(corridor_top + t, corridor_top + t + min(door, corridor))
+            grid[exit_rows, 1:1 + t] = 'door'
+            grid[exit_rows, -1 - t:-1] = 'door'
+        grids.append(grid)
+
+    return {
+        'grids': grids,
+        'grid_size': grid_size,
+        'floors': [{'elevation': z * floor_height, 'height': floor_height} for z in range(floors)],
+        'bbox': {'min_x': 0.0, 'min_y': 0.0, 'min_z': 0.0, 'max_x': cols * grid_size, 'max_y': rows * grid_size,
+                 'max_z': floors * floor_height},
+    }
+
+
+def building_sizes(sizes, floors=2, grid_size=0.2, seed=0):
+    """Generator of (label, building) for a list of (width, depth) sizes in metres."""
+    for width, depth in sizes:
+        yield f"{width:g}x{depth:g}x{floors}@{grid_size:g}", synthetic_building(width, depth, floors, grid_size, seed=seed)
+
+
+def save_building(building, filename):
+    """Write a generated building in the bim_grids_*.json format, so it can be opened in the GUI and the web app."""
+    with open(filename, 'w') as f:
+        json.dump({**building, 'grids': [grid.tolist() for grid in building['grids']]}, f)
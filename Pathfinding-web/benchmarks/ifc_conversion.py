@@ -0,0 +1,178 @@
+"""
+Time and peak memory of every stage of the IFC to grid conversion (ifc_processor), on Duplex.ifc and on
+synthetic models, and save the report as JSON.
+
+Run from the Pathfinding-web folder:
+
+    python -m benchmarks.ifc_conversion --output ifc.json
+    python -m benchmarks.ifc_conversion --walls 10 100 --storeys 1 5 --grid-sizes 0.2 --compare ifc.json
+
+Stages are run one after the other instead of element by element as create_navigation_grid does, so
+the tessellated geometry of all elements is held in memory between 'tessellation' and 'rasterization'.
+Memory is the peak of Python allocations (tracemalloc) during a stage; memory allocated inside
+ifcopenshell's geometry kernel is only visible in the process-wide max_rss.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import ifc_processor
+from benchmarks.ifc_models import model_scales, write_synthetic_ifc
+from benchmarks.run import compare_reports, git_commit
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows
+
+STAGES = ['load', 'bbox_floors', 'tessellation', 'rasterization', 'trimming', 'serialization']
+DUPLEX = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Duplex.ifc')
+
+
+class StageRecorder:
+    """Wall time and peak traced memory per conversion stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.stages[name] = {'time': seconds, 'peak_memory': tracemalloc.get_traced_memory()[1]}
+            if resource is not None:
+                self.stages[name]['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def convert(file_path, grid_size):
+    """The create_navigation_grid pipeline, stage by stage; returns the stage records and the grids."""
+    recorder = StageRecorder()
+    # The progress output is part of the cost in the web app (it is piped from a subprocess), so it is
+    # written, but to /dev/null
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        with recorder.stage('load'):
+            ifc_file = ifc_processor.load_ifc_file(file_path)
+        with recorder.stage('bbox_floors'):
+            bbox, floors = ifc_processor.calculate_bounding_box_and_floors(ifc_file)
+
+        elements = [element for element in ifc_file.by_type('IfcProduct')
+                    if element.is_a() in ifc_processor.all_types and element.Representation]
+        with recorder.stage('tessellation'):
+            geometries = [(element, ifc_processor.tessellate_element(element)) for element in elements]
+        with recorder.stage('rasterization'):
+            grids = ifc_processor.create_faux_3d_grid(bbox, floors, grid_size)
+            for element, geometry in geometries:
+                if geometry is not None:
+                    ifc_processor.rasterize_element(element, *geometry, grids, bbox, floors, grid_size)
+        del geometries
+        with recorder.stage('trimming'):
+            grids = ifc_processor.trim_and_pad_grids(grids)
+        with recorder.stage('serialization'):
+            json.dumps({'grids': [grid.tolist() for grid in grids], 'bbox': bbox, 'floors': floors,
+                        'grid_size': grid_size})
+    return recorder.stages, grids, len(elements)
+
+
+def benchmark_model(file_path, grid_size, repeat=1):
+    """Stage timings (min and median over repeat runs) and the peak memory of the last run."""
+    runs = []
+    for _ in range(repeat):
+        stages, grids, elements = convert(file_path, grid_size)
+        runs.append(stages)
+    timings = {}
+    for name in STAGES:
+        times = [run[name]['time'] for run in runs]
+        timings[name] = {'runs': times, 'min': min(times), 'median': float(np.median(times))}
+    total = [sum(run[name]['time'] for name in STAGES) for run in runs]
+    timings['total'] = {'runs': total, 'min': min(total), 'median': float(np.median(total))}
+    return {
+        'elements': elements,
+        'floors': len(grids),
+        'cells': int(sum(grid.size for grid in grids)),
+        'file_size': os.path.getsize(file_path),
+        'timings': timings,
+        'memory': {name: {key: value for key, value in runs[-1][name].items() if key != 'time'} for name in STAGES},
+    }
+
+
+def run_benchmarks(scales, grid_sizes=(0.5, 0.2, 0.1), repeat=1, duplex=True, models_dir=None):
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'ifcopenshell': ifc_processor.ifcopenshell.version,
+        'platform': platform.platform(),
+        'config': {'grid_sizes': list(grid_sizes), 'repeat': repeat, 'scales': [list(s) for s in scales]},
+        'buildings': {},
+    }
+    models = [('duplex', DUPLEX)] if duplex and os.path.exists(DUPLEX) else []
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = models_dir or tmp
+        for walls, storeys in scales:
+            file_path = os.path.join(directory, f"synthetic_{walls}w_{storeys}s.ifc")
+            if not os.path.exists(file_path):
+                print(f"Generating {os.path.basename(file_path)}...")
+                write_synthetic_ifc(file_path, walls, storeys)
+            models.append((f"{walls}w_{storeys}s", file_path))
+
+        tracemalloc.start()
+        try:
+            for name, file_path in models:
+                for grid_size in grid_sizes:
+                    label = f"{name}@{grid_size:g}"
+                    print(f"Converting {label}...")
+                    report['buildings'][label] = benchmark_model(file_path, grid_size, repeat)
+        finally:
+            tracemalloc.stop()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IFC to grid conversion stages")
+    parser.add_argument('--walls', nargs='+', type=int, default=[10, 100, 1000, 10000])
+    parser.add_argument('--storeys', nargs='+', type=int, default=[1, 5, 20])
+    parser.add_argument('--grid-sizes', nargs='+', type=float, default=[0.5, 0.2, 0.1])
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--no-duplex', action='store_true', help="Only convert the synthetic models")
+    parser.add_argument('--models-dir', help="Folder to keep the generated models in, so later runs reuse them")
+    parser.add_argument('--output', help="JSON file to write the report to")
+    parser.add_argument('--compare', help="Earlier report JSON to compare the timings with")
+    args = parser.parse_args()
+
+    scales = model_scales(args.walls, args.storeys)
+    report = run_benchmarks(scales, args.grid_sizes, args.repeat, not args.no_duplex, args.models_dir)
+
+    for label, result in report['buildings'].items():
+        print(f"\n{label} ({result['elements']} elements, {result['floors']} floors, {result['cells']} cells)")
+        for name in STAGES + ['total']:
+            line = f"  {name:<14} {result['timings'][name]['median'] * 1000:10.1f} ms"
+            if name in result['memory']:
+                line += f"  {result['memory'][name]['peak_memory'] / 2 ** 20:8.1f} MiB"
+            print(line)
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print("\nCompared with", args.compare)
+        for label, name, before, after, ratio in compare_reports(old, report):
+            print(f"  {label:<20} {name:<14} {before * 1000:10.1f} ms -> {after * 1000:10.1f} ms"
+                  + (f"  ({ratio:.2f}x)" if ratio is not None else ""))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import ifcopenshell
+import ifcopenshell.api.aggregate
+import ifcopenshell.api.context
+import ifcopenshell.api.geometry
+import ifcopenshell.api.project
+import ifcopenshell.api.root
+import ifcopenshell.api.spatial
+import ifcopenshell.api.unit
+import numpy as np
+
+
+def placement(x, y, z, rotated=False):
+    matrix = np.eye(4)
+    if rotated:
+        # Quarter turn around z, so a wall extruded along x runs along y
+        matrix[:2, :2] = [[0.0, -1.0], [1.0, 0.0]]
+    matrix[:3, 3] = [x, y, z]
+    return matrix
+
+
+def wall_segments(count, room_size):
+    """
+    (x, y, rotated) of count wall segments on a square grid of rooms of room_size metres, filled row by
+    row, and the (width, depth) of the grid.
+    """
+    rooms = 1
+    while 2 * rooms * (rooms + 1) < count:
+        rooms += 1
+    segments = []
+    for i in range(rooms + 1):
+        segments += [(j * room_size, i * room_size, False) for j in range(rooms)]
+        if i < rooms:
+            segments += [(j * room_size, i * room_size, True) for j in range(rooms + 1)]
+    return segments[:count], rooms * room_size
+
+
+def synthetic_ifc_model(walls=100, storeys=1, room_size=4.0, storey_height=3.0, door_every=4):
+    """
+    IFC4 model of a building with walls on a grid of rooms, spread evenly over the storeys, built with
+    ifcopenshell's authoring API. Every storey gets a floor slab, a door in every door_every-th wall
+    and, below the top storey, a stair flight at the same place, so the pathfinder sees stairs and doors
+    on every floor.
+
+    :param walls: Total number of walls over all storeys
+    :return: ifcopenshell file
+    """
+    model = ifcopenshell.api.project.create_file(version='IFC4')
+    project = ifcopenshell.api.root.create_entity(model, ifc_class='IfcProject', name='Synthetic benchmark')
+    ifcopenshell.api.unit.assign_unit(model)
+    context = ifcopenshell.api.context.add_context(model, context_type='Model')
+    body = ifcopenshell.api.context.add_context(model, context_type='Model', context_identifier='Body',
+                                                target_view='MODEL_VIEW', parent=context)
+
+    site = ifcopenshell.api.root.create_entity(model, ifc_class='IfcSite', name='Site')
+    building = ifcopenshell.api.root.create_entity(model, ifc_class='IfcBuilding', name='Building')
+    ifcopenshell.api.aggregate.assign_object(model, products=[site], relating_object=project)
+    ifcopenshell.api.aggregate.assign_object(model, products=[building], relating_object=site)
+
+    def add_product(ifc_class, representation, matrix, storey):
+        product = ifcopenshell.api.root.create_entity(model, ifc_class=ifc_class)
+        ifcopenshell.api.geometry.edit_object_placement(model, product=product, matrix=matrix)
+        ifcopenshell.api.geometry.assign_representation(model, product=product, representation=representation)
+        ifcopenshell.api.spatial.assign_container(model, products=[product], relating_structure=storey)
+        return product
+
+    for z in range(storeys):
+        elevation = z * storey_height
+        storey = ifcopenshell.api.root.create_entity(model, ifc_class='IfcBuildingStorey', name=f"Level {z}")
+        storey.Elevation = elevation
+        ifcopenshell.api.aggregate.assign_object(model, products=[storey], relating_object=building)
+
+        # Spread the walls evenly, the first storeys get the remainder
+        count = walls // storeys + (1 if z < walls % storeys else 0)
+        segments, extent = wall_segments(count, room_size)
+        extent = max(extent, room_size)
+        slab = ifcopenshell.api.geometry.add_slab_representation(
+            model, context=body, depth=0.2,
+            polyline=[(0.0, 0.0), (extent, 0.0), (extent, extent), (0.0, extent), (0.0, 0.0)])
+        add_product('IfcSlab', slab, placement(0.0, 0.0, elevation), storey)
+
+        for i, (x, y, rotated) in enumerate(segments):
+            wall = ifcopenshell.api.geometry.add_wall_representation(
+                model, context=body, length=room_size, height=storey_height, thickness=0.2)
+            add_product('IfcWall', wall, placement(x, y, elevation, rotated), storey)
+            if door_every and i % door_every == 0:
+                # A simple door leaf in the middle of the wall, slightly thicker so it covers the wall cells
+                door = ifcopenshell.api.geometry.add_wall_representation(
+                    model, context=body, length=1.0, height=2.1, thickness=0.3)
+                offset = (room_size - 1.0) / 2
+                dx, dy = (0.0, offset) if rotated else (offset, 0.0)
+                add_product('IfcDoor', door, placement(x + dx + (0.05 if rotated else 0.0),
+                                                       y + dy - (0.0 if rotated else 0.05), elevation, rotated), storey)
+
+        if z < storeys - 1:
+            # Up to the top of the next slab, so the flight shows on both storeys
+            flight = ifcopenshell.api.geometry.add_wall_representation(
+                model, context=body, length=3.0, height=storey_height + 0.2, thickness=1.0)
+            add_product('IfcStairFlight', flight, placement(room_size * 0.25, room_size * 0.25, elevation), storey)
+
+    return model
+
+
+def write_synthetic_ifc(filename, walls=100, storeys=1, **options):
+    model = synthetic_ifc_model(walls, storeys, **options)
+    model.write(filename)
+    return filename
+
+
+def model_scales(walls=(10, 100, 1000, 10000), storeys=(1, 5, 20)):
+    """(walls, storeys) combinations with at least one wall per storey."""
+    return [(w, s) for w in walls for s in storeys if w >= s]
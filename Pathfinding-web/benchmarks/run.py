@@ -0,0 +1,196 @@
+"""
+Time the pathfinding hot paths on synthetic buildings and save the results as JSON.
+
+Run from the Pathfinding-web folder:
+
+    python -m benchmarks.run --sizes 20x15 40x30 80x60 --output results.json
+    python -m benchmarks.run --engines JPS Bidirectional --check --compare results.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+import numpy as np
+
+from benchmarks.differential import ENGINES, DifferentialChecker, make_pathfinder, random_queries
+from benchmarks.generators import building_sizes
+
+DEFAULT_SIZES = [(20, 15), (40, 30), (80, 60)]
+
+
+def measure(function, repeat=3, setup=None):
+    """Wall-clock seconds of repeat calls of function; setup runs before each call and is not timed."""
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        runs.append(time.perf_counter() - started)
+    return {'runs': runs, 'min': min(runs), 'median': statistics.median(runs)}
+
+
+def benchmark_building(building, repeat=3, wall_buffer=0.4, queries=5, heuristic_calls=1000, engines=(), seed=0,
+                       heuristic_style='min'):
+    pathfinder = make_pathfinder(building, wall_buffer)
+    pathfinder.heuristic_style = heuristic_style
+    rng = np.random.default_rng(seed)
+    timings = {}
+
+    timings['apply_wall_buffer'] = measure(pathfinder.apply_wall_buffer, repeat)
+    timings['find_all_stairs'] = measure(pathfinder.find_all_stairs, repeat)
+
+    def clear_goals():
+        pathfinder.goals = []
+
+    timings['identify_exits'] = measure(lambda: pathfinder.identify_exits(None), repeat, clear_goals)
+    exits = list(pathfinder.goals)
+
+    cells = [(int(x), int(y), z) for z, grid in enumerate(pathfinder.buffered_grids)
+             for x, y in np.argwhere(grid == 'floor')]
+    samples = [cells[i] for i in rng.choice(len(cells), size=heuristic_calls)]
+
+    def heuristic_batch():
+        for position in samples:
+            pathfinder.heuristic(position, None)
+
+    timings['heuristic'] = measure(heuristic_batch, repeat)
+
+    # Routes from random rooms to the nearest exit, the typical evacuation query
+    starts = [cells[i] for i in rng.choice(len(cells), size=queries)]
+    lengths = {}
+
+    def route(run, name):
+        def run_all():
+            lengths[name] = []
+            for start in starts:
+                pathfinder.start, pathfinder.goals = start, list(exits)
+                path = run(pathfinder)
+                lengths[name].append(pathfinder.pathlength if path is not None else None)
+        return run_all
+
+    timings['run_astar'] = measure(route(lambda p: p.run_astar(), 'A*'), repeat)
+    for name in engines:
+        if name != 'A*':
+            timings[name] = measure(route(ENGINES[name], name), repeat)
+
+    # Point-to-point routes between random cells, the queries bidirectional search is meant for: the
+    # cells each engine expands are compared with run_astar
+    pairs = [(cells[i], cells[j]) for i, j in rng.choice(len(cells), size=(queries, 2))]
+    expanded = {}
+    for name in ['A*'] + [name for name in engines if name != 'A*']:
+        expanded[name] = 0
+        for start, goal in pairs:
+            pathfinder.start, pathfinder.goals = start, [goal]
+            ENGINES[name](pathfinder)
+            expanded[name] += pathfinder.nodes_expanded
+
+    return {
+        'rows': int(max(grid.shape[0] for grid in building['grids'])),
+        'cols': int(max(grid.shape[1] for grid in building['grids'])),
+        'floors': len(building['grids']),
+        'cells': int(sum(grid.size for grid in building['grids'])),
+        'exits': len(exits),
+        'timings': timings,
+        'path_lengths': lengths,
+        'nodes_expanded': expanded,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, floors=2, grid_size=0.2, repeat=3, engines=(), check=False, seed=0,
+                   heuristic_style='min'):
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'config': {'floors': floors, 'grid_size': grid_size, 'repeat': repeat, 'engines': list(engines), 'seed': seed,
+                   'heuristic_style': heuristic_style},
+        'buildings': {},
+    }
+    for label, building in building_sizes(sizes, floors, grid_size, seed):
+        print(f"Benchmarking {label}...")
+        result = benchmark_building(building, repeat, engines=engines, seed=seed, heuristic_style=heuristic_style)
+        if check:
+            checker = DifferentialChecker(building)
+            checker.pathfinder.heuristic_style = heuristic_style
+            queries = random_queries(checker.pathfinder, seed=seed)
+            result['mismatches'] = {name: checker.check(name, queries) for name in engines}
+        report['buildings'][label] = result
+    return report
+
+
+def compare_reports(old, new):
+    """(building, operation, old median, new median, ratio) for every timing present in both reports."""
+    rows = []
+    for label, result in new['buildings'].items():
+        previous = old['buildings'].get(label)
+        if previous is None:
+            continue
+        for name, timing in result['timings'].items():
+            if name in previous['timings']:
+                before = previous['timings'][name]['median']
+                rows.append((label, name, before, timing['median'], timing['median'] / before if before else None))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pathfinding hot paths on synthetic buildings")
+    parser.add_argument('--sizes', nargs='+', default=[f"{w}x{d}" for w, d in DEFAULT_SIZES],
+                        help="Building sizes in metres, as WIDTHxDEPTH")
+    parser.add_argument('--floors', type=int, default=2)
+    parser.add_argument('--grid-size', type=float, default=0.2)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--engines', nargs='*', default=[], choices=sorted(ENGINES),
+                        help="Other engines to time on the same routes as run_astar")
+    parser.add_argument('--check', action='store_true', help="Compare the engines' path costs with exact distance fields")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--heuristic-style', default='min', help="Heuristic style of the searches, e.g. 'alt'")
+    parser.add_argument('--output', help="JSON file to write the results to")
+    parser.add_argument('--compare', help="Earlier results JSON to compare the timings with")
+    args = parser.parse_args()
+
+    sizes = [tuple(float(v) for v in size.lower().split('x')) for size in args.sizes]
+    report = run_benchmarks(sizes, args.floors, args.grid_size, args.repeat, args.engines, args.check, args.seed,
+                            args.heuristic_style)
+
+    for label, result in report['buildings'].items():
+        print(f"\n{label} ({result['rows']}x{result['cols']} cells, {result['floors']} floors)")
+        for name, timing in result['timings'].items():
+            print(f"  {name:<20} {timing['median'] * 1000:10.2f} ms")
+        reference = result['nodes_expanded']['A*']
+        for name, count in result['nodes_expanded'].items():
+            ratio = f"{count / reference:.2f}x run_astar" if reference else ""
+            print(f"  {name:<20} {count:10d} cells expanded point to point  {ratio}")
+            if args.check and name != 'A*' and count > reference:
+                print(f"  {name}: expands more cells than run_astar")
+        for name, mismatches in result.get('mismatches', {}).items():
+            costlier = sum(m['error'] == "more expensive than the reference" for m in mismatches)
+            print(f"  {name}: {len(mismatches)} mismatches with the distance field, {costlier} of them more expensive")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print("\nCompared with", args.compare)
+        for label, name, before, after, ratio in compare_reports(old, report):
+            print(f"  {label:<16} {name:<20} {before * 1000:10.2f} ms -> {after * 1000:10.2f} ms"
+                  + (f"  ({ratio:.2f}x)" if ratio is not None else ""))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
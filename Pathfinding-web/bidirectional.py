@@ -0,0 +1,197 @@
+import heapq
+
+import numpy as np
+
+
+class BidirectionalSearch:
+    """
+    Bidirectional A*/Dijkstra over a SearchGrid for point-to-point queries.
+
+    A forward search from the start and a backward search from the goal run in turns, each turn on the
+    side with the smaller open list. The backward search follows moves in reverse, so the cost of
+    entering a cell and the vertical stair links are handled in both directions. The search stops as
+    soon as the two smallest open keys add up to the best meeting cost, which makes the result optimal.
+
+    With a single goal both searches are guided by average potentials (p = (h_goal - h_start) / 2
+    forward, -p backward), which keeps the keys of both sides consistent. With landmarks these are the
+    ALT bounds, which know about walls and stairs, and cells without a finite bound (cut off from the
+    start or the goal) are never pushed; that is what makes this engine expand fewer cells than run_astar.
+    Without landmarks they are octile lower bounds, which ignore the detour to a stair, and the search
+    then expands about as many cells as bidirectional Dijkstra: more than run_astar, whose heuristic
+    counts the way to the stairs (but may overestimate). With several goals the backward search starts
+    from all of them as plain Dijkstra.
+    """
+
+    def __init__(self, search_grid):
+        sg = search_grid
+        self.search_grid = sg
+        self.passable = sg.passable.tolist()
+        self.inside = sg.inside.tolist()
+        self.moves = [(offset, entry.tolist()) for offset, entry in sg.moves]
+        self.vertical = sg.vertical_cost.tolist()
+        self.stair_links = sg.stair_links
+
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.nodes_updated = 0
+        self.max_open_size = 0
+        self.closed = set()
+
+    def search(self, start, goals, use_heuristic=True, landmarks=None):
+        """
+        :param start: (x, y, z) start position
+        :param goals: List of (x, y, z) goal positions
+        :param use_heuristic: Guide both searches with potentials (single goal only)
+        :param landmarks: Optional Landmarks of the same search grid, for ALT potentials instead of octile ones
+        :return: (path, cost), or (None, None) if no goal is reachable
+        """
+        sg = self.search_grid
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.nodes_updated = 0
+        self.max_open_size = 0
+        self.closed = set()
+        goals = [tuple(goal) for goal in goals if sg.contains(goal)]
+        if not sg.contains(start) or not goals:
+            return None, None
+        start_index = sg.index(start)
+        goal_indices = [sg.index(goal) for goal in goals]
+        if start_index in goal_indices:
+            return [tuple(start)], 0.0
+
+        passable = self.passable
+        useful = [True] * sg.size  # Cells that can be on a path from the start to the goal
+        if use_heuristic and len(goals) == 1 and landmarks is not None and passable[start_index] and \
+                passable[goal_indices[0]]:
+            cells = np.arange(sg.size)
+            to_goal = landmarks.bounds(cells, goal_indices[0])
+            from_start = landmarks.bounds_from(start_index, cells)
+            reachable = np.isfinite(to_goal) & np.isfinite(from_start)
+            with np.errstate(invalid='ignore'):
+                potentials = np.where(reachable, (to_goal - from_start) / 2, 0.0).tolist()
+            useful = reachable.tolist()
+
+            def potential(index):
+                return potentials[index]
+        elif use_heuristic and len(goals) == 1:
+            goal = goals[0]
+            position = sg.position
+            lower_bound = sg.lower_bound
+
+            def potential(index):
+                # Average of the forward and (negated) backward heuristic
+                p = position(index)
+                return (lower_bound(p, goal) - lower_bound(start, p)) / 2
+        else:
+            def potential(index):
+                return 0.0
+
+        forward = {start_index: 0.0}
+        backward = {}
+        forward_parent = {start_index: None}
+        backward_next = {}
+        forward_open = [(potential(start_index), start_index)]
+        backward_open = []
+        for goal_index in goal_indices:
+            if passable[goal_index]:
+                backward[goal_index] = 0.0
+                backward_next[goal_index] = None
+                backward_open.append((-potential(goal_index), goal_index))
+        heapq.heapify(backward_open)
+        forward_closed = set()
+        backward_closed = set()
+
+        best = float('inf')
+        meeting = None
+        while forward_open and backward_open:
+            if forward_open[0][0] + backward_open[0][0] >= best:
+                break
+
+            self.max_open_size = max(self.max_open_size, len(forward_open) + len(backward_open))
+            # Expand the side with the smaller open list
+            if len(forward_open) <= len(backward_open):
+                _, u = heapq.heappop(forward_open)
+                if u in forward_closed:
+                    continue
+                forward_closed.add(u)
+                self.nodes_expanded += 1
+                d = forward[u]
+                for v, cost in self.forward_moves(u):
+                    if not useful[v]:
+                        continue
+                    nd = d + cost
+                    if nd < forward.get(v, float('inf')):
+                        if v in forward:
+                            self.nodes_updated += 1
+                        self.nodes_pushed += 1
+                        forward[v] = nd
+                        forward_parent[v] = u
+                        heapq.heappush(forward_open, (nd + potential(v), v))
+                        if v in backward and nd + backward[v] < best:
+                            best = nd + backward[v]
+                            meeting = v
+            else:
+                _, v = heapq.heappop(backward_open)
+                if v in backward_closed:
+                    continue
+                backward_closed.add(v)
+                self.nodes_expanded += 1
+                d = backward[v]
+                for u, cost in self.backward_moves(v):
+                    if (not passable[u] and u != start_index) or not useful[u]:
+                        continue  # Impassable cells can only be the start of a path
+                    nd = d + cost
+                    if nd < backward.get(u, float('inf')):
+                        if u in backward:
+                            self.nodes_updated += 1
+                        self.nodes_pushed += 1
+                        backward[u] = nd
+                        backward_next[u] = v
+                        heapq.heappush(backward_open, (nd - potential(u), u))
+                        if u in forward and forward[u] + nd < best:
+                            best = forward[u] + nd
+                            meeting = u
+
+        self.closed = forward_closed | backward_closed
+        if meeting is None:
+            return None, None
+        return self.reconstruct_path(meeting, forward_parent, backward_next), best
+
+    def explored(self):
+        """Positions expanded by either side of the last search."""
+        return [self.search_grid.position(index) for index in self.closed]
+
+    def forward_moves(self, index):
+        result = []
+        for offset, entry in self.moves:
+            other = index + offset
+            if self.passable[other]:
+                result.append((other, entry[other]))
+        for other in self.stair_links.get(index, ()):
+            result.append((other, self.vertical[other]))
+        return result
+
+    def backward_moves(self, index):
+        # Cells that can move into index; the cost depends on the entered cell only
+        result = []
+        for offset, entry in self.moves:
+            other = index - offset
+            if self.inside[other]:
+                result.append((other, entry[index]))
+        for other in self.stair_links.get(index, ()):
+            result.append((other, self.vertical[index]))
+        return result
+
+    def reconstruct_path(self, meeting, forward_parent, backward_next):
+        sg = self.search_grid
+        path = []
+        index = meeting
+        while index is not None:
+            path.append(sg.position(index))
+            index = forward_parent[index]
+        path.reverse()
+        index = backward_next[meeting]
+        while index is not None:
+            path.append(sg.position(index))
+            index = backward_next[index]
+        return path
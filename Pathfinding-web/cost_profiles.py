@@ -0,0 +1,88 @@
+import numpy as np
+
+
+class UnknownCostProfile(ValueError):
+    pass
+
+
+class CostProfile:
+    """
+    Declarative move costs for one kind of user, compiled into cost arrays by SearchGrid.
+
+    Costs are in multiples of the grid size. Entering a cell costs the base cost of the move plus the
+    extra cost of the cell's element type, and element types in impassable are never entered.
+
+    :param name: Name a request selects the profile by
+    :param extra_costs: Extra cost of entering each element type, e.g. {'door': 5}
+    :param straight: Base cost of a straight move
+    :param diagonal: Diagonal cost, a factor on the whole straight cost of the cell with proportional_diagonal
+                     or else a base cost the extra cost is added to
+    :param floor_change: Base cost of taking a stair to another floor
+    :param impassable: Element types that cannot be entered, besides walls and wall buffers
+    :param minimize_cost: Whether paths minimize weighted cost (True) or walking distance, for the heuristic
+    :param description: One line for the profile list of the web client
+    """
+
+    def __init__(self, name, extra_costs=None, straight=1.0, diagonal=1.414, proportional_diagonal=True,
+                 floor_change=1.0, impassable=(), minimize_cost=True, description=''):
+        self.name = name
+        self.extra_costs = dict(extra_costs or {})
+        self.straight = straight
+        self.diagonal = diagonal
+        self.proportional_diagonal = proportional_diagonal
+        self.floor_change = floor_change
+        self.impassable = tuple(impassable)
+        self.minimize_cost = minimize_cost
+        self.description = description
+
+    def move_costs(self, extra, grid_size):
+        """
+        (straight, diagonal, vertical) costs of entering cells, for one cell or an array of cells.
+
+        :param extra: Extra cost of the entered cells, already multiplied by the grid size
+        """
+        gs = grid_size
+        straight = self.straight * gs + extra
+        if self.proportional_diagonal:
+            diagonal = straight * self.diagonal
+        else:
+            diagonal = self.diagonal * gs + extra
+        vertical = self.floor_change * gs + extra
+        return straight, diagonal, vertical
+
+    def move_cost(self, element_type, kind, grid_size):
+        """Cost of a 'straight', 'diagonal' or 'vertical' move into a cell of element_type."""
+        straight, diagonal, vertical = self.move_costs(self.extra_costs.get(element_type, 0) * grid_size, grid_size)
+        return {'straight': straight, 'diagonal': diagonal, 'vertical': vertical}[kind]
+
+    def as_dict(self):
+        return {'name': self.name, 'description': self.description, 'extra_costs': self.extra_costs,
+                'impassable': list(self.impassable), 'minimize_cost': self.minimize_cost}
+
+
+# The two original modes of get_cost, selected by minimize_cost
+COST = CostProfile('cost', {'door': 5, 'stair': 1.25, 'walla': 10},
+                   description='Doors, stairs and cells near walls cost extra')
+DISTANCE = CostProfile('distance', {'walla': 10}, diagonal=float(np.sqrt(2)), proportional_diagonal=False,
+                       floor_change=3.0, minimize_cost=False,
+                       description='Shortest walking distance with a penalty for changing floors')
+
+COST_PROFILES = {profile.name: profile for profile in [
+    COST,
+    DISTANCE,
+    CostProfile('wheelchair', {'door': 8, 'walla': 10}, impassable=('stair',),
+                description='No stairs, and doors take longer to get through'),
+    CostProfile('no-stairs', {'door': 5, 'walla': 10}, impassable=('stair',),
+                description='The default costs without stairs, e.g. with a stroller or luggage'),
+    CostProfile('responder', {'door': 0.5, 'stair': 0.5, 'walla': 10},
+                description='Fire brigade: doors are forced and stairs are taken at a run'),
+]}
+
+
+def cost_profile(name=None, minimize_cost=True):
+    """The profile with this name, or the original cost or distance profile when name is None."""
+    if name is None:
+        return COST if minimize_cost else DISTANCE
+    if name not in COST_PROFILES:
+        raise UnknownCostProfile(f"Unknown cost profile {name!r}, expected one of {', '.join(COST_PROFILES)}")
+    return COST_PROFILES[name]
@@ -0,0 +1,135 @@
+import heapq
+from collections import OrderedDict
+
+import numpy as np
+
+
+class DistanceField:
+    """
+    Cost-to-goal and next-step pointer for every cell, computed with one reverse Dijkstra from the goals.
+
+    Once computed, the optimal path from any start cell is found by following the pointers, in
+    O(path length).
+    """
+
+    def __init__(self, search_grid, goals, cost=None, next_index=None):
+        self.search_grid = search_grid
+        self.goals = [tuple(goal) for goal in goals]
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.max_open_size = 0
+        if cost is None:
+            cost, next_index = self.compute()
+        # Fields computed elsewhere (e.g. in a worker process) are passed in as arrays
+        self.cost, self.next_index = cost, next_index
+
+    def compute(self):
+        sg = self.search_grid
+        cost = [float('inf')] * sg.size
+        next_index = [-1] * sg.size
+        passable = sg.passable.tolist()
+        inside = sg.inside.tolist()
+        moves = [(offset, entry.tolist()) for offset, entry in sg.moves]
+        vertical = sg.vertical_cost.tolist()
+        stair_links = sg.stair_links
+
+        heap = []
+        for goal in self.goals:
+            if sg.contains(goal):
+                index = sg.index(goal)
+                cost[index] = 0.0
+                heap.append((0.0, index))
+        heapq.heapify(heap)
+        pushed = len(heap)
+        expanded = 0
+        max_open = len(heap)
+
+        while heap:
+            if len(heap) > max_open:
+                max_open = len(heap)
+            d, v = heapq.heappop(heap)
+            if d > cost[v] or not passable[v]:
+                # Impassable cells can only be a start, never a step on a path
+                continue
+            expanded += 1
+            # Relax every cell u that has v as a neighbour; the move cost depends only on v
+            for offset, entry in moves:
+                u = v - offset
+                if inside[u]:
+                    nd = d + entry[v]
+                    if nd < cost[u]:
+                        cost[u] = nd
+                        next_index[u] = v
+                        heapq.heappush(heap, (nd, u))
+                        pushed += 1
+            for u in stair_links.get(v, ()):
+                nd = d + vertical[v]
+                if nd < cost[u]:
+                    cost[u] = nd
+                    next_index[u] = v
+                    heapq.heappush(heap, (nd, u))
+                    pushed += 1
+
+        self.nodes_expanded, self.nodes_pushed, self.max_open_size = expanded, pushed, max_open
+        return np.array(cost), np.array(next_index, dtype=np.int64)
+
+    def cost_to_goal(self, position):
+        if not self.search_grid.contains(position):
+            return float('inf')
+        return float(self.cost[self.search_grid.index(position)])
+
+    def path_from(self, start):
+        """Follow the next-step pointers from start to the nearest goal. Returns None if no goal is reachable."""
+        if not np.isfinite(self.cost_to_goal(start)):
+            return None
+        sg = self.search_grid
+        index = sg.index(start)
+        path = [sg.position(index)]
+        while self.next_index[index] != -1:
+            index = int(self.next_index[index])
+            path.append(sg.position(index))
+        return path
+
+    def cost_grid(self):
+        """Cost-to-goal as a (floors, rows, cols) array, inf where no goal is reachable."""
+        return self.search_grid.unpad(self.cost)
+
+
+class DistanceFieldCache:
+    """LRU cache of distance fields keyed by (grid version, goal set, cost profile)."""
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.fields = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(search_grid, goals):
+        return search_grid.version, frozenset(tuple(goal) for goal in goals), search_grid.profile
+
+    def get(self, search_grid, goals):
+        field = self.lookup(search_grid, goals)
+        if field is None:
+            field = DistanceField(search_grid, goals)
+            self.put(search_grid, goals, field)
+        return field
+
+    def lookup(self, search_grid, goals):
+        """Cached field for this grid and goal set, or None (counted as a miss) without computing it."""
+        key = self.key(search_grid, goals)
+        field = self.fields.get(key)
+        if field is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.fields.move_to_end(key)
+        return field
+
+    def put(self, search_grid, goals, field):
+        self.fields[self.key(search_grid, goals)] = field
+        while len(self.fields) > self.maxsize:
+            self.fields.popitem(last=False)
+
+    def clear(self):
+        self.fields.clear()
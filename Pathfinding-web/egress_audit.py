@@ -0,0 +1,210 @@
+"""
+Travel distance from every room (IfcSpace) of a model to its nearest exit, as a CSV and a JSON report.
+
+Run from the Pathfinding-web folder:
+
+    python egress_audit.py Duplex.ifc --grids bim_grids.json --output audit
+    python egress_audit.py Duplex.ifc --grid-size 0.2 --wall-buffer 0.2 --cost-profile wheelchair
+
+Without --grids the model is converted first, as ifc_processor does. Every space is rasterized onto the
+floor its geometry starts on: the cells whose centre lies under the space's triangles. One distance field
+from all exits together (one reverse Dijkstra over every floor, see SparseGraph.distance_field) then gives
+the distance of every cell of every room, so the audit costs the same for 20 or 2000 spaces. A room's
+distance is that of its most remote walkable cell; the distance from the walkable cell nearest its centroid
+is reported as well. The JSON report also holds the route from the most remote cell of the worst room.
+"""
+import argparse
+import csv
+import json
+import sys
+
+import numpy as np
+
+import ifc_processor
+from exits import find_exits
+from pathfinder import InteractiveBIMPathfinder
+
+CSV_FIELDS = ['global_id', 'name', 'long_name', 'floor', 'cells', 'walkable_cells', 'centroid_row', 'centroid_col',
+              'centroid_distance', 'remote_row', 'remote_col', 'remote_distance', 'exit_row', 'exit_col', 'exit_floor',
+              'status']
+
+
+def floor_of(min_z, floors, tolerance=0.5):
+    """Index of the floor a space whose geometry starts at min_z stands on, or None above or below all floors."""
+    for index, floor in enumerate(floors):
+        if floor['elevation'] - tolerance <= min_z < floor['elevation'] + floor['height'] - tolerance:
+            return index
+    return None
+
+
+def rasterize_footprint(verts, faces, shape, bbox, grid_size):
+    """
+    Cells of a (rows, cols) grid whose centre lies under one of the triangles of a space, seen from above.
+
+    :return: (rows, cols) index arrays of the cells; index arrays instead of a mask per space keep
+             thousands of spaces on a large grid in memory
+    """
+    covered = []
+    points = np.asarray(verts, dtype=float).reshape(-1, 3)[:, :2]
+    origin = np.array([bbox['min_x'], bbox['min_y']])
+    for a, b, c in points[np.asarray(faces, dtype=np.int64).reshape(-1, 3)]:
+        area = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+        if abs(area) < 1e-12:
+            continue  # A vertical face covers no cells
+        low = np.maximum(np.floor((np.minimum(np.minimum(a, b), c) - origin) / grid_size).astype(int), 0)
+        high = np.minimum(np.ceil((np.maximum(np.maximum(a, b), c) - origin) / grid_size).astype(int), shape)
+        if np.any(low >= high):
+            continue  # Outside the (trimmed) grid
+        rows, cols = np.mgrid[low[0]:high[0], low[1]:high[1]]
+        px = origin[0] + (rows + 0.5) * grid_size
+        py = origin[1] + (cols + 0.5) * grid_size
+        # Barycentric coordinates of the cell centres; all three have the sign of the area inside
+        u = ((b[0] - px) * (c[1] - py) - (b[1] - py) * (c[0] - px)) / area
+        v = ((c[0] - px) * (a[1] - py) - (c[1] - py) * (a[0] - px)) / area
+        inside = (u >= 0) & (v >= 0) & (u + v <= 1)
+        covered.append(rows[inside] * shape[1] + cols[inside])
+    cells = np.unique(np.concatenate(covered)) if covered else np.zeros(0, dtype=np.int64)
+    return cells // shape[1], cells % shape[1]
+
+
+def read_spaces(ifc_file, bbox, floors, grid_size, shape):
+    """
+    Every IfcSpace with its floor and footprint.
+
+    :param shape: (rows, cols) of the floor grids
+    :return: List of dicts with global_id, name, long_name, floor (None when the space is on no floor),
+             centroid (x, y in world coordinates) and footprint ((rows, cols) arrays, None without geometry)
+    """
+    spaces = []
+    for space in ifc_file.by_type('IfcSpace'):
+        entry = {'global_id': space.GlobalId, 'name': space.Name, 'long_name': space.LongName,
+                 'floor': None, 'centroid': None, 'footprint': None}
+        geometry = ifc_processor.tessellate_element(space) if space.Representation else None
+        if geometry is not None and geometry[0]:
+            verts, faces = geometry
+            points = np.asarray(verts, dtype=float).reshape(-1, 3)
+            entry['floor'] = floor_of(points[:, 2].min(), floors)
+            entry['centroid'] = points[:, :2].mean(axis=0)
+            entry['footprint'] = rasterize_footprint(verts, faces, shape, bbox, grid_size)
+        spaces.append(entry)
+    return spaces
+
+
+def audit_space(space, cost, next_cell, search_grid, bbox, grid_size):
+    """Report row of one space, from the (floors, rows, cols) cost-to-exit grid."""
+    row = {field: None for field in CSV_FIELDS}
+    row.update(global_id=space['global_id'], name=space['name'], long_name=space['long_name'], floor=space['floor'])
+    if space['footprint'] is None or space['floor'] is None:
+        row['status'] = 'unplaced'
+        return row
+    z = space['floor']
+    xs, ys = space['footprint']
+    distances = cost[z][xs, ys]
+    walkable = np.isfinite(distances)
+    row['cells'], row['walkable_cells'] = len(xs), int(walkable.sum())
+    if not walkable.any():
+        row['status'] = 'unreachable' if len(xs) else 'unplaced'
+        return row
+    xs, ys, distances = xs[walkable], ys[walkable], distances[walkable]
+    cx = (space['centroid'][0] - bbox['min_x']) / grid_size - 0.5
+    cy = (space['centroid'][1] - bbox['min_y']) / grid_size - 0.5
+    centroid = int(np.argmin((xs - cx) ** 2 + (ys - cy) ** 2))
+    remote = int(np.argmax(distances))
+    row.update(centroid_row=int(xs[centroid]), centroid_col=int(ys[centroid]),
+               centroid_distance=round(float(distances[centroid]), 3),
+               remote_row=int(xs[remote]), remote_col=int(ys[remote]),
+               remote_distance=round(float(distances[remote]), 3), status='ok')
+    # The exit the most remote cell is routed to: follow the next-step pointers to the end
+    index = search_grid.index((int(xs[remote]), int(ys[remote]), z))
+    while next_cell[index] != -1:
+        index = int(next_cell[index])
+    row['exit_row'], row['exit_col'], row['exit_floor'] = search_grid.position(index)
+    return row
+
+
+def egress_audit(ifc_file, grids, bbox, floors, grid_size, wall_buffer=0.0, cost_profile='distance'):
+    """
+    Distance from every space to its nearest exit.
+
+    :param ifc_file: Opened ifcopenshell file with the spaces
+    :param grids: Floor grids of element type strings converted from the same model
+    :param cost_profile: Name of one of COST_PROFILES; 'distance' measures walking distance in metres
+    :return: Report dict with the settings, exits, one row per space and the route from the worst room
+    """
+    grids = [np.asarray(grid) for grid in grids]
+    pathfinder = InteractiveBIMPathfinder(grids, grid_size, floors, bbox)
+    pathfinder.wall_buffer = wall_buffer
+    pathfinder.cost_profile = cost_profile
+    pathfinder.apply_wall_buffer()
+    search_grid = pathfinder.compile_search_grid()
+    exits = find_exits(grids)
+    field = pathfinder.compile_sparse_graph().distance_field(exits)
+    cost = field.cost_grid()
+
+    spaces = read_spaces(ifc_file, bbox, floors, grid_size, grids[0].shape)
+    rows = [audit_space(space, cost, field.next_index, search_grid, bbox, grid_size) for space in spaces]
+
+    worst = None
+    audited = [row for row in rows if row['status'] == 'ok']
+    if audited:
+        row = max(audited, key=lambda row: row['remote_distance'])
+        route = field.path_from((row['remote_row'], row['remote_col'], row['floor']))
+        worst = {**row, 'route': [list(position) for position in route]}
+    return {
+        'grid_size': grid_size,
+        'wall_buffer': wall_buffer,
+        'cost_profile': cost_profile,
+        'exits': [list(exit) for exit in exits],
+        'spaces': rows,
+        'counts': {status: sum(row['status'] == status for row in rows) for status in ('ok', 'unreachable', 'unplaced')},
+        'worst': worst,
+    }
+
+
+def write_csv(rows, filename):
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: '' if row[field] is None else row[field] for field in CSV_FIELDS})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('ifc', help='IFC model with the spaces')
+    parser.add_argument('--grids', help='Grids JSON converted from the model; converted now when left out')
+    parser.add_argument('--grid-size', type=float, default=0.2, help='Grid size when converting the model')
+    parser.add_argument('--wall-buffer', type=float, default=0.0)
+    parser.add_argument('--cost-profile', default='distance')
+    parser.add_argument('--output', default='egress_audit', help='Report file name without .csv or .json')
+    args = parser.parse_args(argv)
+
+    ifc_file = ifc_processor.load_ifc_file(args.ifc)
+    if args.grids:
+        with open(args.grids) as f:
+            data = json.load(f)
+        grids, bbox, floors, grid_size = data['grids'], data['bbox'], data['floors'], data['grid_size']
+    else:
+        grid_size = args.grid_size
+        grids, bbox, floors = ifc_processor.create_navigation_grid(args.ifc, grid_size)
+
+    report = egress_audit(ifc_file, grids, bbox, floors, grid_size, args.wall_buffer, args.cost_profile)
+    if not report['exits']:
+        print("No exits found: no door touches the outside of the building")
+        return 1
+    write_csv(report['spaces'], f'{args.output}.csv')
+    with open(f'{args.output}.json', 'w') as f:
+        json.dump(report, f, indent=2)
+
+    counts, worst = report['counts'], report['worst']
+    print(f"{counts['ok']} spaces audited, {counts['unreachable']} without a route to an exit, "
+          f"{counts['unplaced']} not on the grid")
+    if worst is not None:
+        print(f"Worst case: {worst['name']} {worst['long_name'] or ''} on floor {worst['floor']}, "
+              f"{worst['remote_distance']} to the exit at {worst['exit_row']}, {worst['exit_col']}")
+    print(f"Wrote {args.output}.csv and {args.output}.json")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
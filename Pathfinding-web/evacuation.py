@@ -0,0 +1,272 @@
+import math
+
+import numpy as np
+from scipy import ndimage
+
+from distance_field import DistanceField
+from search_grid import DOOR
+from sparse_graph import SparseGraph
+
+
+def group_ranks(groups):
+    """Position of every element within its group, in the order the elements are given."""
+    order = np.argsort(groups, kind='stable')
+    ordered = groups[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    ranks = np.empty(len(groups), dtype=np.int64)
+    ranks[order] = np.arange(len(groups)) - np.repeat(starts, np.diff(np.r_[starts, len(groups)]))
+    return ranks
+
+
+def random_agents(buffered_grids, count, seed=0):
+    """count distinct random floor cells (x, y, z) of the buffered grids, as start cells for agents."""
+    rng = np.random.default_rng(seed)
+    cells = [(int(x), int(y), z) for z, floor in enumerate(buffered_grids) for x, y in np.argwhere(floor == 'floor')]
+    return [cells[i] for i in rng.choice(len(cells), size=min(count, len(cells)), replace=False)]
+
+
+class EvacuationSimulation:
+    """
+    Crowd evacuation of many agents over a SearchGrid, with shared flow fields toward the exits.
+
+    One distance field toward all exits gives every cell its next step, so agents are moved with array
+    operations instead of one search per agent. Each time step the agents that finished their previous
+    step try to take the next one, in random order, subject to two capacity limits:
+
+    - doors: every door (a connected group of door cells) lets through at most door_flow agents per
+      second per metre of door width;
+    - density: agents cannot enter a block of about one square metre that is already at max_density
+      agents per square metre. Walking speed drops linearly with the density of the block, to zero at
+      jam_density (as in Weidmann's fundamental diagram), so a queue at max_density still moves at
+      about the flow a door lets through. Agents that have waited more than patience seconds push into a
+      full block anyway, up to jam_density, which breaks up rings of full blocks waiting on each other.
+
+    Every replan_interval seconds the flow field is recomputed with move costs raised in crowded
+    blocks, so agents spread over alternative exits and routes.
+    """
+
+    def __init__(self, search_grid, exits, floors=None, walking_speed=1.2, stair_speed=0.6, door_flow=1.3,
+                 max_density=4.0, jam_density=5.4, congestion_weight=2.0, replan_interval=60.0, block_size=1.0,
+                 patience=10.0, time_step=None, backend='python'):
+        """
+        :param search_grid: Compiled SearchGrid of the buffered grids
+        :param exits: List of (x, y, z) exit cells, e.g. from exits.find_exits
+        :param floors: Optional list of floor dicts with an 'elevation', for the length of stair climbs
+        :param walking_speed: Free walking speed in m/s
+        :param stair_speed: Speed along the height of a stair climb in m/s
+        :param door_flow: Door capacity in agents per second per metre of door width
+        :param max_density: Agents per square metre above which a block cannot be entered
+        :param jam_density: Agents per square metre at which walking speed would drop to zero
+        :param congestion_weight: Cost increase of a block at max_density when the field is recomputed
+        :param replan_interval: Seconds between flow field updates (each is a full Dijkstra over the grid),
+                                None to keep the first field
+        :param block_size: Size in metres of the blocks over which density is measured
+        :param patience: Seconds an agent waits for room in a full block before pushing in anyway
+        :param time_step: Seconds per step, default the time to walk one cell
+        :param backend: 'scipy' to compute the flow fields with scipy.sparse.csgraph instead of in Python
+        """
+        sg = search_grid
+        self.search_grid = sg
+        self.exits = [tuple(exit) for exit in exits if sg.contains(exit)]
+        self.walking_speed = walking_speed
+        self.stair_speed = stair_speed
+        self.max_density = max_density
+        self.jam_density = jam_density
+        self.congestion_weight = congestion_weight
+        self.replan_interval = replan_interval
+        self.patience = patience
+        self.backend = backend
+        self.time_step = time_step or sg.grid_size / walking_speed
+        self.floor_stride = sg.floor_stride
+        self.row_stride = sg.padded_shape[2]
+        self.elevations = np.array([floor['elevation'] for floor in floors]) \
+            if floors and all('elevation' in floor for floor in floors) else None
+
+        # Density blocks of about block_size metres, numbered over all floors
+        self.block_cells = max(1, int(round(block_size / sg.grid_size)))
+        z, x, y = np.unravel_index(np.arange(sg.size), sg.padded_shape)
+        bx = np.clip(x - 1, 0, None) // self.block_cells
+        by = np.clip(y - 1, 0, None) // self.block_cells
+        self.block_shape = (sg.num_floors, int(bx.max()) + 1, int(by.max()) + 1)
+        self.cell_block = np.ravel_multi_index((z, bx, by), self.block_shape)
+        self.num_blocks = int(np.prod(self.block_shape))
+        block_area = np.bincount(self.cell_block, weights=sg.passable, minlength=self.num_blocks)
+        # Blocks cut by walls count as at least a quarter block, so one agent there is not a crowd
+        self.block_area = np.maximum(block_area, self.block_cells ** 2 / 4) * sg.grid_size ** 2
+        self.block_capacity = np.maximum(1, np.floor(self.max_density * self.block_area))
+        self.jam_capacity = np.maximum(self.block_capacity + 1, np.floor(self.jam_density * self.block_area))
+
+        # Doors: connected door cells share one flow capacity
+        self.cell_door = np.full(sg.size, -1, dtype=np.int64)
+        door_widths = []
+        for floor in range(sg.num_floors):
+            labels, count = ndimage.label(sg.codes[floor] == DOOR)
+            for label, extent in enumerate(ndimage.find_objects(labels)):
+                xs, ys = np.nonzero(labels[extent] == label + 1)
+                cells = [sg.index((x + extent[0].start, y + extent[1].start, floor)) for x, y in zip(xs, ys)]
+                self.cell_door[cells] = len(door_widths)
+                door_widths.append(max(extent[0].stop - extent[0].start, extent[1].stop - extent[1].start))
+        self.door_rate = np.array(door_widths, dtype=np.float64) * sg.grid_size * door_flow
+        self.field = None
+        self.nodes_expanded = 0  # Cells settled by all flow field computations of the last run
+
+    def flow_field(self, density=None):
+        """Distance field toward the exits; with a block density, crowded cells cost more."""
+        sg = self.search_grid
+        if density is not None and self.congestion_weight:
+            factor = 1.0 + self.congestion_weight * np.minimum(density / self.max_density, 1.0)[self.cell_block]
+            sg = sg.scaled(factor)
+        if self.backend == 'scipy':
+            self.field = SparseGraph(sg).distance_field(self.exits)
+        else:
+            self.field = DistanceField(sg, self.exits)
+        self.nodes_expanded += self.field.nodes_expanded
+        return self.field
+
+    def step_times(self, sources, targets, density):
+        """Seconds for moves from the source to the target cells, slowed down by the density at the source."""
+        gs = self.search_grid.grid_size
+        difference = np.abs(targets - sources)
+        vertical = difference >= self.floor_stride
+        diagonal = ~vertical & (difference != 1) & (difference != self.row_stride)
+        length = np.where(diagonal, gs * math.sqrt(2), gs)
+        speed = self.walking_speed * np.clip(1.0 - density[self.cell_block[sources]] / self.jam_density, 0.1, 1.0)
+        times = length / speed
+        if vertical.any():
+            if self.elevations is not None:
+                climb = np.abs(self.elevations[targets[vertical] // self.floor_stride] -
+                               self.elevations[sources[vertical] // self.floor_stride])
+            else:
+                climb = 3.0
+            times[vertical] = climb / self.stair_speed
+        return times
+
+    def admit(self, entering, source_blocks, target_blocks, occupancy):
+        """Which of the moves into another block fit, given the block occupancy at the start of the step."""
+        sources = source_blocks[entering]
+        targets = target_blocks[entering]
+        ranks = group_ranks(targets)
+        room = self.block_capacity[targets] - occupancy[targets]
+        admitted = ranks < room
+        # Agents that are sure to leave a block make room for others in the same step
+        leaving = np.bincount(sources[admitted], minlength=self.num_blocks)
+        admitted = ranks < room + leaving[targets]
+        # Two full blocks can still swap agents: pair moves A -> B with moves B -> A
+        waiting = np.flatnonzero(~admitted)
+        if len(waiting):
+            pairs = sources[waiting] * self.num_blocks + targets[waiting]
+            reverse = targets[waiting] * self.num_blocks + sources[waiting]
+            keys, counts = np.unique(pairs, return_counts=True)
+            match = np.searchsorted(keys, reverse).clip(max=len(keys) - 1)
+            partners = np.where(keys[match] == reverse, counts[match], 0)
+            admitted[waiting] = group_ranks(pairs) < partners
+        return admitted
+
+    def run(self, agents, max_time=3600.0, seed=0, stall_time=60.0):
+        """
+        Simulate the evacuation of agents until every reachable agent is out, max_time has passed, or no
+        agent has moved for stall_time seconds.
+
+        :param agents: List of (x, y, z) start cells, one per agent
+        :return: Dict with the per-agent 'egress_times' (inf if not out), the number 'evacuated', the number
+                 'unreachable' (no exit reachable from their cell), the number 'stuck' (still inside
+                 at the end), the 'total_time' until the last agent was out,
+                 and 'mean_density' and 'max_density' heatmaps in agents per square metre, per block
+                 of 'block_cells' cells, shaped (floors, block rows, block cols)
+        """
+        sg = self.search_grid
+        rng = np.random.default_rng(seed)
+        self.nodes_expanded = 0
+        position = np.array([sg.index(agent) for agent in agents], dtype=np.int64)
+        egress = np.full(len(position), np.inf)
+        ready = np.zeros(len(position))
+        active = np.ones(len(position), dtype=bool)
+
+        field = self.flow_field()
+        exit_cells = np.array([sg.index(exit) for exit in self.exits], dtype=np.int64)
+        is_exit = np.zeros(sg.size, dtype=bool)
+        is_exit[exit_cells] = True
+        out = is_exit[position]
+        egress[out] = 0.0
+        active[out] = False
+        unreachable = active & ~np.isfinite(field.cost[position])
+        active &= ~unreachable
+
+        door_credit = np.zeros(len(self.door_rate))
+        density_sum = np.zeros(self.num_blocks)
+        density_max = np.zeros(self.num_blocks)
+        steps = 0
+        t = 0.0
+        last_move = 0.0
+        next_replan = self.replan_interval
+        dt = self.time_step
+        while active.any() and t < max_time and t - last_move <= stall_time:
+            occupancy = np.bincount(self.cell_block[position[active]], minlength=self.num_blocks)
+            density = occupancy / self.block_area
+            density_sum += density
+            np.maximum(density_max, density, out=density_max)
+            steps += 1
+
+            if next_replan is not None and t >= next_replan:
+                # Recomputing the field takes a whole Dijkstra, only worth it when there is congestion
+                if density.max() >= self.max_density / 2:
+                    field = self.flow_field(density)
+                next_replan += self.replan_interval
+
+            # Doors regain capacity over time, without saving up more than one step's worth
+            door_credit = np.minimum(door_credit + self.door_rate * dt, np.maximum(self.door_rate * dt, 1.0))
+
+            movers = rng.permutation(np.flatnonzero(active & (ready <= t)))
+            sources = position[movers]
+            targets = field.next_index[sources]
+            keep = targets >= 0
+            movers, sources, targets = movers[keep], sources[keep], targets[keep]
+
+            # Door capacity: the first movers into each door, as many as it has credit for. Steps
+            # within a door (doors are several cells thick) do not count again.
+            door = self.cell_door[targets]
+            into_door = (door >= 0) & (door != self.cell_door[sources])
+            allowed = np.ones(len(movers), dtype=bool)
+            if into_door.any():
+                ranks = group_ranks(door[into_door])
+                allowed[into_door] = ranks < np.floor(door_credit[door[into_door]])
+
+            # Density: no more agents into a block than it has room for
+            source_blocks = self.cell_block[sources]
+            target_blocks = self.cell_block[targets]
+            entering = allowed & (target_blocks != source_blocks) & ~is_exit[targets]
+            if entering.any():
+                allowed &= ~entering
+                admitted = self.admit(entering, source_blocks, target_blocks, occupancy)
+                # One agent per block and step that waited too long pushes in anyway, up to jam density
+                blocks = target_blocks[entering]
+                pushing = ~admitted & (t - ready[movers[entering]] > self.patience) & \
+                    (occupancy[blocks] < self.jam_capacity[blocks])
+                if pushing.any():
+                    pushing[pushing] = group_ranks(blocks[pushing]) == 0
+                    admitted |= pushing
+                allowed[entering] = admitted
+
+            movers, sources, targets = movers[allowed], sources[allowed], targets[allowed]
+            if len(movers):
+                last_move = t
+            passed = door[allowed][into_door[allowed]]
+            np.subtract.at(door_credit, passed, 1.0)
+            arrival = np.maximum(ready[movers], t) + self.step_times(sources, targets, density)
+            position[movers] = targets
+            ready[movers] = arrival
+            done = is_exit[targets]
+            egress[movers[done]] = arrival[done]
+            active[movers[done]] = False
+            t += dt
+
+        return {
+            'egress_times': egress,
+            'evacuated': int(np.isfinite(egress).sum()),
+            'unreachable': int(unreachable.sum()),
+            'stuck': int(active.sum()),
+            'total_time': float(egress[np.isfinite(egress)].max(initial=0.0)),
+            'block_cells': self.block_cells,
+            'mean_density': (density_sum / max(steps, 1)).reshape(self.block_shape),
+            'max_density': density_max.reshape(self.block_shape),
+        }
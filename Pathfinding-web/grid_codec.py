@@ -0,0 +1,80 @@
+import base64
+import binascii
+
+import numpy as np
+
+from search_grid import ELEMENT_TYPES, encode_grid
+
+ELEMENT_LOOKUP = np.array(ELEMENT_TYPES, dtype=object)
+
+
+class InvalidGridPayload(ValueError):
+    pass
+
+
+def encode_floor(grid):
+    """
+    Run-length encode one floor grid.
+
+    Cells are converted to their uint8 element codes and read row by row. Each run is stored as its
+    code (uint8) and its length (little-endian uint32), and both arrays are sent base64 encoded.
+
+    :param grid: 2D array or nested list of element type strings
+    :return: Dict with 'shape', 'values' and 'lengths'
+    """
+    grid = np.asarray(grid)
+    codes = encode_grid(grid)
+    if ((codes == 0) & (grid != 'empty')).any():
+        raise ValueError("Grid contains unknown element types")
+
+    codes = codes.ravel()
+    starts = np.flatnonzero(np.diff(codes)) + 1
+    if codes.size:
+        starts = np.concatenate(([0], starts))
+    lengths = np.diff(np.append(starts, codes.size))
+    return {
+        'shape': list(grid.shape),
+        'values': base64.b64encode(codes[starts].astype(np.uint8).tobytes()).decode('ascii'),
+        'lengths': base64.b64encode(lengths.astype('<u4').tobytes()).decode('ascii'),
+    }
+
+
+def decode_floor(floor, lookup=ELEMENT_LOOKUP):
+    """
+    :param floor: Dict with 'shape', 'values' and 'lengths' from encode_floor
+    :param lookup: Element type string of every code used in values
+    """
+    try:
+        values = np.frombuffer(base64.b64decode(floor['values'], validate=True), dtype=np.uint8)
+        lengths = np.frombuffer(base64.b64decode(floor['lengths'], validate=True), dtype='<u4')
+        shape = tuple(int(n) for n in floor['shape'])
+    except (binascii.Error, KeyError, TypeError, ValueError):
+        raise InvalidGridPayload("Invalid run-length encoded floor") from None
+    if len(shape) != 2 or min(shape) < 0 or values.size != lengths.size or \
+            int(lengths.sum(dtype=np.int64)) != shape[0] * shape[1] or (values >= len(lookup)).any():
+        raise InvalidGridPayload("Invalid run-length encoded floor")
+    return lookup[np.repeat(values, lengths)].reshape(shape)
+
+
+def encode_grids(grids):
+    """Compact payload for a list of floor grids; the element type order is sent along for the decoder."""
+    return {'encoding': 'rle', 'element_types': ELEMENT_TYPES, 'floors': [encode_floor(grid) for grid in grids]}
+
+
+def decode_grids(payload):
+    """
+    Floor grids (object arrays of element type strings) from an encode_grids payload.
+
+    Codes are read with the payload's element_types, so a payload from an encoder with another element
+    type order still decodes to the right types; payloads without it use ELEMENT_TYPES. Malformed payloads
+    raise InvalidGridPayload.
+    """
+    if payload.get('encoding') != 'rle':
+        raise InvalidGridPayload(f"Unsupported grid encoding: {payload.get('encoding')}")
+    element_types = payload.get('element_types', ELEMENT_TYPES)
+    if not isinstance(element_types, list) or any(name not in ELEMENT_TYPES for name in element_types):
+        raise InvalidGridPayload(f"Unknown element types, expected names from {', '.join(ELEMENT_TYPES)}")
+    if not isinstance(payload.get('floors'), list):
+        raise InvalidGridPayload("Payload has no list of floors")
+    lookup = np.array(element_types, dtype=object)
+    return [decode_floor(floor, lookup) for floor in payload['floors']]
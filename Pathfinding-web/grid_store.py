@@ -0,0 +1,130 @@
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from pathfinder import InteractiveBIMPathfinder
+
+
+class VersionConflict(Exception):
+    """An edit was based on an older version of the grids than the one on the server."""
+
+    def __init__(self, version):
+        super().__init__(f"Grids have changed on the server, current version is {version}")
+        self.version = version
+
+
+class GridSession:
+    """
+    The grids of one building, kept on the server between requests.
+
+    Every edit increases the version number. The session keeps a pathfinder whose wall buffer, compiled
+    search grid and room/door abstraction stay warm between requests, and only the floors touched by an
+    edit are re-buffered.
+    """
+
+    def __init__(self, session_id, grids, grid_size, floors, bbox):
+        self.session_id = session_id
+        self.version = 0
+        self.lock = threading.Lock()
+        self.pathfinder = InteractiveBIMPathfinder([np.array(grid, dtype=object) for grid in grids],
+                                                   grid_size, floors, bbox)
+        self.pathfinder.apply_wall_buffer()
+
+    @property
+    def grids(self):
+        return self.pathfinder.grids
+
+    @property
+    def cache_version(self):
+        """Grid version for cache keys; unique per session and edit."""
+        return self.session_id, self.version
+
+    def to_dict(self):
+        """Session metadata; the grids themselves are left to the caller to encode."""
+        pathfinder = self.pathfinder
+        return {'session_id': self.session_id, 'version': self.version, 'grid_size': pathfinder.grid_size,
+                'floors': pathfinder.floors, 'bbox': pathfinder.bbox}
+
+    def apply_edits(self, edits, base_version=None):
+        """
+        Apply a list of cell edits and update the wall buffer of the edited floors.
+
+        :param edits: A list of dicts, each containing 'floor', 'row', 'col', and 'element_type'
+        :param base_version: Version the edits were made against; raises VersionConflict if outdated
+        :return: (changed cells as (row, col, floor) tuples, whether a stair was added or removed,
+                 buffered cell changes as edit dicts)
+        """
+        if base_version is not None and base_version != self.version:
+            raise VersionConflict(self.version)
+
+        grids = self.pathfinder.grids
+        for edit in edits:
+            floor, row, col = edit['floor'], edit['row'], edit['col']
+            if not (0 <= floor < len(grids) and 0 <= row < grids[floor].shape[0] and 0 <= col < grids[floor].shape[1]):
+                raise ValueError("Invalid grid coordinates")
+
+        changed = []
+        stairs_changed = False
+        for edit in edits:
+            floor, row, col = edit['floor'], edit['row'], edit['col']
+            old_type = grids[floor][row, col]
+            if old_type != edit['element_type']:
+                stairs_changed |= 'stair' in (old_type, edit['element_type'])
+                grids[floor][row, col] = edit['element_type']
+                changed.append((row, col, floor))
+
+        buffered_cells = self.rebuffer(sorted({floor for _, _, floor in changed}))
+        if changed:
+            self.pathfinder.search_grid = None
+            self.version += 1
+        return changed, stairs_changed, buffered_cells
+
+    def set_wall_buffer(self, wall_buffer):
+        """Change the wall buffer; returns the buffered cell changes as edit dicts."""
+        if wall_buffer == self.pathfinder.wall_buffer:
+            return []
+        self.pathfinder.wall_buffer = wall_buffer
+        return self.rebuffer(range(len(self.pathfinder.grids)))
+
+    def rebuffer(self, floors):
+        pathfinder = self.pathfinder
+        buffered_cells = []
+        for floor in floors:
+            old = pathfinder.buffered_grids[floor]
+            new = pathfinder.buffer_floor(pathfinder.grids[floor])
+            for row, col in np.argwhere(old != new).tolist():
+                buffered_cells.append({'floor': floor, 'row': row, 'col': col, 'element_type': new[row, col]})
+            pathfinder.buffered_grids[floor] = new
+        if buffered_cells:
+            pathfinder.search_grid = None
+        return buffered_cells
+
+
+class GridStore:
+    """Grid sessions by id, with the least recently used sessions dropped beyond maxsize."""
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def create(self, grids, grid_size, floors, bbox):
+        session = GridSession(uuid.uuid4().hex, grids, grid_size, floors, bbox)
+        with self.lock:
+            self.sessions[session.session_id] = session
+            while len(self.sessions) > self.maxsize:
+                self.sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+            return session
+
+    def remove(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
@@ -0,0 +1,400 @@
+import heapq
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from cost_profiles import DISTANCE
+from distance_field import DistanceField
+from search_grid import WALL, ORTHOGONAL, DIAGONAL
+from sparse_graph import SparseGraph
+
+INF = float('inf')
+
+
+class HazardField:
+    """
+    Hazard level of every cell of a SearchGrid over time: 0 is clear, 1 is untenable (fire or dense smoke).
+
+    The levels come either from a forecast with one (floors, rows, cols) array per time step (from_stack)
+    or from a spreading model (spreading): fire and smoke reach a cell spread_rate m/s after the nearest
+    ignition, through every cell that is not a wall and up and down stairs, and build up to full level
+    over ramp_time seconds. Both can be changed afterwards (set_levels, ignite); only the cells whose
+    levels change are touched, and the changes are kept so routes that avoid them stay valid.
+    A field is monotone when no level ever goes down over time, as with the spreading model.
+    """
+
+    def __init__(self, search_grid, levels=None, time_step=1.0, floors=None, spread_rate=0.1, ramp_time=30.0):
+        sg = search_grid
+        self.search_grid = sg
+        self.time_step = time_step
+        self.spread_rate = spread_rate
+        self.ramp_time = ramp_time
+        self.levels = None  # (steps, cells) forecast
+        self.arrival = None  # Time the hazard reaches every cell, for the spreading model
+        if levels is not None:
+            levels = np.asarray(levels, dtype=np.float64)
+            self.levels = np.zeros((len(levels), sg.size))
+            for step, step_levels in enumerate(levels):
+                self.levels[step] = self.pad(step_levels)
+        else:
+            self.arrival = np.full(sg.size, np.inf)
+            self.compile_spread(floors)
+        self.version = 0
+        self.changes = []  # (version, changed cells, whether any level went down)
+        self.monotone = self.levels is None or bool((np.diff(self.levels, axis=0) >= 0).all())
+
+    @classmethod
+    def from_stack(cls, search_grid, levels, time_step=1.0):
+        """
+        :param levels: (steps, floors, rows, cols) hazard levels in [0, 1]; step k holds from k * time_step
+                       seconds on, the last step holds forever
+        """
+        return cls(search_grid, levels=levels, time_step=time_step)
+
+    @classmethod
+    def spreading(cls, search_grid, ignitions, spread_rate=0.1, ramp_time=30.0, floors=None):
+        """
+        :param ignitions: List of (x, y, z) or (x, y, z, time) ignition cells; time defaults to 0
+        :param spread_rate: Speed in m/s at which the hazard front moves through the building
+        :param ramp_time: Seconds from the arrival of the front until a cell is untenable
+        :param floors: Optional list of floor dicts with an 'elevation', for the height of stair shafts
+        """
+        field = cls(search_grid, floors=floors, spread_rate=spread_rate, ramp_time=ramp_time)
+        field.ignite(ignitions)
+        return field
+
+    def pad(self, values):
+        """Flat per-cell array of a (floors, rows, cols) array; floors may be smaller than the grid."""
+        sg = self.search_grid
+        flat = np.zeros(sg.padded_shape)
+        for z, floor in enumerate(values):
+            floor = np.asarray(floor)
+            flat[z, 1:floor.shape[0] + 1, 1:floor.shape[1] + 1] = floor
+        return flat.ravel()
+
+    def compile_spread(self, floors):
+        sg = self.search_grid
+        gs = sg.grid_size
+        row_stride = sg.padded_shape[2]
+        self.open = (sg.inside & (sg.flat_codes != WALL)).tolist()
+        self.spread_moves = [(dx * row_stride + dy, gs * math.sqrt(2) if dx and dy else gs)
+                             for dx, dy in ORTHOGONAL + DIAGONAL]
+        # Stair shafts connect all stairs, whether or not the cost profile lets people take them
+        self.stair_links = sg.with_profile(DISTANCE, True).stair_links
+        elevations = [floor['elevation'] for floor in floors] \
+            if floors and all('elevation' in floor for floor in floors) else None
+        self.climb = (lambda a, b: abs(elevations[b // sg.floor_stride] - elevations[a // sg.floor_stride])) \
+            if elevations is not None else (lambda a, b: 3.0)
+
+    def ignite(self, ignitions):
+        """
+        Add ignitions to the spreading model; the front is only propagated where it now arrives earlier.
+
+        :param ignitions: List of (x, y, z) or (x, y, z, time) cells
+        :return: Array of cells whose arrival time changed
+        """
+        if self.arrival is None:
+            raise ValueError("ignitions need a spreading hazard field, not a forecast")
+        sg = self.search_grid
+        arrival, open_cells = self.arrival.tolist(), self.open
+        open_list = []
+        for ignition in ignitions:
+            position, time = tuple(ignition[:3]), float(ignition[3]) if len(ignition) > 3 else 0.0
+            if sg.contains(position):
+                cell = sg.index(position)
+                if time < arrival[cell]:
+                    arrival[cell] = time
+                    heapq.heappush(open_list, (time, cell))
+        changed = set()
+        while open_list:
+            time, cell = heapq.heappop(open_list)
+            if time > arrival[cell]:
+                continue  # Stale entry
+            changed.add(cell)
+            moves = [(cell + offset, length) for offset, length in self.spread_moves]
+            moves += [(other, self.climb(cell, other)) for other in self.stair_links.get(cell, ())]
+            for other, length in moves:
+                if open_cells[other]:
+                    other_time = time + length / self.spread_rate
+                    if other_time < arrival[other]:
+                        arrival[other] = other_time
+                        heapq.heappush(open_list, (other_time, other))
+        changed = np.array(sorted(changed), dtype=np.int64)
+        self.arrival[changed] = [arrival[cell] for cell in changed.tolist()]
+        self.record_change(changed, False)
+        return changed
+
+    def set_levels(self, step, levels):
+        """
+        Replace the forecast of one time step, e.g. with measured levels.
+
+        :return: Array of cells whose level changed
+        """
+        if self.levels is None:
+            raise ValueError("levels need a forecast hazard field, not a spreading model")
+        new = self.pad(levels)
+        if step >= len(self.levels):
+            # Later steps than the forecast had continue from its last step
+            extra = np.repeat(self.levels[-1:], step + 1 - len(self.levels), axis=0)
+            self.levels = np.concatenate((self.levels, extra))
+        changed = np.flatnonzero(new != self.levels[step])
+        lowered = bool((new[changed] < self.levels[step][changed]).any())
+        self.levels[step] = new
+        self.monotone = bool((np.diff(self.levels, axis=0) >= 0).all())
+        self.record_change(changed, lowered)
+        return changed
+
+    def record_change(self, cells, lowered):
+        if len(cells):
+            self.version += 1
+            self.changes.append((self.version, cells, lowered))
+
+    def changed_since(self, version):
+        """(cells changed after version, whether any level went down) for the routes planned at version."""
+        changes = [change for change in self.changes if change[0] > version]
+        if not changes:
+            return np.zeros(0, dtype=np.int64), False
+        return np.unique(np.concatenate([cells for _, cells, _ in changes])), any(lowered for *_, lowered in changes)
+
+    def level(self, cells, times):
+        """Hazard levels of cells (an index or an array) at times (seconds, broadcast against cells)."""
+        if self.levels is not None:
+            steps = np.clip(np.floor_divide(times, self.time_step).astype(np.int64), 0, len(self.levels) - 1)
+            return self.levels[steps, cells]
+        arrival = self.arrival[cells]
+        if self.ramp_time <= 0:
+            return (np.asarray(times) >= arrival).astype(np.float64)
+        return np.clip((np.asarray(times) - arrival) / self.ramp_time, 0.0, 1.0)
+
+
+class TimeDependentSearch:
+    """
+    Cheapest path through a HazardField, with the cost of every move taken at the time it is made.
+
+    States are (cell, time slot) pairs of a time-expanded grid: walking times follow the grid size,
+    walking_speed and (on stairs) stair_speed, and entering a cell costs its move cost times
+    1 + hazard_weight * hazard level at the time of arrival. Cells at lethal_level or above cannot be
+    entered at that time. Per time slot of time_resolution seconds the cheapest arrival at a cell is
+    kept; when the hazard is monotone, arriving later at a cell than an arrival that was already
+    expanded there never pays off, so such states are dropped too. The heuristic is the cost to the goals without any hazard (a DistanceField, kept per goal set),
+    which hazards can only increase, so it never overestimates; paths are optimal up to the time slots.
+    """
+
+    def __init__(self, search_grid, hazard, floors=None, walking_speed=1.2, stair_speed=0.6, hazard_weight=10.0,
+                 lethal_level=1.0, time_resolution=None, max_duration=3600.0, backend='python'):
+        sg = search_grid
+        self.search_grid = sg
+        self.hazard = hazard
+        self.walking_speed = walking_speed
+        self.stair_speed = stair_speed
+        self.hazard_weight = hazard_weight
+        self.lethal_level = lethal_level
+        self.time_resolution = time_resolution or sg.grid_size / walking_speed
+        self.max_duration = max_duration
+        self.backend = backend
+        self.elevations = [floor['elevation'] for floor in floors] \
+            if floors and all('elevation' in floor for floor in floors) else None
+        row_stride = sg.padded_shape[2]
+        self.moves = [(dx * row_stride + dy, entry, sg.grid_size * (math.sqrt(2) if dx and dy else 1.0) / walking_speed)
+                      for (dx, dy), (_, entry) in zip(sg.directions, sg.moves)]
+        self.fields = OrderedDict()  # Hazard-free cost to goal per goal set, the heuristic
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.max_open_size = 0
+
+    def heuristic_field(self, goals):
+        key = frozenset(goals)
+        field = self.fields.get(key)
+        if field is None:
+            if self.backend == 'scipy':
+                field = SparseGraph(self.search_grid).distance_field(goals)
+            else:
+                field = DistanceField(self.search_grid, goals)
+            self.fields[key] = field
+            while len(self.fields) > 4:
+                self.fields.popitem(last=False)
+        return field
+
+    def climb_time(self, cell, other):
+        sg = self.search_grid
+        if self.elevations is None:
+            return 3.0 / self.stair_speed
+        return abs(self.elevations[other // sg.floor_stride] - self.elevations[cell // sg.floor_stride]) / self.stair_speed
+
+    def search(self, start, goals, start_time=0.0):
+        """
+        :param start: (x, y, z) start position
+        :param goals: List of (x, y, z) goal positions
+        :param start_time: Seconds into the hazard scenario at which the walk starts
+        :return: (path, cost, arrival times) with a time per path cell, or (None, None, None)
+        """
+        sg = self.search_grid
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.max_open_size = 0
+        goals = [tuple(goal) for goal in goals if sg.contains(goal)]
+        if not sg.contains(start) or not goals:
+            return None, None, None
+        goal_set = {sg.index(goal) for goal in goals}
+        h = self.heuristic_field(goals).cost
+        start_index = sg.index(start)
+        if not np.isfinite(h[start_index]):
+            return None, None, None
+
+        hazard, weight, lethal = self.hazard, self.hazard_weight, self.lethal_level
+        passable = sg.passable
+        resolution, deadline = self.time_resolution, start_time + self.max_duration
+        start_state = (start_index, int(start_time // resolution))
+        best = {start_state: 0.0}
+        earliest = {}  # Earliest expanded arrival per cell, for monotone hazards
+        monotone = hazard.monotone
+        parent = {start_state: (None, start_time)}
+        open_list = [(h[start_index], 0.0, start_time, start_state)]
+        self.nodes_pushed = 1
+        while open_list:
+            self.max_open_size = max(self.max_open_size, len(open_list))
+            _, g, time, state = heapq.heappop(open_list)
+            if g > best[state]:
+                continue  # Stale entry
+            cell = state[0]
+            if monotone:
+                # Expanded in order of cost, so an earlier arrival expanded before was also cheaper
+                if time >= earliest.get(cell, INF):
+                    continue
+                earliest[cell] = time
+            if cell in goal_set:
+                return self.finish(state, parent, g)
+            self.nodes_expanded += 1
+
+            targets, costs, times = [], [], []
+            for offset, entry, duration in self.moves:
+                other = cell + offset
+                if passable[other]:
+                    targets.append(other)
+                    costs.append(entry[other])
+                    times.append(time + duration)
+            for other in sg.stair_links.get(cell, ()):
+                targets.append(other)
+                costs.append(sg.vertical_cost[other])
+                times.append(time + self.climb_time(cell, other))
+            if not targets:
+                continue
+            targets = np.array(targets)
+            times = np.array(times)
+            # Moves are valued with the hazard at the time the cell is entered
+            levels = hazard.level(targets, times)
+            costs = g + np.array(costs) * (1.0 + weight * levels)
+            for other, cost, other_time, level in zip(targets.tolist(), costs.tolist(), times.tolist(),
+                                                        levels.tolist()):
+                if level >= lethal or other_time > deadline or h[other] == INF or \
+                        other_time >= earliest.get(other, INF):
+                    continue
+                other_state = (other, int(other_time // resolution))
+                if cost < best.get(other_state, INF):
+                    best[other_state] = cost
+                    parent[other_state] = (state, other_time)
+                    heapq.heappush(open_list, (cost + h[other], cost, other_time, other_state))
+                    self.nodes_pushed += 1
+        return None, None, None
+
+    def finish(self, state, parent, cost):
+        sg = self.search_grid
+        path, times = [], []
+        while state is not None:
+            previous, time = parent[state]
+            path.append(sg.position(state[0]))
+            times.append(time)
+            state = previous
+        path.reverse()
+        times.reverse()
+        return path, cost, times
+
+
+class HazardRouter:
+    """
+    Route of one person during a drill, kept up to date as they walk and the hazard field changes.
+
+    A new search is only run when the rest of the route is no longer good: when the hazard changed on
+    one of its cells, when a level went down anywhere (a better route may have opened up), or when,
+    timed from where the person is now, one of its cells is lethal on arrival or its cost rose by more
+    than tolerance. Otherwise the rest of the route is returned as is, so following it costs no search.
+    """
+
+    def __init__(self, search, goals, tolerance=0.1):
+        self.search = search
+        self.goals = [tuple(goal) for goal in goals]
+        self.tolerance = tolerance
+        self.path = None
+        self.costs = None  # Cost of the route up to every cell of it, as planned
+        self.times = None
+        self.version = None
+        self.searches = 0
+        self.reuses = 0
+        self.searched = False  # Whether the last route call ran a search
+        # Counters of the last route call, zero when the route was reused
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.max_open_size = 0
+
+    def route(self, position, time):
+        """
+        (path, cost, arrival times) from position at time to the nearest goal, or (None, None, None).
+        """
+        position = tuple(position)
+        self.nodes_expanded = self.nodes_pushed = self.max_open_size = 0
+        rest = self.remaining(position, time)
+        self.searched = rest is None
+        if rest is not None:
+            self.reuses += 1
+            return rest
+        self.searches += 1
+        search = self.search
+        self.version = search.hazard.version
+        path, cost, times = search.search(position, self.goals, time)
+        self.nodes_expanded, self.nodes_pushed, self.max_open_size = \
+            search.nodes_expanded, search.nodes_pushed, search.max_open_size
+        self.path, self.times = path, times
+        self.costs = self.route_costs(path, times) if path is not None else None
+        return path, cost, times
+
+    def route_costs(self, path, times):
+        """Cumulative cost of a path with the hazard levels at the given arrival times."""
+        search = self.search
+        sg = search.search_grid
+        cells = np.array([sg.index(position) for position in path], dtype=np.int64)
+        levels = search.hazard.level(cells[1:], np.array(times[1:]))
+        costs = [0.0]
+        for a, b, level in zip(cells[:-1].tolist(), cells[1:].tolist(), levels.tolist()):
+            step = dict(sg.neighbors(a)).get(b)
+            if step is None or level >= search.lethal_level:
+                return None
+            costs.append(costs[-1] + step * (1.0 + search.hazard_weight * level))
+        return costs
+
+    def remaining(self, position, time):
+        """The rest of the current route from position if it is still good, else None."""
+        if self.path is None or position not in self.path:
+            return None
+        i = self.path.index(position)
+        path = self.path[i:]
+        hazard = self.hazard_changes()
+        if hazard is None:
+            return None
+        sg = self.search.search_grid
+        if len(hazard) and np.isin([sg.index(cell) for cell in path], hazard).any():
+            return None
+        # Walked at the planned pace from now on
+        times = [t - self.times[i] + time for t in self.times[i:]]
+        costs = self.route_costs(path, times)
+        if costs is None:
+            return None
+        planned = self.costs[-1] - self.costs[i]
+        if costs[-1] > planned * (1.0 + self.tolerance) + 1e-9:
+            return None
+        return path, costs[-1], times
+
+    def hazard_changes(self):
+        # Cells changed since the route was planned, or None if a level went down
+        cells, lowered = self.search.hazard.changed_since(self.version)
+        return None if lowered else cells
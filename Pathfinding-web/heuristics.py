@@ -0,0 +1,187 @@
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Upper bound on the number of (node, stair) distances evaluated at once
+CHUNK_ELEMENTS = 1 << 22
+
+
+class GoalHeuristic:
+    """
+    Multi-goal heuristic with all per-goal data precomputed once per query.
+
+    Gives exactly the same values as the original per-goal loop in InteractiveBIMPathfinder.heuristic,
+    but evaluates all goals for a node (or a batch of nodes) as a handful of NumPy operations.
+    """
+
+    def __init__(self, grids, buffered_grids, goals, grid_size, minimize_cost=True, heuristic_style='min'):
+        self.grid_size = grid_size
+        self.minimize_cost = minimize_cost
+        self.heuristic_style = heuristic_style
+        self.goals = np.array(goals, dtype=np.int64).reshape(-1, 3)
+        # Number of positions evaluated and the time spent on them, for the search stats
+        self.heuristic_calls = 0
+        self.heuristic_time = 0.0
+        self.goal_floors = sorted(set(self.goals[:, 2].tolist()))
+
+        if buffered_grids is None:
+            buffered_grids = grids
+        self.walla = [np.asarray(floor) == 'walla' for floor in buffered_grids]
+
+        # Stair cells that connect floor z to goal floor zg, in the same (row-major) order
+        # find_all_stairs produces them, so ties resolve to the same stair as before
+        stair_masks = [np.asarray(floor) == 'stair' for floor in grids]
+        self.stair_cells = {}
+        for zg in self.goal_floors:
+            for z in range(len(grids)):
+                if z != zg:
+                    # Floors may differ slightly in size, only their overlap can hold shared stairs
+                    rows = min(stair_masks[z].shape[0], stair_masks[zg].shape[0])
+                    cols = min(stair_masks[z].shape[1], stair_masks[zg].shape[1])
+                    shared = stair_masks[z][:rows, :cols] & stair_masks[zg][:rows, :cols]
+                    self.stair_cells[(z, zg)] = np.argwhere(shared)
+
+    def __call__(self, position):
+        return self.evaluate([position])[0]
+
+    def evaluate(self, positions):
+        """
+        Heuristic values for a batch of positions.
+
+        :param positions: Sequence or (n, 3) array of (x, y, z) grid positions
+        :return: Array of n heuristic values
+        """
+        started = time.perf_counter()
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 3)
+        self.heuristic_calls += len(positions)
+        if len(self.goals) == 0:
+            values = np.zeros(len(positions))
+        else:
+            per_goal = self.evaluate_per_goal(positions)
+            if self.heuristic_style == 'sum':
+                # Accumulate goal by goal to keep the same rounding as a Python sum
+                values = np.zeros(len(positions))
+                for k in range(per_goal.shape[1]):
+                    values += per_goal[:, k]
+            else:
+                values = per_goal.min(axis=1)
+        self.heuristic_time += time.perf_counter() - started
+        return values
+
+    def floor_map(self, z, walls):
+        """
+        Heuristic value of every cell of a floor, evaluated in chunks of cells.
+
+        :param z: Floor index
+        :param walls: (rows, cols) boolean array of the floor's wall cells, which get NaN
+        :return: (rows, cols) array of heuristic values
+        """
+        rows, cols = walls.shape
+        cells = np.argwhere(~walls)
+        values = np.full(rows * cols, np.nan)
+        chunk = max(1, CHUNK_ELEMENTS // max(1, len(self.goals)))
+        for start in range(0, len(cells), chunk):
+            block = cells[start:start + chunk]
+            positions = np.column_stack((block, np.full(len(block), z)))
+            values[block[:, 0] * cols + block[:, 1]] = self.evaluate(positions)
+        return values.reshape(rows, cols)
+
+    def evaluate_per_goal(self, positions):
+        gs = self.grid_size
+        ax = positions[:, 0:1]
+        ay = positions[:, 1:2]
+        az = positions[:, 2:3]
+        dx = np.abs(self.goals[:, 0] - ax)
+        dy = np.abs(self.goals[:, 1] - ay)
+        dz = np.abs(self.goals[:, 2] - az)
+
+        if self.minimize_cost:
+            h = np.sqrt(dx ** 2 + dy ** 2) * gs
+            if (dz > 0).any():
+                self.add_stair_transfer(h, positions, dz)
+        else:
+            # For distance minimization, use 3D Euclidean distance
+            h = np.sqrt(dx ** 2 + dy ** 2 + (dz * 3) ** 2) * gs
+
+        walla = np.zeros(len(positions), dtype=bool)
+        for z in np.unique(positions[:, 2]).tolist():
+            rows = positions[:, 2] == z
+            walla[rows] = self.walla[z][positions[rows, 0], positions[rows, 1]]
+        if walla.any():
+            h[walla] += 10 * gs  # Add a cost for wall-adjacent cells
+        return h
+
+    def add_stair_transfer(self, h, positions, dz):
+        gs = self.grid_size
+        for z in np.unique(positions[:, 2]).tolist():
+            rows = np.flatnonzero(positions[:, 2] == z)
+            for zg in self.goal_floors:
+                if zg == z:
+                    continue
+                cols = np.flatnonzero(self.goals[:, 2] == zg)
+                stairs = self.stair_cells.get((z, zg))
+                if stairs is None or len(stairs) == 0:
+                    h[np.ix_(rows, cols)] = float('inf')
+                    continue
+
+                nearest = self.nearest_stairs(positions[rows, :2], stairs)
+                a = positions[rows, :2]
+                b = self.goals[cols, :2]
+                to_stair = np.sqrt(((nearest - a) ** 2).sum(axis=1))[:, None]
+                from_stair = np.sqrt((b[None, :, 0] - nearest[:, None, 0]) ** 2 +
+                                     (b[None, :, 1] - nearest[:, None, 1]) ** 2)
+                block = h[np.ix_(rows, cols)]
+                block += (to_stair + from_stair) * gs
+                block += dz[np.ix_(rows, cols)] * 3 * gs  # Increased floor change penalty
+                h[np.ix_(rows, cols)] = block
+
+    def nearest_stairs(self, points, stairs):
+        # argmin keeps the first of equally distant stairs, like the strict '<' scan did
+        nearest = np.empty_like(points)
+        chunk = max(1, CHUNK_ELEMENTS // len(stairs))
+        for start in range(0, len(points), chunk):
+            p = points[start:start + chunk]
+            d2 = (p[:, None, 0] - stairs[None, :, 0]) ** 2 + (p[:, None, 1] - stairs[None, :, 1]) ** 2
+            nearest[start:start + chunk] = stairs[d2.argmin(axis=1)]
+        return nearest
+
+
+class HeuristicMapCache:
+    """LRU cache of per-floor heuristic maps keyed by (grid version, goal set, floor, heuristic options)."""
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.maps = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(version, goal_heuristic, floor):
+        gh = goal_heuristic
+        goals = tuple(map(tuple, gh.goals.tolist()))
+        # The order of the goals does not change a minimum or a sum
+        return version, tuple(sorted(goals)), floor, gh.grid_size, gh.minimize_cost, gh.heuristic_style
+
+    def get(self, version, goal_heuristic, floor, walls):
+        """
+        Heuristic map of a floor, computed with goal_heuristic on a miss.
+
+        :param version: Version of the (buffered) grids the heuristic was built for
+        :param walls: (rows, cols) boolean wall mask of the floor
+        """
+        key = self.key(version, goal_heuristic, floor)
+        heuristic_map = self.maps.get(key)
+        if heuristic_map is not None:
+            self.hits += 1
+            self.maps.move_to_end(key)
+            return heuristic_map
+        self.misses += 1
+        heuristic_map = goal_heuristic.floor_map(floor, walls)
+        self.maps[key] = heuristic_map
+        while len(self.maps) > self.maxsize:
+            self.maps.popitem(last=False)
+        return heuristic_map
+
+    def clear(self):
+        self.maps.clear()
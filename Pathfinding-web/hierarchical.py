@@ -0,0 +1,349 @@
+import heapq
+
+import numpy as np
+from scipy import ndimage
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from search_grid import DOOR, STAIR
+
+# Number of portals searched at once when computing the portal-to-portal costs of a region
+SOURCE_CHUNK = 64
+
+
+class HierarchicalGraph:
+    """
+    Room/door abstraction of a SearchGrid for whole-building queries (HPA*).
+
+    Every floor is split into regions: connected areas of passable cells separated by door and stair
+    cells. The door and stair cells are the portals of the abstract graph. Its edges are the exact
+    costs between portals of the same region, direct moves between neighbouring portals and the
+    vertical stair links. A query runs Dijkstra on the abstract graph and then refines every abstract
+    edge into cells with a local search inside its region, so paths and costs are exact.
+    """
+
+    def __init__(self, search_grid):
+        self.search_grid = search_grid
+        self.labels, self.next_label = self.label_floors(search_grid, range(search_grid.num_floors), 1)
+        self.portals, self.is_portal = self.find_portals(search_grid)
+        self.region_portals = self.find_region_portals()
+        self.region_edges = {region: self.build_region_edges(region) for region in self.region_portals}
+        self.rebuilt_regions = len(self.region_edges)
+        self.adjacency = self.build_adjacency()
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.max_open_size = 0
+
+    def label_floors(self, search_grid, floors, first_label, labels=None):
+        sg = search_grid
+        if labels is None:
+            labels = np.zeros(sg.padded_shape, dtype=np.int64)
+        else:
+            labels = labels.reshape(sg.padded_shape).copy()
+        codes = sg.flat_codes.reshape(sg.padded_shape)
+        region_mask = sg.passable.reshape(sg.padded_shape) & (codes != DOOR) & (codes != STAIR)
+        # Diagonal moves connect diagonal neighbours, so regions are 8-connected when they are allowed
+        structure = np.ones((3, 3), dtype=int) if sg.allow_diagonal else None
+        next_label = first_label
+        for z in floors:
+            floor_labels, count = ndimage.label(region_mask[z], structure=structure)
+            floor_labels[floor_labels > 0] += next_label - 1
+            labels[z] = floor_labels
+            next_label += count
+        return labels.ravel(), next_label
+
+    @staticmethod
+    def find_portals(search_grid):
+        codes = search_grid.flat_codes
+        is_portal = search_grid.passable & ((codes == DOOR) | (codes == STAIR))
+        return np.flatnonzero(is_portal), is_portal
+
+    def find_region_portals(self):
+        region_portals = {region: set() for region in np.unique(self.labels[self.labels > 0]).tolist()}
+        for offset, _ in self.search_grid.moves:
+            neighbor_labels = self.labels[self.portals + offset]
+            for region, portal in zip(neighbor_labels.tolist(), self.portals.tolist()):
+                if region > 0:
+                    region_portals[region].add(portal)
+        return region_portals
+
+    def region_graph(self, regions, extra=()):
+        """
+        CSR graph over the cells of the given regions, their portals and any extra cells.
+
+        :return: (sorted flat cell indices, CSR matrix of move costs between them)
+        """
+        sg = self.search_grid
+        regions = list(regions)
+        portals = set(extra)
+        for region in regions:
+            portals.update(self.region_portals.get(region, ()))
+        cells = np.union1d(np.flatnonzero(np.isin(self.labels, regions)),
+                           np.array(sorted(portals), dtype=np.int64))
+
+        sources, targets, costs = [], [], []
+        local = np.arange(len(cells))
+        for offset, entry in sg.moves:
+            neighbors = cells + offset
+            j = np.minimum(np.searchsorted(cells, neighbors), len(cells) - 1)
+            valid = (cells[j] == neighbors) & sg.passable[neighbors]
+            sources.append(local[valid])
+            targets.append(j[valid])
+            costs.append(entry[neighbors[valid]])
+        graph = csr_matrix((np.concatenate(costs), (np.concatenate(sources), np.concatenate(targets))),
+                           shape=(len(cells), len(cells)))
+        return cells, graph
+
+    def build_region_edges(self, region):
+        portals = np.array(sorted(self.region_portals[region]), dtype=np.int64)
+        if len(portals) < 2:
+            return []
+        cells, graph = self.region_graph([region])
+        local_portals = np.searchsorted(cells, portals)
+        edges = []
+        for start in range(0, len(portals), SOURCE_CHUNK):
+            distances = dijkstra(graph, indices=local_portals[start:start + SOURCE_CHUNK])
+            for row, source in enumerate(portals[start:start + SOURCE_CHUNK].tolist()):
+                for target, cost in zip(portals.tolist(), distances[row, local_portals].tolist()):
+                    if target != source and np.isfinite(cost):
+                        edges.append((source, target, cost))
+        return edges
+
+    def build_adjacency(self):
+        sg = self.search_grid
+        adjacency = {portal: {} for portal in self.portals.tolist()}
+
+        def add(source, target, cost, region):
+            if cost < adjacency[source].get(target, (float('inf'), None))[0]:
+                adjacency[source][target] = (cost, region)
+
+        # Direct moves between neighbouring portals and the vertical stair links
+        for portal in self.portals.tolist():
+            for offset, entry in sg.moves:
+                if self.is_portal[portal + offset]:
+                    add(portal, portal + offset, float(entry[portal + offset]), None)
+            for other in sg.stair_links.get(portal, ()):
+                add(portal, other, float(sg.vertical_cost[other]), None)
+
+        for region, edges in self.region_edges.items():
+            for source, target, cost in edges:
+                add(source, target, cost, region)
+        return adjacency
+
+    def update(self, search_grid):
+        """
+        Bring the abstraction up to date with an edited grid.
+
+        Only regions that contain or touch a changed cell get their portal-to-portal costs recomputed;
+        every other region keeps its edges. Returns the number of rebuilt regions.
+        """
+        old = self.search_grid
+        if old.padded_shape != search_grid.padded_shape or old.profile != search_grid.profile or \
+                old.grid_size != search_grid.grid_size:
+            self.__init__(search_grid)
+            return self.rebuilt_regions
+
+        changed = np.flatnonzero(old.flat_codes != search_grid.flat_codes)
+        self.search_grid = search_grid
+        if len(changed) == 0:
+            self.rebuilt_regions = 0
+            return 0
+
+        floors = sorted(set((changed // search_grid.floor_stride).tolist()))
+        old_labels = self.labels
+        labels, self.next_label = self.label_floors(search_grid, floors, self.next_label, old_labels)
+
+        # New regions within one cell of a change are dirty, the others are identical to an old region
+        touched = np.unique(np.concatenate([changed] + [changed + offset for offset, _ in search_grid.moves]))
+        touched = touched[(touched >= 0) & (touched < search_grid.size)]
+        dirty = set(np.unique(labels[touched]).tolist()) - {0}
+        floor_of_cell = np.arange(search_grid.size) // search_grid.floor_stride
+        on_changed_floors = (labels > 0) & np.isin(floor_of_cell, floors)
+
+        new_regions, representatives = np.unique(labels[on_changed_floors], return_index=True)
+        representative_cells = np.flatnonzero(on_changed_floors)[representatives]
+        relabel = {}
+        for region, cell in zip(new_regions.tolist(), representative_cells.tolist()):
+            if region not in dirty:
+                relabel[region] = int(old_labels[cell])
+        if relabel:
+            mapping = np.arange(self.next_label, dtype=np.int64)
+            for region, old_region in relabel.items():
+                mapping[region] = old_region
+            labels = mapping[labels]
+        self.labels = labels
+
+        self.portals, self.is_portal = self.find_portals(search_grid)
+        self.region_portals = self.find_region_portals()
+        kept = set(relabel.values()) | {region for region in self.region_edges
+                                        if region in self.region_portals and region not in dirty}
+        region_edges = {}
+        self.rebuilt_regions = 0
+        for region in self.region_portals:
+            if region in kept and region in self.region_edges:
+                region_edges[region] = self.region_edges[region]
+            else:
+                region_edges[region] = self.build_region_edges(region)
+                self.rebuilt_regions += 1
+        self.region_edges = region_edges
+        self.adjacency = self.build_adjacency()
+        return self.rebuilt_regions
+
+    def neighbor_regions(self, index):
+        regions = {int(self.labels[index + offset]) for offset, _ in self.search_grid.moves}
+        return regions - {0}
+
+    def search(self, start, goals):
+        """
+        Find the cheapest path from start to any of the goals.
+
+        :return: (path, cost), or (None, None) if no goal is reachable
+        """
+        sg = self.search_grid
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.max_open_size = 0
+        goal_indices = {sg.index(goal) for goal in goals if sg.contains(goal)}
+        if not sg.contains(start):
+            return None, None
+        start_index = sg.index(start)
+        if start_index in goal_indices:
+            return [tuple(start)], 0.0
+
+        # Costs from the start to the portals of its region, and to goals inside that region
+        start_edges = {}
+        direct_goals = {}
+        start_search = None
+        if self.is_portal[start_index]:
+            start_edges[start_index] = 0.0
+        else:
+            region = int(self.labels[start_index])
+            regions = {region} if region > 0 else self.neighbor_regions(start_index)
+            extra = [start_index] + [start_index + offset for offset, _ in sg.moves
+                                     if self.is_portal[start_index + offset]]
+            cells, graph = self.region_graph(regions, extra)
+            source = int(np.searchsorted(cells, start_index))
+            distances, predecessors = dijkstra(graph, indices=source, return_predecessors=True)
+            start_search = (cells, predecessors)
+            for cell, cost in zip(cells.tolist(), distances.tolist()):
+                if np.isfinite(cost) and cell != start_index:
+                    if self.is_portal[cell]:
+                        start_edges[cell] = cost
+                    if cell in goal_indices:
+                        direct_goals[cell] = cost
+
+        # Costs from the portals of each goal's region to the goal (reverse search)
+        goal_edges = {}
+        goal_searches = {}
+        goals_by_region = {}
+        for goal in goal_indices:
+            if self.is_portal[goal]:
+                goal_edges.setdefault(goal, []).append((0.0, goal))
+            elif sg.passable[goal]:
+                goals_by_region.setdefault(int(self.labels[goal]), []).append(goal)
+        for region, region_goals in goals_by_region.items():
+            cells, graph = self.region_graph([region])
+            sources = np.searchsorted(cells, region_goals)
+            distances, predecessors = dijkstra(graph.T.tocsr(), indices=sources, return_predecessors=True)
+            portal_mask = self.is_portal[cells]
+            for row, goal in enumerate(region_goals):
+                goal_searches[goal] = (cells, predecessors[row])
+                for cell, cost in zip(cells[portal_mask].tolist(), distances[row, portal_mask].tolist()):
+                    if np.isfinite(cost):
+                        goal_edges.setdefault(cell, []).append((cost, goal))
+
+        # Dijkstra on the abstract graph, with the goals joined into one terminal node
+        terminal = -1
+        best = {}
+        previous = {}
+        open_list = []
+        for portal, cost in start_edges.items():
+            best[portal] = cost
+            previous[portal] = None
+            heapq.heappush(open_list, (cost, portal))
+        for goal, cost in direct_goals.items():
+            if cost < best.get(terminal, float('inf')):
+                best[terminal] = cost
+                previous[terminal] = (None, goal)
+        if terminal in best:
+            heapq.heappush(open_list, (best[terminal], terminal))
+
+        closed = set()
+        self.nodes_pushed = len(open_list)
+        while open_list:
+            self.max_open_size = max(self.max_open_size, len(open_list))
+            cost, node = heapq.heappop(open_list)
+            if node in closed:
+                continue
+            if node == terminal:
+                break
+            closed.add(node)
+            self.nodes_expanded += 1
+            for neighbor, (step_cost, region) in self.adjacency[node].items():
+                new_cost = cost + step_cost
+                if new_cost < best.get(neighbor, float('inf')):
+                    best[neighbor] = new_cost
+                    previous[neighbor] = (node, region)
+                    heapq.heappush(open_list, (new_cost, neighbor))
+                    self.nodes_pushed += 1
+            for step_cost, goal in goal_edges.get(node, ()):
+                new_cost = cost + step_cost
+                if new_cost < best.get(terminal, float('inf')):
+                    best[terminal] = new_cost
+                    previous[terminal] = (node, goal)
+                    heapq.heappush(open_list, (new_cost, terminal))
+                    self.nodes_pushed += 1
+
+        if terminal not in best:
+            return None, None
+        path = self.refine(start_index, previous, start_search, goal_searches)
+        return [sg.position(index) for index in path], best[terminal]
+
+    def refine(self, start_index, previous, start_search, goal_searches):
+        last_portal, goal = previous[-1]
+        if last_portal is None:
+            # Start and goal share a region and no portal is needed
+            cells, predecessors = start_search
+            return [start_index] + self.follow(cells, predecessors, goal, start_index)
+
+        # Path from the last portal to the goal, following the reverse search from the goal
+        tail = []
+        if goal != last_portal:
+            cells, predecessors = goal_searches[goal]
+            local = int(np.searchsorted(cells, last_portal))
+            while cells[local] != goal:
+                local = predecessors[local]
+                tail.append(int(cells[local]))
+
+        # Abstract edges back to the first portal, each refined inside its region
+        middle = []
+        node = last_portal
+        while previous[node] is not None:
+            parent, region = previous[node]
+            if region is None:
+                middle.append([node])
+            else:
+                cells, graph = self.region_graph([region])
+                _, predecessors = dijkstra(graph, indices=int(np.searchsorted(cells, parent)),
+                                           return_predecessors=True)
+                middle.append(self.follow(cells, predecessors, node, parent))
+            node = parent
+
+        # Path from the start to the first portal
+        path = [start_index]
+        if node != start_index:
+            cells, predecessors = start_search
+            path += self.follow(cells, predecessors, node, start_index)
+        for segment in reversed(middle):
+            path += segment
+        return path + tail
+
+    @staticmethod
+    def follow(cells, predecessors, target, source):
+        """Cells from source (exclusive) to target (inclusive) along a predecessor array."""
+        segment = []
+        local = int(np.searchsorted(cells, target))
+        while cells[local] != source:
+            segment.append(int(cells[local]))
+            local = predecessors[local]
+        return segment[::-1]
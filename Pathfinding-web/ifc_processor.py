@@ -92,30 +92,46 @@ def create_faux_3d_grid(bbox, floors, grid_size=0.2):
     return [np.full((x_cells, y_cells), 'empty', dtype=object) for _ in floors]
 
 def process_element(element, grids, bbox, floors, grid_size, total_elements, current_element):
+    print(
+        f"Processing: {current_element}/{total_elements} elements ({current_element / total_elements * 100:.2f}% done)")
+    geometry = tessellate_element(element)
+    if geometry is None:
+        return
+    rasterize_element(element, *geometry, grids, bbox, floors, grid_size)
+
+
+def tessellate_element(element):
+    """Triangulated geometry of an element in world coordinates, as (verts, faces) flat lists, or None."""
     settings = ifcopenshell.geom.settings()
     settings.set(settings.USE_WORLD_COORDS, True)
 
-    print(
-        f"Processing: {current_element}/{total_elements} elements ({current_element / total_elements * 100:.2f}% done)")
     try:
         shape = ifcopenshell.geom.create_shape(settings, element)
-        verts = shape.geometry.verts
-        faces = shape.geometry.faces
     except RuntimeError:
         print(f"Failed to process: {element.is_a()}")
-        return
+        return None
+    return shape.geometry.verts, shape.geometry.faces
+
 
+def element_type_of(element):
     if element.is_a() in wall_types:
-        element_type = 'wall'
+        return 'wall'
     elif element.is_a() in door_types:
-        element_type = 'door'
+        return 'door'
     elif element.is_a() in stair_types:
-        print("stair found")
-        element_type = 'stair'
+        return 'stair'
     elif element.is_a() in floor_types:
-        element_type = 'floor'
-    else:
-        return  # Skip other types
+        return 'floor'
+    return None  # Skip other types
+
+
+def rasterize_element(element, verts, faces, grids, bbox, floors, grid_size):
+    """Mark the cells covered by the triangles of an element on every floor it spans."""
+    element_type = element_type_of(element)
+    if element_type is None:
+        return
+    if element_type == 'stair':
+        print("stair found")
 
     if not verts:
         print(f"Warning: No vertices found for {element.is_a()} (ID: {element.id()})")
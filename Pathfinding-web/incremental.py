@@ -0,0 +1,230 @@
+import heapq
+
+import numpy as np
+
+INF = float('inf')
+# Keys that differ by less than this may be equal: sums of the same costs in another order differ in the
+# last bits, so the search only stops at keys clearly above the start's
+KEY_TOLERANCE = 1e-9
+
+
+class DStarLite:
+    """
+    D* Lite over a SearchGrid: an incremental search that keeps its state between queries.
+
+    The search runs backward from the goals, so g of a cell is its cost to the nearest goal, like a
+    DistanceField that is only computed as far as the query needs. When the start moves or the grid is
+    edited (see update), only the cells whose cost to goal changed are expanded again instead of
+    searching from scratch. The state belongs to one goal set; other goals start a new search.
+    """
+
+    def __init__(self, search_grid):
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.nodes_updated = 0
+        self.max_open_size = 0
+        self.changed_cells = 0  # Cells changed by the last update, None if it had to start over
+        self.reset(search_grid)
+
+    def reset(self, search_grid):
+        """Drop the search state and take over a new grid."""
+        sg = search_grid
+        self.search_grid = sg
+        self.passable = sg.passable.tolist()
+        self.inside = sg.inside.tolist()
+        self.straight = sg.straight_cost.tolist()
+        self.diagonal = sg.diagonal_cost.tolist()
+        self.vertical = sg.vertical_cost.tolist()
+        row_stride = sg.padded_shape[2]
+        self.moves = [(dx * row_stride + dy, self.diagonal if dx and dy else self.straight)
+                      for dx, dy in sg.directions]
+        self.stair_links = sg.stair_links
+        # The heuristic keeps the cheapest move costs of this grid; edits that make moves cheaper start over
+        self.min_straight = sg.min_straight
+        self.min_diagonal = sg.min_diagonal
+        self.goal_set = None
+        self.g = None
+        self.rhs = None
+        self.open_keys = None
+        self.open_list = None
+        self.last = None
+        self.km = 0.0
+
+    def update(self, search_grid):
+        """
+        Take over an edited version of the grid and queue the cells whose cost to goal may have changed.
+
+        :return: Number of changed cells, or None if the grids are not comparable and the search starts over
+        """
+        old = self.search_grid
+        if old.padded_shape != search_grid.padded_shape or old.profile != search_grid.profile or \
+                old.grid_size != search_grid.grid_size or search_grid.min_straight < self.min_straight or \
+                search_grid.min_diagonal < self.min_diagonal:
+            self.reset(search_grid)
+            self.changed_cells = None
+            return None
+
+        sg = search_grid
+        changed = np.flatnonzero(old.flat_codes != sg.flat_codes).tolist()
+        self.search_grid = sg
+        self.changed_cells = len(changed)
+        if not changed:
+            return 0
+        # Move costs only depend on the cell that is entered, so the cost arrays change where the codes do
+        for cell in changed:
+            self.passable[cell] = bool(sg.passable[cell])
+            self.straight[cell] = float(sg.straight_cost[cell])
+            self.diagonal[cell] = float(sg.diagonal_cost[cell])
+            self.vertical[cell] = float(sg.vertical_cost[cell])
+        old_links, self.stair_links = self.stair_links, sg.stair_links
+        if self.g is None:
+            return len(changed)
+
+        # Cells that can step into a changed cell see a different cost, as do the stairs linked to it
+        affected = set(changed)
+        for cell in changed:
+            affected.update(cell - offset for offset, _ in self.moves)
+            affected.update(old_links.get(cell, ()))
+            affected.update(self.stair_links.get(cell, ()))
+        inside = self.inside
+        for cell in affected:
+            if inside[cell]:
+                self.update_vertex(cell)
+        return len(changed)
+
+    def heuristic(self, a, b):
+        """Octile lower bound between two cell indices, as SearchGrid.lower_bound."""
+        sg = self.search_grid
+        row_stride = sg.padded_shape[2]
+        ax, ay = divmod(a % sg.floor_stride, row_stride)
+        bx, by = divmod(b % sg.floor_stride, row_stride)
+        dx = abs(ax - bx)
+        dy = abs(ay - by)
+        if not sg.allow_diagonal:
+            return (dx + dy) * self.min_straight
+        if dx < dy:
+            dx, dy = dy, dx
+        return (dx - dy) * self.min_straight + dy * self.min_diagonal
+
+    def calculate_key(self, cell):
+        best = min(self.g[cell], self.rhs[cell])
+        return (best + self.heuristic(self.last, cell) + self.km, best)
+
+    def successors(self, cell):
+        """(neighbour, move cost) pairs of a cell, as SearchGrid.neighbors."""
+        passable = self.passable
+        result = [(cell + offset, entry[cell + offset]) for offset, entry in self.moves if passable[cell + offset]]
+        result += [(other, self.vertical[other]) for other in self.stair_links.get(cell, ())]
+        return result
+
+    def predecessors(self, cell):
+        """Cells that can step into a cell: every neighbour inside the grid, if the cell itself is passable."""
+        if not self.passable[cell]:
+            # Impassable cells can only be a start, never a step on a path
+            return []
+        inside = self.inside
+        result = [cell - offset for offset, _ in self.moves if inside[cell - offset]]
+        result += self.stair_links.get(cell, [])
+        return result
+
+    def update_vertex(self, cell):
+        if cell not in self.goal_set:
+            g = self.g
+            self.rhs[cell] = min((cost + g[other] for other, cost in self.successors(cell)), default=INF)
+        if self.g[cell] != self.rhs[cell]:
+            if self.open_keys.get(cell) is not None:
+                self.nodes_updated += 1
+            key = self.calculate_key(cell)
+            self.open_keys[cell] = key
+            heapq.heappush(self.open_list, (key, cell))
+            self.nodes_pushed += 1
+        else:
+            # Entries left in the heap are skipped when popped
+            self.open_keys.pop(cell, None)
+
+    def compute_shortest_path(self):
+        start = self.last
+        g, rhs = self.g, self.rhs
+        open_list, open_keys = self.open_list, self.open_keys
+        while open_list:
+            key, cell = open_list[0]
+            if open_keys.get(cell) != key:
+                heapq.heappop(open_list)  # Stale entry
+                continue
+            start_key = self.calculate_key(start)
+            if rhs[start] == g[start] and key[0] > start_key[0] + KEY_TOLERANCE:
+                break
+            self.max_open_size = max(self.max_open_size, len(open_keys))
+            heapq.heappop(open_list)
+            del open_keys[cell]
+            new_key = self.calculate_key(cell)
+            if key < new_key:
+                # The start moved since the cell was queued
+                open_keys[cell] = new_key
+                heapq.heappush(open_list, (new_key, cell))
+                continue
+            self.nodes_expanded += 1
+            if g[cell] > rhs[cell]:
+                g[cell] = rhs[cell]
+                for other in self.predecessors(cell):
+                    self.update_vertex(other)
+            else:
+                g[cell] = INF
+                self.update_vertex(cell)
+                for other in self.predecessors(cell):
+                    self.update_vertex(other)
+
+    def search(self, start, goals):
+        """
+        Cheapest path from start to the nearest goal, repairing the search of the previous query.
+
+        :param start: (x, y, z) start position
+        :param goals: List of (x, y, z) goal positions
+        :return: (path, cost), or (None, None) if no goal is reachable
+        """
+        sg = self.search_grid
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.nodes_updated = 0
+        self.max_open_size = 0
+        goal_set = frozenset(sg.index(goal) for goal in goals if sg.contains(goal))
+        if not sg.contains(start) or not goal_set:
+            return None, None
+        start_index = sg.index(start)
+
+        if goal_set != self.goal_set:
+            self.goal_set = goal_set
+            self.g = [INF] * sg.size
+            self.rhs = [INF] * sg.size
+            self.open_keys = {}
+            self.open_list = []
+            self.km = 0.0
+            self.last = start_index
+            for goal in goal_set:
+                self.rhs[goal] = 0.0
+                self.update_vertex(goal)
+        elif start_index != self.last:
+            # Keys queued for the old start stay valid lower bounds when raised by the distance moved
+            self.km += self.heuristic(self.last, start_index)
+            self.last = start_index
+
+        self.compute_shortest_path()
+        if self.rhs[start_index] == INF:
+            return None, None
+        return self.extract_path(start_index)
+
+    def extract_path(self, start_index):
+        # Follow the cheapest cost to goal from the start
+        sg = self.search_grid
+        g = self.g
+        cell = start_index
+        path = [sg.position(cell)]
+        cost = 0.0
+        while cell not in self.goal_set:
+            _, cell, move_cost = min((move_cost + g[other], other, move_cost)
+                                     for other, move_cost in self.successors(cell))
+            cost += move_cost
+            path.append(sg.position(cell))
+            if len(path) > sg.size:
+                return None, None
+        return path, cost
@@ -0,0 +1,194 @@
+import heapq
+
+import numpy as np
+
+from search_grid import STAIR
+
+
+class JumpPointSearch:
+    """
+    Jump Point Search over a SearchGrid, for floors with large uniform-cost areas.
+
+    Jumps only cross 'uniform' cells: plain cells whose move costs equal the base cost and whose eight
+    neighbours contain no door or stair (nor any other cell with a different cost). Any other cell
+    stops a jump and is expanded like regular A*, so the non-uniform costs around doors and stairs
+    and the vertical stair links are handled exactly. Diagonal moves may cut corners, as in
+    get_neighbors, so the pruning rules are those of the original (corner cutting) JPS.
+    """
+
+    def __init__(self, search_grid):
+        sg = search_grid
+        self.search_grid = sg
+        self.row_stride = sg.padded_shape[2]
+        self.directions = sg.directions
+
+        special = sg.passable & ((sg.straight_cost != sg.grid_size) | (sg.flat_codes == STAIR))
+        near_special = special.copy()
+        for offset, _ in sg.moves:
+            near_special |= np.roll(special, offset)
+        if sg.allow_diagonal:
+            self.uniform = (sg.passable & ~near_special).tolist()
+        else:
+            # The pruning rules assume 8-connectivity, a 4-connected grid is searched as plain A*
+            self.uniform = [False] * sg.size
+        self.passable = sg.passable.tolist()
+        self.straight = sg.straight_cost.tolist()
+        self.diagonal = sg.diagonal_cost.tolist()
+        self.vertical = sg.vertical_cost.tolist()
+
+        self.goal_set = set()
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.nodes_updated = 0
+        self.max_open_size = 0
+
+    def search(self, start, goals, heuristic):
+        """
+        Find a path from start to the first goal reached.
+
+        :param start: (x, y, z) start position
+        :param goals: List of (x, y, z) goal positions
+        :param heuristic: Object with an evaluate(positions) method, e.g. a GoalHeuristic
+        :return: (path, cost), or (None, None) if no goal is reachable
+        """
+        sg = self.search_grid
+        self.goal_set = {sg.index(goal) for goal in goals if sg.contains(goal)}
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.nodes_updated = 0
+        self.max_open_size = 0
+        if not sg.contains(start):
+            return None, None
+
+        start_index = sg.index(start)
+        g_score = {start_index: 0.0}
+        parent = {start_index: None}
+        direction = {start_index: None}
+        closed = set()
+        counter = 0
+        open_list = [(float(heuristic.evaluate([start])[0]), counter, start_index)]
+
+        while open_list:
+            _, _, current = heapq.heappop(open_list)
+            if current in closed:
+                continue
+            if current in self.goal_set:
+                return self.reconstruct_path(current, parent), g_score[current]
+            closed.add(current)
+            self.nodes_expanded += 1
+
+            successors = []
+            for successor, step_cost, step_direction in self.successors(current, direction[current]):
+                tentative_g = g_score[current] + step_cost
+                if successor not in closed and tentative_g < g_score.get(successor, float('inf')):
+                    if successor in g_score:
+                        self.nodes_updated += 1
+                    g_score[successor] = tentative_g
+                    parent[successor] = current
+                    direction[successor] = step_direction
+                    successors.append(successor)
+            if not successors:
+                continue
+
+            h_values = heuristic.evaluate([sg.position(successor) for successor in successors])
+            for successor, h in zip(successors, h_values.tolist()):
+                counter += 1
+                heapq.heappush(open_list, (g_score[successor] + h, counter, successor))
+            self.nodes_pushed += len(successors)
+            self.max_open_size = max(self.max_open_size, len(open_list))
+
+        return None, None
+
+    def successors(self, index, incoming):
+        if incoming is None or not self.uniform[index]:
+            # Regular expansion: the start, cells near doors or stairs and arrivals by stair
+            directions = self.directions
+        else:
+            directions = self.pruned_directions(index, incoming)
+
+        result = []
+        for dx, dy in directions:
+            jump_point = self.jump(index, dx, dy)
+            if jump_point is not None:
+                result.append((jump_point[0], jump_point[1], (dx, dy)))
+        for other in self.search_grid.stair_links.get(index, ()):
+            result.append((other, self.vertical[other], None))
+        return result
+
+    def pruned_directions(self, index, incoming):
+        dx, dy = incoming
+        passable = self.passable
+        stride = self.row_stride
+        if dx and dy:
+            directions = [(dx, 0), (0, dy), (dx, dy)]
+            if not passable[index - dx * stride]:
+                directions.append((-dx, dy))
+            if not passable[index - dy]:
+                directions.append((dx, -dy))
+        elif dx:
+            directions = [(dx, 0)]
+            if not passable[index + 1]:
+                directions.append((dx, 1))
+            if not passable[index - 1]:
+                directions.append((dx, -1))
+        else:
+            directions = [(0, dy)]
+            if not passable[index + stride]:
+                directions.append((1, dy))
+            if not passable[index - stride]:
+                directions.append((-1, dy))
+        return directions
+
+    def jump(self, index, dx, dy):
+        """Walk from index in direction (dx, dy) until a jump point; returns (index, cost) or None."""
+        passable = self.passable
+        uniform = self.uniform
+        stride = self.row_stride
+        offset = dx * stride + dy
+        diagonal = dx != 0 and dy != 0
+        step_costs = self.diagonal if diagonal else self.straight
+
+        cost = 0.0
+        current = index
+        while True:
+            current += offset
+            if not passable[current]:
+                return None
+            cost += step_costs[current]
+            if current in self.goal_set or not uniform[current]:
+                return current, cost
+
+            if diagonal:
+                if (not passable[current - dx * stride] and passable[current - dx * stride + dy]) or \
+                        (not passable[current - dy] and passable[current + dx * stride - dy]):
+                    return current, cost
+                if self.jump(current, dx, 0) is not None or self.jump(current, 0, dy) is not None:
+                    return current, cost
+            elif dx:
+                if (not passable[current + 1] and passable[current + offset + 1]) or \
+                        (not passable[current - 1] and passable[current + offset - 1]):
+                    return current, cost
+            else:
+                if (not passable[current + stride] and passable[current + offset + stride]) or \
+                        (not passable[current - stride] and passable[current + offset - stride]):
+                    return current, cost
+
+    def reconstruct_path(self, index, parent):
+        sg = self.search_grid
+        jump_points = []
+        while index is not None:
+            jump_points.append(sg.position(index))
+            index = parent[index]
+        jump_points.reverse()
+
+        # Fill in the cells between consecutive jump points, which always lie on a straight or diagonal line
+        path = jump_points[:1]
+        for (x0, y0, z0), (x1, y1, z1) in zip(jump_points, jump_points[1:]):
+            if z0 != z1:
+                path.append((x1, y1, z1))
+                continue
+            steps = max(abs(x1 - x0), abs(y1 - y0))
+            sx = (x1 > x0) - (x1 < x0)
+            sy = (y1 > y0) - (y1 < y0)
+            path.extend((x0 + sx * k, y0 + sy * k, z0) for k in range(1, steps + 1))
+        return path
@@ -0,0 +1,204 @@
+import time
+from collections import OrderedDict
+
+import numpy as np
+from scipy import ndimage
+
+from exits import find_exits
+from search_grid import STAIR
+from sparse_graph import SparseGraph
+
+
+class Landmarks:
+    """
+    Exact cost fields to and from a few landmark cells, for ALT (A*, landmarks, triangle inequality) bounds.
+
+    For any landmark L the triangle inequality gives two lower bounds on the cost from v to t:
+    d(v, L) - d(t, L) and d(L, t) - d(L, v). Unlike straight-line distances these bounds know about
+    walls, so A* no longer floods a floor when the straight line to the goal is blocked, and the
+    maximum over the landmarks is a consistent heuristic. Costs are not symmetric (a move costs the
+    cell it enters), so both directions are stored. The fields are computed with scipy.sparse.csgraph.
+
+    Landmarks are the exits and one cell of every stair, then cells far from all landmarks so far, up
+    to count landmarks.
+    """
+
+    def __init__(self, search_grid, grids=None, count=8):
+        """
+        :param search_grid: Compiled SearchGrid
+        :param grids: Optional floor grids of element type strings, to start with the exits
+        :param count: Number of landmarks
+        """
+        sg = search_grid
+        self.search_grid = sg
+        self.count = count
+        graph = SparseGraph(sg)
+        candidates = [sg.index(cell) for cell in find_exits(grids) if sg.contains(cell)] if grids is not None else []
+        candidates += self.stair_cells()
+        candidates = [cell for cell in dict.fromkeys(candidates) if sg.passable[cell]]
+
+        self.cells = []
+        to_fields, from_fields = [], []
+        nearest = np.full(sg.size, np.inf)  # Cost from every cell to its nearest landmark
+        while len(self.cells) < count:
+            if candidates:
+                # Of the exits and stairs, the one farthest from the landmarks so far
+                costs = nearest[candidates]
+                costs[np.isinf(costs)] = np.finfo(np.float64).max  # Not reached yet, e.g. another building part
+                cell = candidates.pop(int(np.argmax(costs)))
+            else:
+                reached = sg.passable & np.isfinite(nearest)
+                if not reached.any():
+                    if self.cells:
+                        break
+                    reached = sg.passable
+                    if not reached.any():
+                        break
+                    cell = int(np.flatnonzero(reached)[0])
+                else:
+                    cell = int(np.argmax(np.where(reached, nearest, -1.0)))
+                    if nearest[cell] == 0:
+                        break  # Every reachable cell is a landmark
+            position = sg.position(cell)
+            to_field, _ = graph.dijkstra([position], reverse=True)
+            from_field, _ = graph.dijkstra([position])
+            self.cells.append(cell)
+            to_fields.append(to_field)
+            from_fields.append(from_field)
+            nearest = np.minimum(nearest, to_field)
+        self.to_landmark = np.array(to_fields).reshape(-1, sg.size)  # (landmarks, cells) cost to each landmark
+        self.from_landmark = np.array(from_fields).reshape(-1, sg.size)
+
+    def stair_cells(self):
+        """One stair cell per connected stair area of every floor, closest to its centre."""
+        sg = self.search_grid
+        cells = []
+        for z in range(sg.num_floors):
+            stairs = sg.codes[z] == STAIR
+            labels, count = ndimage.label(stairs)
+            for label, (cx, cy) in enumerate(ndimage.center_of_mass(stairs, labels, range(1, count + 1))):
+                xs, ys = np.nonzero(labels == label + 1)
+                closest = int(np.argmin((xs - cx) ** 2 + (ys - cy) ** 2))
+                cells.append(sg.index((int(xs[closest]), int(ys[closest]), z)))
+        return cells
+
+    def bounds(self, cells, target):
+        """ALT lower bounds on the cost from each of cells to the target cell."""
+        with np.errstate(invalid='ignore'):
+            # d(v, t) >= d(v, L) - d(t, L): no bound from a landmark the target cannot reach
+            to_target = self.to_landmark[:, target][:, None]
+            forward = self.to_landmark[:, cells] - to_target
+            forward[np.broadcast_to(np.isinf(to_target), forward.shape)] = -np.inf
+            # d(v, t) >= d(L, t) - d(L, v): no bound from a landmark that cannot reach v
+            from_cells = self.from_landmark[:, cells]
+            backward = self.from_landmark[:, target][:, None] - from_cells
+            backward[np.isinf(from_cells)] = -np.inf
+        bound = np.maximum(forward, backward).max(axis=0, initial=0.0)
+        return np.maximum(bound, 0.0)
+
+    def bounds_from(self, source, cells):
+        """ALT lower bounds on the cost from the source cell to each of cells, for searches toward the source."""
+        with np.errstate(invalid='ignore'):
+            # d(s, v) >= d(s, L) - d(v, L): no bound from a landmark v cannot reach
+            to_cells = self.to_landmark[:, cells]
+            forward = self.to_landmark[:, source][:, None] - to_cells
+            forward[np.isinf(to_cells)] = -np.inf
+            # d(s, v) >= d(L, v) - d(L, s): no bound from a landmark that cannot reach s
+            from_source = self.from_landmark[:, source][:, None]
+            backward = self.from_landmark[:, cells] - from_source
+            backward[np.broadcast_to(np.isinf(from_source), backward.shape)] = -np.inf
+        bound = np.maximum(forward, backward).max(axis=0, initial=0.0)
+        return np.maximum(bound, 0.0)
+
+    def heuristic(self, goals):
+        """LandmarkHeuristic toward the nearest of the goals."""
+        return LandmarkHeuristic(self, goals)
+
+
+class LandmarkHeuristic:
+    """
+    ALT heuristic toward the nearest of several goals, with the evaluate interface of GoalHeuristic.
+
+    The minimum over the goals of consistent bounds is consistent, so A* with it finds optimal paths.
+    """
+
+    heuristic_style = 'alt'
+
+    def __init__(self, landmarks, goals):
+        sg = landmarks.search_grid
+        self.landmarks = landmarks
+        self.search_grid = sg
+        self.grid_size = sg.grid_size
+        self.minimize_cost = sg.minimize_cost
+        self.goals = np.array([goal for goal in goals if sg.contains(goal)], dtype=np.int64).reshape(-1, 3)
+        self.goal_cells = [sg.index(goal) for goal in self.goals.tolist()]
+        self.heuristic_calls = 0
+        self.heuristic_time = 0.0
+
+    def __call__(self, position):
+        return self.evaluate([position])[0]
+
+    def cells_of(self, positions):
+        sg = self.search_grid
+        x, y, z = positions[:, 0], positions[:, 1], positions[:, 2]
+        return (z * sg.padded_shape[1] + x + 1) * sg.padded_shape[2] + y + 1
+
+    def evaluate(self, positions):
+        """
+        Heuristic values for a batch of positions.
+
+        :param positions: Sequence or (n, 3) array of (x, y, z) grid positions
+        :return: Array of n heuristic values
+        """
+        started = time.perf_counter()
+        positions = np.asarray(positions, dtype=np.int64).reshape(-1, 3)
+        self.heuristic_calls += len(positions)
+        values = self.evaluate_cells(self.cells_of(positions))
+        self.heuristic_time += time.perf_counter() - started
+        return values
+
+    def evaluate_cells(self, cells):
+        if not self.goal_cells:
+            return np.zeros(len(cells))
+        values = np.full(len(cells), np.inf)
+        for goal in self.goal_cells:
+            values = np.minimum(values, self.landmarks.bounds(cells, goal))
+        return values
+
+    def floor_map(self, z, walls):
+        """Heuristic value of every cell of a floor, NaN on walls; see GoalHeuristic.floor_map."""
+        rows, cols = walls.shape
+        x, y = np.nonzero(~walls)
+        values = np.full((rows, cols), np.nan)
+        values[x, y] = self.evaluate_cells(self.cells_of(np.column_stack((x, y, np.full(len(x), z)))))
+        return values
+
+
+class LandmarkCache:
+    """
+    LRU cache of landmark fields keyed by (grid version, cost profile, landmark count); an edited grid
+    has another version, so its stale fields are never returned and age out.
+    """
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self.landmarks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, search_grid, grids=None, count=8):
+        key = (search_grid.version, search_grid.profile, count)
+        landmarks = self.landmarks.get(key)
+        if landmarks is not None:
+            self.hits += 1
+            self.landmarks.move_to_end(key)
+            return landmarks
+        self.misses += 1
+        landmarks = Landmarks(search_grid, grids, count)
+        self.landmarks[key] = landmarks
+        while len(self.landmarks) > self.maxsize:
+            self.landmarks.popitem(last=False)
+        return landmarks
+
+    def clear(self):
+        self.landmarks.clear()
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+
+import numpy as np
+
+# Coordinates are packed into one int64 per cell so footprints can be stored and searched as sorted arrays
+COORD_BITS = 20
+
+# Heuristic styles that depend on every cell of the grid: ALT bounds come from landmark fields, so an edit
+# far from the footprint of a search can still change the path it finds
+GLOBAL_HEURISTICS = ('alt',)
+
+
+def pack_cells(cells):
+    cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+    return (cells[:, 2] << (2 * COORD_BITS)) | (cells[:, 0] << COORD_BITS) | cells[:, 1]
+
+
+def pack_columns(cells):
+    cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+    return (cells[:, 0] << COORD_BITS) | cells[:, 1]
+
+
+class PathResultCache:
+    """
+    LRU cache of path query results, keyed by grid version and query parameters.
+
+    Each entry keeps the footprint of its search: the cells that were expanded to find the path. An
+    edit can only change the result if it touches a cell next to the footprint (or the wall buffer
+    around such a cell), or a stair cell above or below one, so after an edit the untouched entries
+    are carried over to the new grid version and only the others are dropped. Entries without a
+    footprint (searches that do not report one) are dropped on every edit of their grid, and so are
+    entries of heuristic styles whose bounds are computed from the whole grid (GLOBAL_HEURISTICS).
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(version, start, goals, grid_size, minimize_cost, allow_diagonal, wall_buffer, heuristic_style,
+            algorithm='A*', **options):
+        goals = tuple(sorted(set(tuple(goal) for goal in goals)))
+        return (version, tuple(start), goals, grid_size, minimize_cost, allow_diagonal, wall_buffer,
+                heuristic_style, algorithm, tuple(sorted(options.items())))
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, result, explored=None):
+        """
+        :param key: Key from PathResultCache.key
+        :param result: The result to return on later hits
+        :param explored: Optional iterable of (x, y, z) cells expanded by the search
+        """
+        footprint = None
+        if explored is not None:
+            explored = list(explored)
+            footprint = (np.unique(pack_cells(explored)), np.unique(pack_columns(explored)))
+        self.entries[key] = (result, footprint)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, old_version, new_version, cells, stairs_changed=False):
+        """
+        Move the entries of an edited grid to its new version, dropping the ones the edit may affect.
+
+        :param old_version: Grid version before the edit
+        :param new_version: Grid version after the edit
+        :param cells: (x, y, z) cells changed by the edit
+        :param stairs_changed: Whether a stair was added or removed; stairs feed the A* heuristic
+                               everywhere, so this drops every entry of the old version
+        :return: Number of dropped entries
+        """
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+        dropped = 0
+        for key in [key for key in self.entries if key[0] == old_version]:
+            result, footprint = self.entries.pop(key)
+            if footprint is None or stairs_changed or key[7] in GLOBAL_HEURISTICS or \
+                    self.touches(footprint, cells, key[6], key[3]):
+                dropped += 1
+                continue
+            self.entries[(new_version,) + key[1:]] = (result, footprint)
+        return dropped
+
+    @staticmethod
+    def touches(footprint, cells, wall_buffer, grid_size):
+        cells_packed, columns_packed = footprint
+        if len(cells) == 0:
+            return False
+        # A changed cell is seen by expansions next to it, and changes the wall buffer around it
+        reach = int(wall_buffer / grid_size) + 1
+        offsets = np.arange(-reach, reach + 1)
+        dx, dy = np.meshgrid(offsets, offsets, indexing='ij')
+        around = np.stack([dx.ravel(), dy.ravel(), np.zeros(dx.size, dtype=np.int64)], axis=1)
+        affected = (cells[:, None, :] + around[None, :, :]).reshape(-1, 3)
+        affected = affected[(affected[:, 0] >= 0) & (affected[:, 1] >= 0)]
+        if np.isin(pack_cells(affected), cells_packed).any():
+            return True
+        # Stair links connect the same (x, y) on every floor
+        return bool(np.isin(pack_columns(cells), columns_packed).any())
+
+    def clear(self):
+        self.entries.clear()
@@ -1,11 +1,30 @@
 import json
-import os
-import time
 import numpy as np
 import heapq
+import itertools
 import tkinter as tk
 from tkinter.filedialog import askopenfilename
-from scipy.interpolate import griddata
+from scipy import ndimage
+
+from anytime import AnytimeSearch
+from batch import route_batch
+from bidirectional import BidirectionalSearch
+from cost_profiles import cost_profile
+from distance_field import DistanceField, DistanceFieldCache
+from evacuation import EvacuationSimulation, random_agents
+from exits import find_exits
+from heuristics import GoalHeuristic, HeuristicMapCache
+from hazards import HazardField, HazardRouter, TimeDependentSearch
+from hierarchical import HierarchicalGraph
+from incremental import DStarLite
+from jps import JumpPointSearch
+from landmarks import Landmarks
+from rectangles import RectangleGraph
+from search_grid import SearchGrid
+from search_stats import SearchStats
+from sparse_graph import SparseGraph, cache_path
+from tours import TourPlanner
+from waypoints import WaypointCompressor
 
 tk.Tk().withdraw()
 import warnings
@@ -44,23 +63,60 @@ class InteractiveBIMPathfinder:
         self.animated = True
         self.fps = 1
         self.heuristic_style = 'Min'
-        self.heuristic_resolution = 10
         self.allow_diagonal = True
         self.wall_buffer = 0
         self.buffered_grids = None
+        self.search_grid = None
+        self.search_grids = {}  # Compiled grids per cost profile of the current buffered grids
+        self.cost_profile = None  # Name of one of COST_PROFILES; None uses the cost or distance profile
+        self.backend = 'python'  # 'scipy' runs distance fields on the sparse graph with scipy.sparse.csgraph
+        self.graph = None
+        self.grid_file = None  # JSON file the grids were loaded from; the sparse graph is cached next to it
+        self.goal_heuristic = None
+        self.goal_heuristic_key = None
+        self.heuristic_maps = HeuristicMapCache(maxsize=8)  # Per-floor heuristic overlays
+        self.landmarks = None  # Landmark fields of the 'alt' heuristic style, rebuilt when the search grid changes
+        self.landmark_count = 8
+        self.landmark_cache = None  # Optional LandmarkCache shared with other pathfinders, e.g. by the web app
+        self.nodes_expanded = 0
+        self.explored = None  # Cells expanded by the last search, if the algorithm reports them
+        self.hierarchy = None
+        self.rectangles = None  # Rectangle decomposition of the last run_rectangles
+        self.incremental = None  # D* Lite search state, repaired after edits by run_incremental
+        self.suboptimality = None  # Cost bound of the last anytime search, 1.0 when optimal
+        self.search_completed = True
+        self.evacuation = None  # Result of the last run_evacuation
+        self.hazard = None  # HazardField of the fire scenario, see set_hazard
+        self.hazard_router = None  # Route of run_hazard_route, kept up to date between calls
+        self.hazard_options = None  # TimeDependentSearch options of the router
+        self.hazard_times = None  # Arrival time at every cell of the last hazard route
+        self.tour = None  # Order, legs and unreachable goals of the last run_tour
+        self.tour_fields = DistanceFieldCache(maxsize=64)  # Per-goal fields of run_tour, reused by the next tour
+        self.stats = SearchStats()  # Counters and phase timings, see reset_stats
 
     def load_grid_data(self, filename):
         with open(filename, 'r') as f:
             data = json.load(f)
         grids = [np.array(grid) for grid in data['grids']]
+        self.grid_file = filename
         return grids, data['bbox'], data['floors'], data['grid_size']
 
     def set_algorithm(self, label):
         self.algorithm = label
 
+    def set_backend(self, label):
+        self.backend = label.lower()
+
     def set_minimize(self, label):
         self.minimize_cost = (label == 'Cost')
 
+    def set_cost_profile(self, label):
+        self.cost_profile = label.lower() if label else None
+
+    def active_cost_profile(self):
+        """The selected CostProfile, or the cost or distance profile when none is selected."""
+        return cost_profile(self.cost_profile, self.minimize_cost)
+
     def toggle_animation(self, label):
         self.animated = not self.animated
 
@@ -80,24 +136,29 @@ class InteractiveBIMPathfinder:
         self.wall_buffer = val
         self.apply_wall_buffer()
 
-    def apply_wall_buffer(self):
-        self.buffered_grids = []
-        for floor in self.grids:
-            buffered_floor = floor.copy()
-            wall_mask = (floor == 'wall')
-
-            buffer_distance = int(self.wall_buffer / self.grid_size)
+    def reset_stats(self):
+        """Start a new SearchStats; the counters and timings of the following queries add up in it."""
+        self.stats = SearchStats()
+        return self.stats
 
-            for _ in range(buffer_distance):
-                wall_mask = self.expand_mask(wall_mask)
-            rows, cols = wall_mask.shape
-            for i in range(rows):
-                for j in range(cols):
-                    if wall_mask[i, j] and floor[i, j] not in ['wall', 'door', 'stair']:
-                        buffered_floor[i, j] = 'walla'
-            self.buffered_grids.append(buffered_floor)
+    def apply_wall_buffer(self):
+        with self.stats.phase('buffer'):
+            self.buffered_grids = [self.buffer_floor(floor) for floor in self.grids]
+        self.search_grid = None
         return self.buffered_grids
 
+    def buffer_floor(self, floor):
+        # Same result as expanding the wall mask with expand_mask buffer_distance times
+        buffered_floor = floor.copy()
+        wall_mask = (floor == 'wall')
+        buffer_distance = int(self.wall_buffer / self.grid_size)
+        if buffer_distance > 0:
+            wall_mask = ndimage.binary_dilation(wall_mask, structure=np.ones((3, 3), dtype=bool),
+                                                iterations=buffer_distance)
+        keep = (floor == 'wall') | (floor == 'door') | (floor == 'stair')
+        buffered_floor[wall_mask & ~keep] = 'walla'
+        return buffered_floor
+
     def update_buffer_for_cells(self, floor, affected_cells, wall_buffer):
         buffered_floor = self.buffered_grids[floor].copy()
         original_floor = self.grids[floor]
@@ -122,6 +183,7 @@ class InteractiveBIMPathfinder:
                         buffered_floor[actual_row, actual_col] = original_floor[actual_row, actual_col]
 
         self.buffered_grids[floor] = buffered_floor
+        self.search_grid = None
         return buffered_floor
 
     def expand_mask(self, mask):
@@ -161,66 +223,11 @@ class InteractiveBIMPathfinder:
         self.mode = 'goal'
 
     def identify_exits(self, event):
-        exits = set()
-        for floor_index, floor in enumerate(self.grids):
-            rows, cols = floor.shape
-            for i in range(rows):
-                for j in range(cols):
-                    if floor[i, j] == 'door':
-                        if self.is_exit(floor, i, j):
-                            exits.add((i, j, floor_index))
-
-        # Filter exits to keep only one per BIM door
-        filtered_exits = self.filter_exits(exits)
-
-        # Add filtered exits as goals
-        for exit in filtered_exits:
+        # One goal per exit door: the door components that touch the outside of the building
+        for exit in find_exits(self.grids):
             if exit not in self.goals:
                 self.goals.append(exit)
 
-    def is_exit(self, floor, x, y):
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
-        rows, cols = floor.shape
-
-        for dx, dy in directions:
-            nx, ny = x + dx, y + dy
-            while 0 <= nx < rows and 0 <= ny < cols:
-                if floor[nx, ny] in ['wall', 'door']:
-                    break
-                if nx == 0 or nx == rows - 1 or ny == 0 or ny == cols - 1:
-                    return True
-                nx, ny = nx + dx, ny + dy
-
-        return False
-
-    def filter_exits(self, exits):
-        filtered = set()
-        for exit in exits:
-            if not any(self.are_connected_by_doors(exit, existing) for existing in filtered):
-                filtered.add(exit)
-        return filtered
-
-    def are_connected_by_doors(self, pos1, pos2):
-        if pos1[2] != pos2[2]:  # Different floors
-            return False
-
-        floor = self.grids[pos1[2]]
-        visited = set()
-        queue = [pos1[:2]]
-
-        while queue:
-            x, y = queue.pop(0)
-            if (x, y) == pos2[:2]:
-                return True
-
-            for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                nx, ny = x + dx, y + dy
-                if (nx, ny) not in visited and floor[nx, ny] == 'door':
-                    visited.add((nx, ny))
-                    queue.append((nx, ny))
-
-        return False
-
     def find_all_stairs(self):
         grid_stairs = []
         #print(self.grids)
@@ -253,80 +260,83 @@ class InteractiveBIMPathfinder:
                     nearest_stairs = (i, j, z)
         return nearest_stairs
 
+    def goal_heuristic_key_for(self):
+        # The heuristic holds the walls and stairs of the grids it was built on (and with 'alt' the landmark
+        # fields of one cost profile), so an edit, a new wall buffer or another profile builds a new one
+        search_grid = self.compile_search_grid()
+        return (tuple(map(tuple, self.goals)), self.active_cost_profile().minimize_cost, self.heuristic_style,
+                search_grid.version, search_grid.profile)
+
+    def build_goal_heuristic(self):
+        """
+        Heuristic toward the goals: straight-line bounds, or with heuristic style 'alt' bounds from the
+        landmark fields of the compiled grid (see compile_landmarks).
+        """
+        if self.heuristic_style == 'alt':
+            self.goal_heuristic = self.compile_landmarks().heuristic(self.goals)
+        else:
+            minimize_cost = self.active_cost_profile().minimize_cost
+            self.goal_heuristic = GoalHeuristic(self.grids, self.buffered_grids, self.goals, self.grid_size,
+                                                minimize_cost, self.heuristic_style)
+        self.goal_heuristic_key = self.goal_heuristic_key_for()
+        return self.goal_heuristic
+
+    def compile_landmarks(self, cache=None):
+        """
+        Exact cost fields to and from the exits, stairs and a few far apart cells, kept until the search
+        grid changes; an edit or another cost profile compiles a new search grid and so new fields.
+
+        :param cache: Optional LandmarkCache, so pathfinders on the same grid version share the fields;
+                      landmark_cache by default
+        """
+        cache = self.landmark_cache if cache is None else cache
+        search_grid = self.compile_search_grid()
+        if self.landmarks is None or self.landmarks.search_grid is not search_grid:
+            with self.stats.phase('compile'):
+                if cache is not None:
+                    self.landmarks = cache.get(search_grid, self.grids, self.landmark_count)
+                else:
+                    self.landmarks = Landmarks(search_grid, self.grids, self.landmark_count)
+        return self.landmarks
+
     def heuristic(self, a, position_b):
         if not self.goals:
             return 0  # Return 0 if there are no goals
 
-        # Calculate heuristic for each goal
-        goal_heuristics = []
-        for b in self.goals:
-            dx = abs(b[0] - a[0])
-            dy = abs(b[1] - a[1])
-            dz = abs(b[2] - a[2])
-
-            if self.minimize_cost:
-                h = np.sqrt(dx ** 2 + dy ** 2) * self.grid_size
-                if dz > 0:
-                    nearest_stairs = self.find_nearest_stairs(a, b)
-                    if nearest_stairs:
-                        h += (np.sqrt((nearest_stairs[0] - a[0]) ** 2 + (nearest_stairs[1] - a[1]) ** 2) +
-                              np.sqrt(
-                                  (b[0] - nearest_stairs[0]) ** 2 + (b[1] - nearest_stairs[1]) ** 2)) * self.grid_size
-                        h += dz * 3 * self.grid_size  # Increased floor change penalty
-                    else:
-                        h = float('inf')
-                if self.buffered_grids[a[2]][a[0], a[1]] == 'walla':
-                    h += 10 * self.grid_size  # Add a cost for wall-adjacent cells
-            else:
-                # For distance minimization, use 3D Euclidean distance
-                h = np.sqrt(dx ** 2 + dy ** 2 + (dz * 3) ** 2) * self.grid_size
-                if self.buffered_grids[a[2]][a[0], a[1]] == 'walla':
-                    h += 10 * self.grid_size  # Add a cost for wall-adjacent cells even in distance mode
+        # Per-goal data is precomputed once and reused until the goals or options change
+        if self.goal_heuristic is None or self.goal_heuristic_key != self.goal_heuristic_key_for():
+            self.build_goal_heuristic()
+        return self.goal_heuristic(a)
 
-            goal_heuristics.append(h)
-
-        if self.heuristic_style == 'sum':
-            return sum(goal_heuristics)
-        else:
-            return min(goal_heuristics)
-
-    def calculate_sparse_heuristic(self):
-        if self.goals is None:
-            return None
+    def heuristic_map(self, floor=None, cache=None):
+        """
+        Heuristic value of every cell of a floor toward the goals, NaN on walls.
 
-        floor_shape = self.grids[self.current_floor].shape
-        x = np.linspace(0, floor_shape[0] - 1, self.heuristic_resolution)
-        y = np.linspace(0, floor_shape[1] - 1, self.heuristic_resolution)
-        xx, yy = np.meshgrid(x, y)
-
-        heuristic_values = []
-        for i in range(self.heuristic_resolution):
-            for j in range(self.heuristic_resolution):
-                x_coord = int(xx[i, j])
-                y_coord = int(yy[i, j])
-                if self.grids[self.current_floor][x_coord, y_coord] != 'wall':
-                    h_value = self.heuristic((x_coord, y_coord, self.current_floor), self.goals)
-                    heuristic_values.append((x_coord, y_coord, h_value))
-
-        if not heuristic_values:
+        :param floor: Floor index, the current floor by default
+        :param cache: HeuristicMapCache to share between pathfinders, this pathfinder's own by default
+        :return: (rows, cols) array, or None without goals
+        """
+        if not self.goals:
             return None
+        floor = self.current_floor if floor is None else floor
+        if self.goal_heuristic is None or self.goal_heuristic_key != self.goal_heuristic_key_for():
+            self.build_goal_heuristic()
+        # The buffered grids hold the walla cells and stairs the heuristic depends on; landmark bounds
+        # also depend on the cost profile
+        search_grid = self.compile_search_grid()
+        version = (search_grid.version, search_grid.profile)
+        walls = np.asarray(self.grids[floor]) == 'wall'
+        cache = self.heuristic_maps if cache is None else cache
+        return cache.get(version, self.goal_heuristic, floor, walls)
 
-        x_sparse, y_sparse, z_sparse = zip(*heuristic_values)
-
-        grid_x, grid_y = np.mgrid[0:floor_shape[0], 0:floor_shape[1]]
-        heuristic_map = griddata((x_sparse, y_sparse), z_sparse, (grid_x, grid_y), method='cubic')
-
-        # Set walls to NaN
-        for i in range(floor_shape[0]):
-            for j in range(floor_shape[1]):
-                if self.grids[self.current_floor][i, j] == 'wall':
-                    heuristic_map[i, j] = np.nan
-
-        return heuristic_map
+    def calculate_sparse_heuristic(self):
+        # Kept for the GUI overlay; the map is no longer sampled and interpolated but exact per cell
+        return self.heuristic_map()
 
     def get_neighbors(self, current):
         x, y, z = current.position
         neighbors = []
+        blocked = ['wall', 'walla'] + list(self.active_cost_profile().impassable)
         directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
         if self.allow_diagonal:
             directions += [(1, 1), (1, -1), (-1, 1), (-1, -1)]
@@ -334,10 +344,10 @@ class InteractiveBIMPathfinder:
         for dx, dy in directions:
             nx, ny = x + dx, y + dy
             if 0 <= nx < self.buffered_grids[z].shape[0] and 0 <= ny < self.buffered_grids[z].shape[1]:
-                if self.buffered_grids[z][nx, ny] not in ['wall', 'walla']:
+                if self.buffered_grids[z][nx, ny] not in blocked:
                     neighbors.append(Node((nx, ny, z)))
 
-        if self.buffered_grids[z][x, y] == 'stair':
+        if self.buffered_grids[z][x, y] == 'stair' and 'stair' not in blocked:
             for nz in range(len(self.buffered_grids)):
                 if nz != z and self.buffered_grids[nz][x, y] == 'stair':
                     neighbors.append(Node((x, y, nz)))
@@ -349,26 +359,14 @@ class InteractiveBIMPathfinder:
         dy = abs(neighbor.position[1] - current.position[1])
         dz = abs(neighbor.position[2] - current.position[2])
 
-        if self.minimize_cost:
-            cost = self.grid_size
-            if self.buffered_grids[neighbor.position[2]][neighbor.position[0], neighbor.position[1]] == 'door':
-                cost += 5 * self.grid_size
-            elif self.buffered_grids[neighbor.position[2]][neighbor.position[0], neighbor.position[1]] == 'stair':
-                cost += 1.25 * self.grid_size
-            elif self.buffered_grids[neighbor.position[2]][neighbor.position[0], neighbor.position[1]] == 'walla':
-                cost += 10 * self.grid_size  # Add a cost for wall-adjacent cells
-
-            if self.allow_diagonal and dx + dy == 2:
-                cost *= 1.414  # Diagonal movement cost
+        if dz > 0:
+            kind = 'vertical'  # Changing floors over a stair
+        elif self.allow_diagonal and dx + dy == 2:
+            kind = 'diagonal'
         else:
-            # For distance minimization, use Euclidean distance
-            cost = np.sqrt(dx ** 2 + dy ** 2) * self.grid_size
-            if dz > 0:
-                cost += 3 * self.grid_size  # Significant penalty for changing floors
-            if self.buffered_grids[neighbor.position[2]][neighbor.position[0], neighbor.position[1]] == 'walla':
-                cost += 10 * self.grid_size  # Add a cost for wall-adjacent cells even in distance mode
-
-        return cost
+            kind = 'straight'
+        element_type = self.buffered_grids[neighbor.position[2]][neighbor.position[0], neighbor.position[1]]
+        return self.active_cost_profile().move_cost(element_type, kind, self.grid_size)
 
     def run_algorithm(self, event):
         if not self.grid_stairs:
@@ -378,76 +376,406 @@ class InteractiveBIMPathfinder:
             return
         if self.algorithm == 'A*':
             self.run_astar()
+        elif self.algorithm == 'Distance Field':
+            self.run_distance_field()
+        elif self.algorithm == 'JPS':
+            self.run_jps()
+        elif self.algorithm == 'HPA*':
+            self.run_hierarchical()
+        elif self.algorithm == 'Bidirectional':
+            self.run_bidirectional()
+        elif self.algorithm == 'Anytime':
+            self.run_anytime()
+        elif self.algorithm == 'Rectangles':
+            self.run_rectangles()
+        elif self.algorithm == 'D* Lite':
+            self.run_incremental(self.incremental)
+        elif self.algorithm == 'Hazard':
+            self.run_hazard_route()
+        elif self.algorithm == 'Tour':
+            self.run_tour()
 
     def run_astar(self):
-        fps = self.fps
-        time0 = time.time()
         self.path = None
+        self.pathlength = None
+        self.explored = None
+        with self.stats.phase('search'):
+            goal_node, closed_set = self.astar_search()
+        self.nodes_expanded = len(closed_set)
+        self.explored = closed_set
+        self.stats.counters['nodes_expanded'] += len(closed_set)
+        self.stats.record_engine(self.goal_heuristic)  # Heuristic calls and time
+        if goal_node is None:
+            print("No path found to any goal.")
+            return None
+        with self.stats.phase('reconstruct'):
+            self.reconstruct_path(goal_node)
+        return self.path
+
+    def astar_search(self):
+        """The A* loop of run_astar; returns the goal node reached (or None) and the closed set."""
+        counters = self.stats.counters
         open_list = []
         closed_set = set()
+        best_g = {self.start: 0}  # Cheapest cost found so far to every open or closed position
+        tie_breaker = itertools.count()  # Equal f values pop in push order, nodes are never compared
+        goal_heuristic = self.build_goal_heuristic()  # Precompute per-goal data once per query
         start_node = Node(self.start)
-        start_node.h = self.heuristic(self.start, None)  # Calculate initial heuristic
+        start_node.h = goal_heuristic(self.start)  # Calculate initial heuristic
         start_node.f = start_node.g + start_node.h
 
-        heapq.heappush(open_list, (start_node.f, start_node))
-
-        progress_counter = 0
-        progress_threshold = 0  #max(1, int(100 / self.speed))
+        heapq.heappush(open_list, (start_node.f, next(tie_breaker), start_node))
+        counters['nodes_pushed'] += 1
 
         while open_list:
-            current_node = heapq.heappop(open_list)[1]
+            counters['max_open_size'] = max(counters['max_open_size'], len(open_list))
+            current_node = heapq.heappop(open_list)[2]
+            if current_node.position in closed_set:
+                continue  # A stale entry, the position was pushed again with a lower cost
 
             if current_node.position in self.goals:
-                self.visualize_progress(closed_set, [node for _, node in open_list], None)
-                self.reconstruct_path(current_node)
-                self.save_path_visualization()
-                return
+                return current_node, closed_set
 
             closed_set.add(current_node.position)
 
-            for neighbor in self.get_neighbors(current_node):
-                if neighbor.position in closed_set:
-                    continue
+            neighbors = [n for n in self.get_neighbors(current_node) if n.position not in closed_set]
+            # Evaluate the heuristic for all neighbors in one batch
+            neighbor_h = goal_heuristic.evaluate([n.position for n in neighbors]) if neighbors else []
 
+            for neighbor, h in zip(neighbors, neighbor_h):
                 tentative_g = current_node.g + self.get_cost(current_node, neighbor)
-
-                if not any(node.position == neighbor.position for _, node in open_list):
-                    neighbor.g = tentative_g
-                    neighbor.h = self.heuristic(neighbor.position, None)
-                    neighbor.f = neighbor.g + neighbor.h
-                    neighbor.parent = current_node
-                    heapq.heappush(open_list, (neighbor.f, neighbor))
-                else:
-                    for i, (f, node) in enumerate(open_list):
-                        if node.position == neighbor.position and tentative_g < node.g:
-                            node.g = tentative_g
-                            node.f = node.g + node.h
-                            node.parent = current_node
-                            heapq.heapify(open_list)
-                            break
-
-            progress_counter += 1
-            if progress_threshold == 0 or progress_counter >= progress_threshold:
-                if time.time() - time0 > 1.0 / fps and self.animated:
-                    time0 = time.time()
-                    self.visualize_progress(closed_set, [node for _, node in open_list],
-                                            self.get_current_path(current_node))
-                    progress_counter = 0
-
-        print("No path found to any goal.")
+                previous_g = best_g.get(neighbor.position)
+                if previous_g is not None and tentative_g >= previous_g:
+                    continue
+                # A cheaper way to an open position is pushed as a new entry (lazy deletion), the old
+                # entry is skipped when it is popped
+                counters['nodes_updated' if previous_g is not None else 'nodes_pushed'] += 1
+                best_g[neighbor.position] = tentative_g
+                neighbor.g = tentative_g
+                neighbor.h = h
+                neighbor.f = neighbor.g + neighbor.h
+                neighbor.parent = current_node
+                heapq.heappush(open_list, (neighbor.f, next(tie_breaker), neighbor))
+
+        return None, closed_set
 
     def reconstruct_path(self, node):
-        path = []
-        path_length = 0
-        while node:
-            path.append(node.position)
-            if node.parent:
-                path_length += self.heuristic(node.position, node.parent.position)
-            node = node.parent
-        self.path = path[::-1]
-        self.t_pathlength.set_val(f"{path_length:.2f}")
-        self.pathlength = path_length
-        self.visualize_path()
+        # The web version has no plot to update, the path length is the accumulated cost of the path
+        self.pathlength = node.g
+        self.path = self.get_current_path(node)
+
+    def compile_search_grid(self):
+        # Compiled grids are kept per cost profile until the buffered grids change (search_grid is reset then)
+        if self.buffered_grids is None:
+            self.apply_wall_buffer()
+        if self.search_grid is None:
+            self.search_grids = {}
+        profile = self.active_cost_profile()
+        key = (profile.name, self.allow_diagonal, self.grid_size)
+        search_grid = self.search_grids.get(key)
+        if search_grid is None:
+            with self.stats.phase('compile'):
+                # Another profile of the same grids only needs its costs compiled, not the cells encoded
+                compiled = next((grid for grid in self.search_grids.values() if grid.grid_size == self.grid_size),
+                                None)
+                if compiled is not None:
+                    search_grid = compiled.with_profile(profile, self.allow_diagonal)
+                else:
+                    search_grid = SearchGrid(self.buffered_grids, self.grid_size, allow_diagonal=self.allow_diagonal,
+                                             cost_profile=profile)
+            self.search_grids[key] = search_grid
+        self.search_grid = search_grid
+        return search_grid
+
+    def compile_sparse_graph(self):
+        """
+        The compiled search grid as a SparseGraph, kept until the search grid changes. With a grid_file the
+        graph is also saved next to it and loaded from there while the grids and cost options are the same.
+        """
+        search_grid = self.compile_search_grid()
+        if self.graph is None or self.graph.search_grid is not search_grid:
+            with self.stats.phase('compile'):
+                filename = cache_path(self.grid_file, search_grid) if self.grid_file else None
+                graph = SparseGraph.load(filename, search_grid) if filename else None
+                if graph is None:
+                    graph = SparseGraph(search_grid)
+                    if filename:
+                        graph.save(filename)
+                self.graph = graph
+        return self.graph
+
+    def distance_field(self, goals):
+        """Distance field toward the goals, computed with the selected backend."""
+        if self.backend == 'scipy':
+            return self.compile_sparse_graph().distance_field(goals)
+        return DistanceField(self.compile_search_grid(), goals)
+
+    def run_distance_field(self, cache=None):
+        """
+        Find the path by following a reverse-Dijkstra distance field from the goals.
+
+        :param cache: Optional DistanceFieldCache, so repeated queries for the same grid, goals and
+                      cost options reuse the field instead of recomputing it
+        :return: The path from start to the nearest goal, or None if no goal is reachable
+        """
+        search_grid = self.compile_search_grid()
+        with self.stats.phase('search'):
+            field = cache.lookup(search_grid, self.goals) if cache is not None else None
+            self.nodes_expanded = 0  # A cached field costs no expansions
+            if field is None:
+                field = self.distance_field(self.goals)
+                self.stats.record_engine(field)
+                self.nodes_expanded = field.nodes_expanded
+                if cache is not None:
+                    cache.put(search_grid, self.goals, field)
+        with self.stats.phase('reconstruct'):
+            self.path = field.path_from(self.start)
+        self.explored = None  # The field covers the whole reachable grid
+        if self.path is None:
+            print("No path found to any goal.")
+            self.pathlength = None
+            return None
+        self.pathlength = field.cost_to_goal(self.start)
+        return self.path
+
+    def run_jps(self):
+        """Jump Point Search with the same costs and heuristic as run_astar, for large uniform floors."""
+        search = JumpPointSearch(self.compile_search_grid())
+        with self.stats.phase('search'):
+            self.path, self.pathlength = search.search(self.start, self.goals, self.build_goal_heuristic())
+        self.stats.record_engine(search)
+        self.stats.record_engine(self.goal_heuristic)
+        self.nodes_expanded = search.nodes_expanded
+        self.explored = None  # Jumps scan cells that are never expanded
+        if self.path is None:
+            print("No path found to any goal.")
+        return self.path
+
+    def run_hierarchical(self, hierarchy=None):
+        """
+        Route on the room/door abstraction of the grid, then refine the route into cells.
+
+        :param hierarchy: Optional HierarchicalGraph built for an earlier version of this grid; it is
+                          updated incrementally instead of being rebuilt from scratch (and rebuilt for
+                          another cost profile)
+        :return: The path from start to the nearest goal, or None if no goal is reachable
+        """
+        search_grid = self.compile_search_grid()
+        with self.stats.phase('compile'):
+            if hierarchy is None:
+                hierarchy = HierarchicalGraph(search_grid)
+            elif hierarchy.search_grid is not search_grid:
+                hierarchy.update(search_grid)
+        self.hierarchy = hierarchy
+        with self.stats.phase('search'):
+            self.path, self.pathlength = hierarchy.search(self.start, self.goals)
+        self.stats.record_engine(hierarchy)
+        self.nodes_expanded = hierarchy.nodes_expanded
+        self.explored = None  # Portal edges span whole rooms
+        if self.path is None:
+            print("No path found to any goal.")
+        return self.path
+
+    def run_rectangles(self, cache=None):
+        """
+        Route over the border cells of the uniform-cost rectangles of the grid, then walk the straight
+        lines inside each rectangle; paths and costs are exact.
+
+        :param cache: Optional RectangleGraphCache, so queries on the same grid version share the
+                      decomposition
+        """
+        search_grid = self.compile_search_grid()
+        with self.stats.phase('compile'):
+            if cache is not None:
+                self.rectangles = cache.get(search_grid)
+            elif self.rectangles is None or self.rectangles.search_grid is not search_grid:
+                self.rectangles = RectangleGraph(search_grid)
+        graph = self.rectangles
+        with self.stats.phase('search'):
+            self.path, self.pathlength = graph.search(self.start, self.goals)
+        self.stats.record_engine(graph)
+        self.nodes_expanded = graph.nodes_expanded
+        self.explored = None  # Moves inside a rectangle skip its cells
+        if self.path is None:
+            print("No path found to any goal.")
+        return self.path
+
+    def run_bidirectional(self, use_heuristic=True):
+        """
+        Search from the start and the goal at the same time; best suited to a single distant goal. With
+        heuristic style 'alt' both sides are guided by the landmark fields, otherwise by octile bounds.
+        """
+        search = BidirectionalSearch(self.compile_search_grid())
+        landmarks = self.compile_landmarks() if use_heuristic and self.heuristic_style == 'alt' else None
+        with self.stats.phase('search'):
+            self.path, self.pathlength = search.search(self.start, self.goals, use_heuristic, landmarks)
+        self.stats.record_engine(search)
+        self.nodes_expanded = search.nodes_expanded
+        self.explored = search.explored()
+        if self.path is None:
+            print("No path found to any goal.")
+        return self.path
+
+    def run_anytime(self, time_budget=0.2):
+        """
+        ARA* search that returns the best path found within the time budget (in seconds).
+
+        Sets self.suboptimality to the factor by which the path cost may exceed the optimum (None if
+        the first round did not finish) and self.search_completed to whether the search ran to the end.
+        """
+        search = AnytimeSearch(self.compile_search_grid())
+        with self.stats.phase('search'):
+            self.path, self.pathlength, self.suboptimality = search.search(self.start, self.goals, time_budget)
+        self.stats.record_engine(search)
+        self.search_completed = search.completed
+        self.nodes_expanded = search.nodes_expanded
+        self.explored = None
+        if self.path is None:
+            print("No path found to any goal." if search.completed else "No path found within the time budget.")
+        return self.path
+
+    def run_incremental(self, planner=None):
+        """
+        D* Lite search that repairs the search of the previous query instead of starting over, so
+        replanning after a small edit or a moved start only expands the cells around the change.
+
+        :param planner: Optional DStarLite of an earlier query, on this or an earlier version of the grid
+        :return: The path from start to the nearest goal, or None if no goal is reachable
+        """
+        search_grid = self.compile_search_grid()
+        with self.stats.phase('compile'):
+            if planner is None:
+                planner = DStarLite(search_grid)
+            elif planner.search_grid is not search_grid:
+                planner.update(search_grid)
+        self.incremental = planner
+        with self.stats.phase('search'):
+            self.path, self.pathlength = planner.search(self.start, self.goals)
+        self.stats.record_engine(planner)
+        self.nodes_expanded = planner.nodes_expanded
+        self.explored = None  # The search state spans earlier queries
+        if self.path is None:
+            print("No path found to any goal.")
+        return self.path
+
+    def set_hazard(self, ignitions=None, levels=None, time_step=1.0, spread_rate=0.1, ramp_time=30.0):
+        """
+        Fire scenario for run_hazard_route: a forecast of hazard levels, or ignitions of a spreading model.
+        Ignitions are added to the current spreading model while the grids and spread options are the
+        same, so only the cells a new front reaches first are updated.
+
+        :param ignitions: List of (x, y, z) or (x, y, z, time) ignition cells
+        :param levels: (steps, floors, rows, cols) hazard levels in [0, 1], one step per time_step seconds
+        """
+        search_grid = self.compile_search_grid()
+        hazard = self.hazard
+        with self.stats.phase('compile'):
+            if levels is not None:
+                self.hazard = HazardField.from_stack(search_grid, levels, time_step)
+            else:
+                if hazard is None or hazard.arrival is None or hazard.search_grid.version != search_grid.version or \
+                        (hazard.spread_rate, hazard.ramp_time) != (spread_rate, ramp_time):
+                    self.hazard = HazardField(search_grid, floors=self.floors, spread_rate=spread_rate,
+                                              ramp_time=ramp_time)
+                self.hazard.ignite(ignitions or [])
+        return self.hazard
+
+    def run_hazard_route(self, start_time=0.0, **options):
+        """
+        Cheapest route through the fire scenario of set_hazard, valuing every move with the hazard at the
+        time it is made. Called again as the person walks (a new start and start_time) or the scenario
+        changes, it keeps the rest of the previous route while that is still good instead of searching.
+
+        :param start_time: Seconds into the scenario at which the walk starts
+        :param options: Speed and hazard options of TimeDependentSearch
+        :return: The path, or None if no goal can be reached safely
+        """
+        search_grid = self.compile_search_grid()
+        if self.hazard is None or self.hazard.search_grid.version != search_grid.version:
+            self.set_hazard()  # No fire (yet), or one on grids that were edited since
+        router = self.hazard_router
+        goals = [tuple(goal) for goal in self.goals]
+        if router is None or router.search.search_grid is not search_grid or router.search.hazard is not self.hazard \
+                or router.goals != goals or self.hazard_options != options:
+            search = TimeDependentSearch(search_grid, self.hazard, self.floors, backend=self.backend, **options)
+            router = self.hazard_router = HazardRouter(search, goals)
+            self.hazard_options = options
+        with self.stats.phase('search'):
+            self.path, self.pathlength, self.hazard_times = router.route(self.start, start_time)
+        self.stats.record_engine(router)
+        self.nodes_expanded = router.nodes_expanded
+        self.explored = None  # States are (cell, time) pairs
+        if self.path is None:
+            print("No path found to any goal.")
+        return self.path
+
+    def run_tour(self, cache=None, closed=False):
+        """
+        Visit every goal from the start in the cheapest order found, instead of stopping at the nearest.
+
+        :param cache: DistanceFieldCache for the per-goal fields, this pathfinder's own by default
+        :param closed: Return to the start after the last goal
+        :return: The stitched path, or None if no goal is reachable; the order and legs are in self.tour
+        """
+        search_grid = self.compile_search_grid()
+        planner = TourPlanner(search_grid, self.distance_field, self.tour_fields if cache is None else cache, closed)
+        with self.stats.phase('search'):
+            self.tour = planner.plan(self.start, self.goals)
+        self.stats.record_engine(planner)
+        self.nodes_expanded = planner.nodes_expanded
+        self.explored = None  # The fields cover the whole reachable grid
+        if not self.tour['order']:
+            print("No path found to any goal.")
+            self.path, self.pathlength = None, None
+            return None
+        self.path, self.pathlength = self.tour['path'], self.tour['length']
+        return self.path
+
+    def run_evacuation(self, agents=None, count=1000, seed=0, max_time=3600.0, **options):
+        """
+        Simulate a crowd leaving the building through the exits (self.goals, or the exit doors if no
+        goals are set).
+
+        :param agents: List of (x, y, z) start cells; default count agents on random floor cells
+        :param options: Capacity and speed options of EvacuationSimulation
+        :return: Dict with per-agent egress times and density heatmaps, see EvacuationSimulation.run
+        """
+        search_grid = self.compile_search_grid()
+        exits = self.goals or find_exits(self.grids)
+        if agents is None:
+            agents = random_agents(self.buffered_grids, count, seed)
+        simulation = EvacuationSimulation(search_grid, exits, self.floors, backend=self.backend, **options)
+        with self.stats.phase('search'):
+            self.evacuation = simulation.run(agents, max_time, seed)
+        self.stats.record_engine(simulation)
+        self.nodes_expanded = simulation.nodes_expanded
+        self.explored = None
+        return self.evacuation
+
+    def find_paths(self, starts, goal_sets=None, cache=None, workers=None):
+        """
+        Route a batch of starts, e.g. every room of a building to its nearest exit.
+
+        :param starts: List of (x, y, z) start positions
+        :param goal_sets: Optional list with a goal list per start; defaults to self.goals for every start
+        :param cache: Optional DistanceFieldCache shared with other queries
+        :param workers: Maximum number of worker processes for computing distance fields
+        :return: Generator of {'index', 'start', 'path', 'length'} dicts, yielded as they complete
+        """
+        if goal_sets is None:
+            goal_sets = [self.goals] * len(starts)
+        if len(goal_sets) != len(starts):
+            raise ValueError("goal_sets must have one goal list per start")
+        return route_batch(self.compile_search_grid(), starts, goal_sets, cache, workers)
+
+    def compress_path(self, path=None):
+        """
+        Reduce a path (default: the last one found) to its line-of-sight waypoints.
+
+        :return: Dict with 'waypoints', the metric 'length' in metres and per-floor 'segments'
+        """
+        compressor = WaypointCompressor(self.compile_search_grid(), self.floors)
+        return compressor.compress(self.path if path is None else path)
 
     def get_current_path(self, node):
         path = []
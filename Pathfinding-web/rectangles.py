@@ -0,0 +1,241 @@
+import heapq
+from collections import OrderedDict
+
+import numpy as np
+
+
+class RectangleGraph:
+    """
+    Walkable space of a SearchGrid merged into rectangles of cells with the same move costs.
+
+    Inside such a rectangle nothing is in the way, so the cheapest path between two of its cells is
+    the octile distance with the rectangle's costs. Only the cells on the edge of a rectangle that
+    border another rectangle (or have a stair link) are nodes of the search: they connect to the other
+    border cells of their rectangle at octile cost and to their neighbours in other rectangles at the
+    cost of entering them. Paths over this graph are exact and are refined into cells by walking the
+    straight lines inside each rectangle.
+    """
+
+    def __init__(self, search_grid):
+        sg = search_grid
+        self.search_grid = sg
+        self.rect_of = np.full(sg.size, -1, dtype=np.int64)
+        rectangles = []
+        codes = sg.flat_codes.reshape(sg.padded_shape)
+        passable = sg.passable.reshape(sg.padded_shape)
+        for z in range(sg.num_floors):
+            rectangles += self.decompose_floor(codes[z], passable[z], z, len(rectangles))
+        self.rectangles = np.array(rectangles, dtype=np.int64).reshape(-1, 5)  # z, x0, y0, x1, y1 (padded)
+        for number, (z, x0, y0, x1, y1) in enumerate(rectangles):
+            self.rect_of.reshape(sg.padded_shape)[z, x0:x1, y0:y1] = number
+        # Costs are uniform within a rectangle, take them from its first cell
+        first = [sg.index((x0 - 1, y0 - 1, z)) for z, x0, y0, _, _ in rectangles]
+        self.straight = sg.straight_cost[first] if first else np.zeros(0)
+        self.diagonal = sg.diagonal_cost[first] if first else np.zeros(0)
+
+        # Border cells: a passable neighbour in another rectangle, or a stair link
+        cells = np.flatnonzero(self.rect_of >= 0)
+        border = np.zeros(sg.size, dtype=bool)
+        for offset, _ in sg.moves:
+            neighbours = cells + offset
+            border[cells[sg.passable[neighbours] & (self.rect_of[neighbours] != self.rect_of[cells])]] = True
+        border[list(sg.stair_links)] = True
+        self.border = np.flatnonzero(border)
+        order = np.argsort(self.rect_of[self.border], kind='stable')
+        starts = np.searchsorted(self.rect_of[self.border][order], np.arange(len(rectangles) + 1))
+        self.rect_border = [self.border[order[starts[r]:starts[r + 1]]] for r in range(len(rectangles))]
+        self.adjacency = {cell: self.crossings(cell) for cell in self.border.tolist()}
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.max_open_size = 0
+
+    @staticmethod
+    def decompose_floor(codes, passable, z, first):
+        """Greedy maximal rectangles of passable cells with the same code, in row-major order."""
+        rows, cols = codes.shape
+        taken = ~passable
+        rectangles = []
+        for x in range(rows):
+            y = 0
+            while True:
+                free = np.flatnonzero(~taken[x, y:])
+                if not len(free):
+                    break
+                y0 = y + int(free[0])
+                same = (codes[x, y0:] == codes[x, y0]) & ~taken[x, y0:]
+                y1 = y0 + (int(np.argmin(same)) if not same.all() else len(same))
+                x1 = x + 1
+                while x1 < rows and ((codes[x1, y0:y1] == codes[x, y0]) & ~taken[x1, y0:y1]).all():
+                    x1 += 1
+                taken[x:x1, y0:y1] = True
+                rectangles.append((z, x, y0, x1, y1))
+                y = y1
+        return rectangles
+
+    def crossings(self, cell):
+        """(neighbour, cost) moves from a cell into other rectangles, including stair links."""
+        sg = self.search_grid
+        rect = self.rect_of[cell]
+        result = [(cell + offset, float(entry[cell + offset])) for offset, entry in sg.moves
+                  if sg.passable[cell + offset] and self.rect_of[cell + offset] != rect]
+        result += [(other, float(sg.vertical_cost[other])) for other in sg.stair_links.get(cell, ())]
+        return result
+
+    @property
+    def node_count(self):
+        return len(self.border)
+
+    def octile(self, rect, cell, targets):
+        """Costs from cell to the target cells of the same rectangle."""
+        sg = self.search_grid
+        row_stride = sg.padded_shape[2]
+        x, y = divmod(cell % sg.floor_stride, row_stride)
+        tx, ty = np.divmod(targets % sg.floor_stride, row_stride)
+        dx, dy = np.abs(tx - x), np.abs(ty - y)
+        if not sg.allow_diagonal:
+            return (dx + dy) * self.straight[rect]
+        low = np.minimum(dx, dy)
+        return (np.maximum(dx, dy) - low) * self.straight[rect] + low * self.diagonal[rect]
+
+    def search(self, start, goals):
+        """
+        Cheapest path from start to any of the goals (A* over the border cells).
+
+        :return: (path, cost), or (None, None) if no goal is reachable
+        """
+        sg = self.search_grid
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.max_open_size = 0
+        goals = [tuple(goal) for goal in goals if sg.contains(goal)]
+        if not sg.contains(start) or not goals:
+            return None, None
+        goal_set = {sg.index(goal) for goal in goals}
+        start_index = sg.index(start)
+        # Goals inside a rectangle are only reached from its other cells
+        goals_in = {}
+        for goal in goal_set:
+            if self.rect_of[goal] >= 0:
+                goals_in.setdefault(int(self.rect_of[goal]), []).append(goal)
+        goals_in = {rect: np.array(cells, dtype=np.int64) for rect, cells in goals_in.items()}
+
+        row_stride = sg.padded_shape[2]
+        goal_x = np.array([goal[0] + 1 for goal in goals])
+        goal_y = np.array([goal[1] + 1 for goal in goals])
+
+        def h(cells):
+            # SearchGrid.lower_bound to the nearest goal, for many cells at once
+            x, y = np.divmod(np.asarray(cells) % sg.floor_stride, row_stride)
+            dx = np.abs(x[:, None] - goal_x)
+            dy = np.abs(y[:, None] - goal_y)
+            if not sg.allow_diagonal:
+                return ((dx + dy) * sg.min_straight).min(axis=1)
+            low = np.minimum(dx, dy)
+            return ((np.maximum(dx, dy) - low) * sg.min_straight + low * sg.min_diagonal).min(axis=1)
+
+        g = np.full(sg.size, np.inf)
+        g[start_index] = 0.0
+        parent = {start_index: (None, -1)}
+        open_list = [(float(h([start_index])[0]), 0.0, start_index)]
+        self.nodes_pushed = 1
+        while open_list:
+            self.max_open_size = max(self.max_open_size, len(open_list))
+            _, d, cell = heapq.heappop(open_list)
+            if d > g[cell]:
+                continue  # Stale entry
+            if cell in goal_set:
+                return self.refine(cell, parent), d
+            self.nodes_expanded += 1
+
+            # Cells, their costs and the rectangle crossed to get there (-1 for a single move)
+            rect = int(self.rect_of[cell])
+            if rect < 0:
+                # An impassable start, outside every rectangle
+                moves = sg.neighbors(cell)
+                targets = np.array([other for other, _ in moves], dtype=np.int64)
+                costs = d + np.array([cost for _, cost in moves], dtype=np.float64)
+                via = np.full(len(targets), -1)
+            else:
+                targets = self.rect_border[rect]
+                if rect in goals_in:
+                    targets = np.concatenate((targets, goals_in[rect]))
+                costs = d + self.octile(rect, cell, targets)
+                via = np.full(len(targets), rect)
+                crossings = self.adjacency.get(cell)
+                if crossings:
+                    targets = np.concatenate((targets, [other for other, _ in crossings]))
+                    costs = np.concatenate((costs, [d + cost for _, cost in crossings]))
+                    via = np.concatenate((via, np.full(len(crossings), -1)))
+
+            improved = costs < g[targets]
+            if not improved.any():
+                continue
+            targets, costs, via = targets[improved], costs[improved], via[improved]
+            # A cell reached twice in one expansion keeps the cheaper cost
+            order = np.lexsort((costs, targets))
+            first = np.r_[True, targets[order][1:] != targets[order][:-1]]
+            targets, costs, via = targets[order][first], costs[order][first], via[order][first]
+            g[targets] = costs
+            for other, cost, step, estimate in zip(targets.tolist(), costs.tolist(), via.tolist(),
+                                                   h(targets).tolist()):
+                parent[other] = (cell, step)
+                heapq.heappush(open_list, (cost + estimate, cost, other))
+                self.nodes_pushed += 1
+        return None, None
+
+    def refine(self, cell, parent):
+        """Cells of the path ending at cell: straight lines inside rectangles, single moves between them."""
+        sg = self.search_grid
+        nodes = []
+        while cell is not None:
+            previous, via = parent[cell]
+            nodes.append((cell, via))
+            cell = previous
+        nodes.reverse()
+        path = [sg.position(nodes[0][0])]
+        for cell, via in nodes[1:]:
+            if via >= 0:
+                # Diagonal steps first, then straight ones; every cell in between is in the rectangle
+                x, y, z = path[-1]
+                tx, ty, _ = sg.position(cell)
+                while (x, y) != (tx, ty):
+                    step_x = (tx > x) - (tx < x)
+                    step_y = (ty > y) - (ty < y)
+                    if sg.allow_diagonal or not step_x:
+                        x, y = x + step_x, y + step_y
+                    else:
+                        x += step_x
+                    path.append((x, y, z))
+            else:
+                path.append(sg.position(cell))
+        return path
+
+
+class RectangleGraphCache:
+    """LRU cache of rectangle decompositions keyed by (grid version, cost profile)."""
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.graphs = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, search_grid):
+        key = (search_grid.version, search_grid.profile)
+        graph = self.graphs.get(key)
+        if graph is not None:
+            self.hits += 1
+            self.graphs.move_to_end(key)
+            # The decomposition is the same for every grid with this version and profile
+            if graph.search_grid is not search_grid:
+                graph.search_grid = search_grid
+            return graph
+        self.misses += 1
+        graph = RectangleGraph(search_grid)
+        self.graphs[key] = graph
+        while len(self.graphs) > self.maxsize:
+            self.graphs.popitem(last=False)
+        return graph
+
+    def clear(self):
+        self.graphs.clear()
@@ -0,0 +1,181 @@
+import copy
+import hashlib
+
+import numpy as np
+
+from cost_profiles import cost_profile as find_cost_profile
+
+# Same order as InteractiveBIMPathfinder.grid_to_numeric
+ELEMENT_TYPES = ['empty', 'wall', 'door', 'stair', 'floor', 'walla']
+EMPTY, WALL, DOOR, STAIR, FLOOR, WALLA = range(len(ELEMENT_TYPES))
+
+ORTHOGONAL = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+DIAGONAL = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
+def encode_grid(grid):
+    """Convert a grid of element type strings to a uint8 code array."""
+    grid = np.asarray(grid)
+    codes = np.zeros(grid.shape, dtype=np.uint8)
+    for code, element_type in enumerate(ELEMENT_TYPES):
+        codes[grid == element_type] = code
+    return codes
+
+
+def grid_fingerprint(floors):
+    """Content hash of the encoded floor grids, used as the grid version in cache keys."""
+    digest = hashlib.blake2b(digest_size=16)
+    for codes in floors:
+        digest.update(str(codes.shape).encode())
+        digest.update(np.ascontiguousarray(codes).tobytes())
+    return digest.hexdigest()
+
+
+class SearchGrid:
+    """
+    Buffered floor grids compiled to flat arrays for the search engines.
+
+    Cells are stored in one flat array over all floors, padded with a one cell border so neighbour
+    offsets never need bounds checks; floors smaller than the largest one are padded up to its size.
+    Move costs reproduce InteractiveBIMPathfinder.get_cost exactly: the cost of a move only depends
+    on the cell that is entered and on the kind of move (straight, diagonal or a vertical stair link).
+    The costs come from a CostProfile, by default the cost or distance profile chosen by minimize_cost.
+    """
+
+    def __init__(self, buffered_grids, grid_size, minimize_cost=True, allow_diagonal=True, cost_profile=None):
+        self.grid_size = grid_size
+        self.cost_profile = cost_profile if cost_profile is not None else find_cost_profile(None, minimize_cost)
+        self.minimize_cost = self.cost_profile.minimize_cost
+        self.allow_diagonal = allow_diagonal
+
+        floors = [encode_grid(floor) for floor in buffered_grids]
+        self.version = grid_fingerprint(floors)
+        self.floor_shapes = [codes.shape for codes in floors]
+        self.num_floors = len(floors)
+        self.rows = max(shape[0] for shape in self.floor_shapes)
+        self.cols = max(shape[1] for shape in self.floor_shapes)
+
+        padded = np.full((self.num_floors, self.rows + 2, self.cols + 2), WALL, dtype=np.uint8)
+        inside = np.zeros(padded.shape, dtype=bool)
+        for z, codes in enumerate(floors):
+            padded[z, 1:codes.shape[0] + 1, 1:codes.shape[1] + 1] = codes
+            inside[z, 1:codes.shape[0] + 1, 1:codes.shape[1] + 1] = True
+        self.codes = padded[:, 1:-1, 1:-1]
+        self.padded_shape = padded.shape
+        self.floor_stride = padded.shape[1] * padded.shape[2]
+        self.size = padded.size
+
+        self.flat_codes = padded.ravel()
+        self.inside = inside.ravel()
+        self.compile_profile()
+
+    @property
+    def profile(self):
+        return (self.cost_profile.name, self.allow_diagonal)
+
+    def compile_profile(self):
+        """Passable cells, move costs and stair links of the cost profile, from the encoded cells."""
+        impassable = [WALL, WALLA] + [ELEMENT_TYPES.index(element_type) for element_type in self.cost_profile.impassable]
+        self.passable = self.inside & ~np.isin(self.flat_codes, impassable)
+
+        self.straight_cost, self.diagonal_cost, self.vertical_cost = self.compile_costs()
+        # Cheapest possible straight and diagonal move, for admissible octile lower bounds
+        gs = self.grid_size
+        self.min_straight = float(self.straight_cost[self.passable].min()) if self.passable.any() else gs
+        self.min_diagonal = float(self.diagonal_cost[self.passable].min()) if self.passable.any() else gs
+        self.min_diagonal = min(self.min_diagonal, 2 * self.min_straight)
+
+        self.directions = ORTHOGONAL + (DIAGONAL if self.allow_diagonal else [])
+        row_stride = self.padded_shape[2]
+        self.moves = [(dx * row_stride + dy, self.diagonal_cost if dx and dy else self.straight_cost)
+                      for dx, dy in self.directions]
+        self.stair_links = self.compile_stair_links()
+
+    def with_profile(self, cost_profile, allow_diagonal=None):
+        """
+        Copy with other move costs, sharing the encoded cells, so switching profiles does not encode the
+        grids again.
+        """
+        grid = copy.copy(self)
+        grid.cost_profile = cost_profile
+        grid.minimize_cost = cost_profile.minimize_cost
+        if allow_diagonal is not None:
+            grid.allow_diagonal = allow_diagonal
+        grid.compile_profile()
+        return grid
+
+    def compile_costs(self):
+        gs = self.grid_size
+        codes = self.flat_codes
+        extra = np.zeros(self.size, dtype=np.float64)
+        for element_type, cost in self.cost_profile.extra_costs.items():
+            extra[codes == ELEMENT_TYPES.index(element_type)] = cost * gs
+        straight, diagonal, vertical = self.cost_profile.move_costs(extra, gs)
+        return straight, diagonal, vertical
+
+    def compile_stair_links(self):
+        # Stair cells connect to the stair cells at the same (x, y) on every other floor
+        stairs = ((self.flat_codes == STAIR) & self.passable).reshape(self.num_floors, self.floor_stride)
+        links = {}
+        for column in np.flatnonzero(stairs.sum(axis=0) > 1).tolist():
+            cells = [z * self.floor_stride + column for z in np.flatnonzero(stairs[:, column]).tolist()]
+            for cell in cells:
+                links[cell] = [other for other in cells if other != cell]
+        return links
+
+    def scaled(self, factor):
+        """
+        Copy whose move costs are multiplied by a per-cell factor (flat array over the padded cells, >= 1
+        keeps lower_bound admissible for the original costs), e.g. to make crowded cells more expensive.
+        """
+        grid = copy.copy(self)
+        factor = np.asarray(factor, dtype=np.float64)
+        grid.straight_cost = self.straight_cost * factor
+        grid.diagonal_cost = self.diagonal_cost * factor
+        grid.vertical_cost = self.vertical_cost * factor
+        row_stride = self.padded_shape[2]
+        grid.moves = [(dx * row_stride + dy, grid.diagonal_cost if dx and dy else grid.straight_cost)
+                      for dx, dy in self.directions]
+        digest = hashlib.blake2b(self.version.encode(), digest_size=16)
+        digest.update(np.ascontiguousarray(factor).tobytes())
+        grid.version = digest.hexdigest()
+        return grid
+
+    def lower_bound(self, a, b):
+        """Octile distance between two positions with the cheapest move costs; never overestimates."""
+        dx = abs(a[0] - b[0])
+        dy = abs(a[1] - b[1])
+        if not self.allow_diagonal:
+            return (dx + dy) * self.min_straight
+        return (max(dx, dy) - min(dx, dy)) * self.min_straight + min(dx, dy) * self.min_diagonal
+
+    def index(self, position):
+        x, y, z = position
+        return (z * self.padded_shape[1] + x + 1) * self.padded_shape[2] + y + 1
+
+    def position(self, index):
+        z, rest = divmod(int(index), self.floor_stride)
+        x, y = divmod(rest, self.padded_shape[2])
+        return (x - 1, y - 1, z)
+
+    def contains(self, position):
+        x, y, z = position
+        if not 0 <= z < self.num_floors:
+            return False
+        rows, cols = self.floor_shapes[z]
+        return 0 <= x < rows and 0 <= y < cols
+
+    def neighbors(self, index):
+        """(neighbour index, move cost) pairs, matching get_neighbors and get_cost."""
+        result = []
+        for offset, entry in self.moves:
+            other = index + offset
+            if self.passable[other]:
+                result.append((other, entry[other]))
+        for other in self.stair_links.get(index, ()):
+            result.append((other, self.vertical_cost[other]))
+        return result
+
+    def unpad(self, values):
+        """Reshape a flat per-cell array to (floors, rows, cols) without the padding border."""
+        return np.asarray(values).reshape(self.padded_shape)[:, 1:-1, 1:-1]
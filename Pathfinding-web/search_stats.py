@@ -0,0 +1,79 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Counters every search engine can report; engines that do not track one leave it at 0
+COUNTERS = ['nodes_expanded', 'nodes_pushed', 'nodes_updated', 'reopened', 'max_open_size', 'heuristic_calls']
+PHASES = ['buffer', 'compile', 'search', 'reconstruct']
+
+
+class SearchStats:
+    """
+    Counters and phase timings of the queries run by one pathfinder.
+
+    nodes_updated counts cheaper paths found to a node that was still open, reopened counts cheaper
+    paths found to a node that was already expanded. Phase times are wall-clock seconds; engines that
+    rebuild their path inside the search report it as part of 'search'.
+    """
+
+    def __init__(self):
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.heuristic_time = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def record_engine(self, engine):
+        """Copy the counters an engine (or heuristic) kept during its last search."""
+        for name in COUNTERS:
+            value = getattr(engine, name, 0)
+            if name == 'max_open_size':
+                self.counters[name] = max(self.counters[name], value)
+            else:
+                self.counters[name] += value
+        self.heuristic_time += getattr(engine, 'heuristic_time', 0.0)
+
+    def as_dict(self):
+        return {**self.counters, 'heuristic_time': self.heuristic_time, 'phases': dict(self.phases),
+                'total_time': sum(self.phases.values())}
+
+
+class StatsAggregator:
+    """Running totals of SearchStats per algorithm, for the counters endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.algorithms = {}
+
+    def record(self, algorithm, stats):
+        values = stats.as_dict()
+        with self.lock:
+            totals = self.algorithms.setdefault(algorithm, {
+                'queries': 0, **dict.fromkeys(COUNTERS, 0), 'heuristic_time': 0.0,
+                'phases': dict.fromkeys(PHASES, 0.0), 'total_time': 0.0, 'max_total_time': 0.0})
+            totals['queries'] += 1
+            for name in COUNTERS:
+                if name == 'max_open_size':
+                    totals[name] = max(totals[name], values[name])
+                else:
+                    totals[name] += values[name]
+            totals['heuristic_time'] += values['heuristic_time']
+            for name, seconds in values['phases'].items():
+                totals['phases'][name] = totals['phases'].get(name, 0.0) + seconds
+            totals['total_time'] += values['total_time']
+            totals['max_total_time'] = max(totals['max_total_time'], values['total_time'])
+
+    def snapshot(self):
+        with self.lock:
+            return {algorithm: {**totals, 'phases': dict(totals['phases'])}
+                    for algorithm, totals in self.algorithms.items()}
+
+    def clear(self):
+        with self.lock:
+            self.algorithms.clear()
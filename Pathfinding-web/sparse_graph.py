@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from distance_field import DistanceField
+
+
+def cache_path(grid_file, search_grid):
+    """File next to a grid JSON file to keep its sparse graph in, one per cost profile."""
+    name, allow_diagonal = search_grid.profile
+    profile = name + ('-diagonal' if allow_diagonal else '')
+    return f"{os.path.splitext(grid_file)[0]}.{profile}.graph.npz"
+
+
+class SparseGraph:
+    """
+    A SearchGrid as a scipy.sparse CSR adjacency matrix, for the scipy.sparse.csgraph routines.
+
+    Every cell inside the grid is a node; node ids map to SearchGrid cell indices through self.cells.
+    An edge from u to v has the cost of entering v, as in SearchGrid.neighbors, so there are edges out
+    of impassable cells (a start may be one) but never into them. Stair links are edges between floors.
+    """
+
+    def __init__(self, search_grid, matrix=None):
+        sg = search_grid
+        self.search_grid = sg
+        self.cells = np.flatnonzero(sg.inside)
+        self.node = np.full(sg.size, -1, dtype=np.int64)
+        self.node[self.cells] = np.arange(len(self.cells))
+        self.matrix = matrix if matrix is not None else self.compile()
+        self.transposed = None  # Edges toward the goals, built on the first backward search
+
+    def compile(self):
+        sg = self.search_grid
+        cells, node = self.cells, self.node
+        sources, targets, weights = [], [], []
+        for offset, entry in sg.moves:
+            neighbours = cells + offset
+            ok = sg.passable[neighbours]
+            sources.append(node[cells[ok]])
+            targets.append(node[neighbours[ok]])
+            weights.append(entry[neighbours[ok]])
+        if sg.stair_links:
+            links = [(cell, other) for cell, others in sg.stair_links.items() for other in others]
+            cell, other = np.array(links, dtype=np.int64).T
+            sources.append(node[cell])
+            targets.append(node[other])
+            weights.append(sg.vertical_cost[other])
+        n = len(cells)
+        return sparse.csr_matrix((np.concatenate(weights), (np.concatenate(sources), np.concatenate(targets))),
+                                 shape=(n, n))
+
+    def nodes_of(self, positions):
+        sg = self.search_grid
+        return [int(self.node[sg.index(position)]) for position in positions if sg.contains(position)]
+
+    def dijkstra(self, sources, reverse=False, limit=np.inf):
+        """
+        Shortest path tree from the nearest of several sources, computed in C.
+
+        :param sources: List of (x, y, z) source positions
+        :param reverse: Search along reversed edges, i.e. the cost from every cell to the nearest source
+        :param limit: Cost beyond which cells are left unreached
+        :return: (cost, predecessor) arrays over the SearchGrid cell indices: inf and -1 where a cell is
+                 not reached; the predecessor is the previous cell on the path from a source, or the next
+                 cell toward it with reverse
+        """
+        sg = self.search_grid
+        cost = np.full(sg.size, np.inf)
+        predecessor = np.full(sg.size, -1, dtype=np.int64)
+        nodes = self.nodes_of(sources)
+        if not nodes:
+            return cost, predecessor
+        if reverse and self.transposed is None:
+            self.transposed = self.matrix.T.tocsr()
+        graph = self.transposed if reverse else self.matrix
+        distances, predecessors, _ = csgraph.dijkstra(graph, indices=nodes, min_only=True, return_predecessors=True,
+                                                      limit=limit)
+        cost[self.cells] = distances
+        reached = predecessors >= 0
+        predecessor[self.cells[reached]] = self.cells[predecessors[reached]]
+        return cost, predecessor
+
+    def distance_field(self, goals):
+        """The DistanceField toward the goals, with the reverse Dijkstra run by scipy."""
+        cost, next_index = self.dijkstra(goals, reverse=True)
+        return DistanceField(self.search_grid, goals, cost, next_index)
+
+    def path(self, start, goals):
+        """(path, cost) from start to the nearest goal, or (None, None) if no goal is reachable."""
+        field = self.distance_field(goals)
+        path = field.path_from(start)
+        return (path, field.cost_to_goal(start)) if path is not None else (None, None)
+
+    def connected_components(self):
+        """
+        Areas that can be walked between, as labels in a (floors, rows, cols) array; -1 for impassable cells.
+
+        :return: (number of components, labels)
+        """
+        sg = self.search_grid
+        passable = sg.passable[self.cells]
+        # Between passable cells every edge has a reverse edge, so weak and strong components are the same
+        _, labels = csgraph.connected_components(self.matrix[passable][:, passable], directed=False)
+        flat = np.full(sg.size, -1, dtype=np.int64)
+        flat[self.cells[passable]] = labels
+        return int(labels.max(initial=-1)) + 1, sg.unpad(flat)
+
+    def save(self, filename):
+        sg = self.search_grid
+        matrix = self.matrix
+        np.savez_compressed(filename, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr,
+                            shape=np.array(matrix.shape), version=np.array(sg.version),
+                            cost_profile=np.array(sg.cost_profile.name), allow_diagonal=np.array(sg.allow_diagonal),
+                            grid_size=np.array(sg.grid_size))
+
+    @classmethod
+    def load(cls, filename, search_grid):
+        """Graph saved for this search grid, or None if there is none or it was saved for other grids."""
+        if not os.path.exists(filename):
+            return None
+        with np.load(filename) as saved:
+            if 'cost_profile' not in saved.files or str(saved['version']) != search_grid.version or \
+                    (str(saved['cost_profile']), bool(saved['allow_diagonal'])) != search_grid.profile or \
+                    float(saved['grid_size']) != search_grid.grid_size:
+                return None
+            matrix = sparse.csr_matrix((saved['data'], saved['indices'], saved['indptr']), shape=tuple(saved['shape']))
+        return cls(search_grid, matrix)
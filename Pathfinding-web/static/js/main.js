@@ -14,6 +14,8 @@ let previewCells = new Set();
 let isMouseDown = false;
 let wallBuffer = 1;
 let paintedCells = new Set();
+let sessionId = null;
+let sessionVersion = 0;
 
 
 function uploadFile(event) {
@@ -37,7 +39,7 @@ function uploadFile(event) {
             throw new Error('Network response was not ok');
         }
         // If file upload successful, start listening for progress
-        const eventSource = new EventSource('/process-file-sse');
+        const eventSource = new EventSource('/process-file-sse?format=rle');
 
         eventSource.onmessage = function(event) {
             const data = JSON.parse(event.data);
@@ -48,8 +50,11 @@ function uploadFile(event) {
             } else if (data.complete) {
                 eventSource.close();
                 progressContainer.classList.add('hidden');
-                // Handle the completed data
+                // Handle the completed data, the server keeps a copy of the grids under the session id
                 gridData = data.result;
+                gridData.grids = decodeGrids(gridData.grids);
+                sessionId = data.session_id;
+                sessionVersion = data.version;
                 initializeGrid();
                 document.getElementById('grid-editor').classList.remove('hidden');
                 document.getElementById('pathfinder').classList.remove('hidden');
@@ -84,8 +89,8 @@ function initializeGrid() {
     const gridWidth = gridData.grids[0][0].length;
     const gridHeight = gridData.grids[0].length;
     // After loading initial grid data
-    gridData.buffered_grids = gridData.grids;
-    updateBufferForPaintedCells();
+    gridData.buffered_grids = copyGrids(gridData.grids);
+    updateWallBuffer(wallBuffer);
 
     console.log(`Container: ${containerWidth}x${containerHeight}, Grid: ${gridWidth}x${gridHeight}`);
 
@@ -169,7 +174,6 @@ function startPainting(e) {
 }
 
 function stopPainting() {
-    gridData.buffered_grids = gridData.grids;
     isPainting = false;
     isMouseDown = false;
     lastPreviewCell = lastPaintedCell;
@@ -213,7 +217,7 @@ function paintWithBrush(centerRow, centerCol) {
             if (row >= 0 && row < gridData.grids[currentFloor].length &&
                 col >= 0 && col < gridData.grids[currentFloor][0].length) {
                 gridData.grids[currentFloor][row][col] = currentType;
-                paintedCells.add(`${row},${col}`);
+                paintedCells.add(`${currentFloor},${row},${col}`);
                 const cell = document.querySelector(`[data-row="${row}"][data-col="${col}"]`);
                 if (cell) {
                     updateCellAppearance(cell, currentType);
@@ -383,6 +387,7 @@ document.getElementById('fill-tool').addEventListener('click', () => currentTool
 document.getElementById('clear-floor').addEventListener('click', () => {
     gridData.grids[currentFloor] = gridData.grids[currentFloor].map(row => row.map(() => 'empty'));
     renderGrid(gridData.grids[currentFloor]);
+    createSession();
 });
 
 document.getElementById('add-floor').addEventListener('click', () => {
@@ -395,6 +400,7 @@ document.getElementById('add-floor').addEventListener('click', () => {
     currentFloor = gridData.grids.length - 1;
     renderGrid(gridData.grids[currentFloor]);
     updateFloorDisplay();
+    createSession();
 });
 
 document.getElementById('remove-floor').addEventListener('click', () => {
@@ -404,6 +410,7 @@ document.getElementById('remove-floor').addEventListener('click', () => {
         currentFloor = Math.min(currentFloor, gridData.grids.length - 1);
         renderGrid(gridData.grids[currentFloor]);
         updateFloorDisplay();
+        createSession();
     } else {
         alert('Cannot remove the last floor.');
     }
@@ -448,32 +455,130 @@ document.getElementById('find-path').addEventListener('click', async () => {
                 'Content-Type': 'application/json'
             },
             body: JSON.stringify({
-                grids: gridData.grids,
-                grid_size: gridData.grid_size,
-                floors: gridData.floors,
-                bbox: gridData.bbox,
+                session_id: sessionId,
+                wall_buffer: wallBuffer * gridData.grid_size,
                 start: start,
-                goals: goals
+                goals: goals,
+                cost_profile: document.getElementById('cost-profile').value || null,
+                path_format: 'waypoints'
             })
         });
         const data = await response.json();
-        document.getElementById('result').innerHTML = `<pre>${JSON.stringify(data.path, null, 2)}</pre>`;
+        if (!data.waypoints) {
+            document.getElementById('result').innerHTML = '<pre>No path found.</pre>';
+            return;
+        }
+        document.getElementById('result').innerHTML =
+            `<pre>Length: ${data.metric_length.toFixed(2)} m\n${JSON.stringify(data.waypoints, null, 2)}</pre>`;
 
-        highlightPath(data.path);
+        highlightPath(data.segments);
     } catch (error) {
         console.error('Error:', error);
         alert('An error occurred while finding the path.');
     }
 });
 
-function highlightPath(path) {
-    path.forEach(point => {
-        if (point[2] === currentFloor) {
-            const cell = document.querySelector(`[data-row="${point[0]}"][data-col="${point[1]}"]`);
-            if (cell) {
-                cell.classList.add('bg-yellow-300');
-            }
+// Cells on the straight line between two waypoints, for drawing the compressed path
+function lineCells(from, to) {
+    const cells = [];
+    let [row, col] = from;
+    const dRow = Math.abs(to[0] - row);
+    const dCol = Math.abs(to[1] - col);
+    const sRow = row < to[0] ? 1 : -1;
+    const sCol = col < to[1] ? 1 : -1;
+    let err = dCol - dRow;
+    while (true) {
+        cells.push([row, col]);
+        if (row === to[0] && col === to[1]) break;
+        const e2 = 2 * err;
+        if (e2 > -dRow) {
+            err -= dRow;
+            col += sCol;
+        }
+        if (e2 < dCol) {
+            err += dCol;
+            row += sRow;
+        }
+    }
+    return cells;
+}
+
+function highlightPath(segments) {
+    // Grid cells are rendered row by row, so a cell is found by its index instead of a selector query
+    const container = document.getElementById('grid-container');
+    const cols = gridData.grids[currentFloor][0].length;
+    segments.filter(segment => segment.floor === currentFloor).forEach(segment => {
+        segment.points.forEach((point, i) => {
+            const cells = i === 0 ? [point] : lineCells(segment.points[i - 1], point);
+            cells.forEach(([row, col]) => {
+                const cell = container.children[row * cols + col];
+                if (cell) {
+                    cell.classList.add('bg-yellow-300');
+                }
+            });
+        });
+    });
+}
+
+document.getElementById('show-heuristic').addEventListener('click', async () => {
+    if (goals.length === 0) {
+        alert('Please set at least one goal.');
+        return;
+    }
+
+    try {
+        const response = await fetch('/heuristic-map', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                session_id: sessionId,
+                wall_buffer: wallBuffer * gridData.grid_size,
+                goals: goals,
+                cost_profile: document.getElementById('cost-profile').value || null,
+                floor: currentFloor
+            })
+        });
+        const data = await response.json();
+        if (data.error) {
+            alert(data.error);
+            return;
         }
+        showHeuristic(data);
+    } catch (error) {
+        console.error('Error:', error);
+        alert('An error occurred while computing the heuristic.');
+    }
+});
+
+// Cost profiles the server knows, e.g. wheelchair routes without stairs
+fetch('/cost-profiles')
+    .then(response => response.json())
+    .then(profiles => {
+        const select = document.getElementById('cost-profile');
+        profiles.forEach(profile => {
+            const option = document.createElement('option');
+            option.value = profile.name;
+            option.textContent = profile.name;
+            option.title = profile.description;
+            select.appendChild(option);
+        });
+    });
+
+function showHeuristic(data) {
+    // Tint every cell from blue (near the goals) to red (far away) over its own color; walls stay as they are
+    const container = document.getElementById('grid-container');
+    const cols = data.values[0].length;
+    const range = data.max - data.min || 1;
+    data.values.forEach((row, i) => {
+        row.forEach((value, j) => {
+            const cell = container.children[i * cols + j];
+            if (!cell || value === null) return;
+            const hue = 240 * (1 - (value - data.min) / range);
+            const tint = `hsla(${hue}, 90%, 50%, 0.5)`;
+            cell.style.backgroundImage = `linear-gradient(${tint}, ${tint})`;
+        });
     });
 }
 
@@ -511,44 +616,178 @@ document.getElementById('wall-buffer').addEventListener('input', (e) => {
     updateWallBuffer(wallBuffer);
 });
 
-function updateBufferForPaintedCells() {
-    //const affectedCells = Array.from(paintedCells).map(coord => coord.split(',').map(Number));
-    affectedCells = [0];
-    fetch('/update-buffer', {
+// Grid payloads are run-length encoded: per floor a base64 array of uint8 element codes and a base64
+// array of little-endian uint32 run lengths, read row by row. Plain nested arrays are passed through.
+function base64ToBytes(text) {
+    const binary = atob(text);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return bytes;
+}
+
+function bytesToBase64(bytes) {
+    let binary = '';
+    const chunk = 0x8000;
+    for (let i = 0; i < bytes.length; i += chunk) {
+        binary += String.fromCharCode.apply(null, bytes.subarray(i, i + chunk));
+    }
+    return btoa(binary);
+}
+
+function decodeGrids(payload) {
+    if (Array.isArray(payload)) {
+        return payload;
+    }
+    const types = payload.element_types;
+    return payload.floors.map(floor => {
+        const [rows, cols] = floor.shape;
+        const values = base64ToBytes(floor.values);
+        const lengths = new DataView(base64ToBytes(floor.lengths).buffer);
+        const cells = new Array(rows * cols);
+        let offset = 0;
+        for (let run = 0; run < values.length; run++) {
+            const type = types[values[run]];
+            const end = offset + lengths.getUint32(run * 4, true);
+            cells.fill(type, offset, end);
+            offset = end;
+        }
+        const grid = new Array(rows);
+        for (let i = 0; i < rows; i++) {
+            grid[i] = cells.slice(i * cols, (i + 1) * cols);
+        }
+        return grid;
+    });
+}
+
+function encodeGrids(grids) {
+    const types = ['empty', 'wall', 'door', 'stair', 'floor', 'walla'];
+    const codes = new Map(types.map((type, code) => [type, code]));
+    return {
+        encoding: 'rle',
+        element_types: types,
+        floors: grids.map(grid => {
+            const values = [];
+            const lengths = [];
+            grid.forEach(row => row.forEach(cell => {
+                const code = codes.get(cell) || 0;
+                if (values.length > 0 && values[values.length - 1] === code) {
+                    lengths[lengths.length - 1]++;
+                } else {
+                    values.push(code);
+                    lengths.push(1);
+                }
+            }));
+            const lengthBytes = new DataView(new ArrayBuffer(lengths.length * 4));
+            lengths.forEach((length, i) => lengthBytes.setUint32(i * 4, length, true));
+            return {
+                shape: [grid.length, grid.length > 0 ? grid[0].length : 0],
+                values: bytesToBase64(Uint8Array.from(values)),
+                lengths: bytesToBase64(new Uint8Array(lengthBytes.buffer))
+            };
+        })
+    };
+}
+
+function copyGrids(grids) {
+    return grids.map(floor => floor.map(row => row.slice()));
+}
+
+function applyBufferedCells(cells) {
+    cells.forEach(cell => {
+        gridData.buffered_grids[cell.floor][cell.row][cell.col] = cell.element_type;
+    });
+}
+
+// Structural changes (floors added, removed or cleared) re-upload the grids as a new session
+function createSession() {
+    fetch('/sessions', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
         },
         body: JSON.stringify({
-            floor: currentFloor,
-            affected_cells: affectedCells,
-            wall_buffer: wallBuffer,
-            grid: gridData.grids[currentFloor]
+            grids: encodeGrids(gridData.grids),
+            grid_size: gridData.grid_size,
+            floors: gridData.floors,
+            bbox: gridData.bbox
         })
     })
     .then(response => response.json())
     .then(data => {
-        gridData.buffered_grids[currentFloor] = data.updated_floor;
+        sessionId = data.session_id;
+        sessionVersion = data.version;
+        gridData.buffered_grids = copyGrids(gridData.grids);
+        updateWallBuffer(wallBuffer);
+    })
+    .catch(error => console.error('Error:', error));
+}
+
+// Replace the local grids with the server's copy, after edits were rejected as outdated
+function reloadSession() {
+    fetch(`/sessions/${sessionId}?format=rle`)
+    .then(response => response.json())
+    .then(data => {
+        gridData.grids = decodeGrids(data.grids);
+        sessionVersion = data.version;
+        gridData.buffered_grids = copyGrids(gridData.grids);
+        updateWallBuffer(wallBuffer);
+    })
+    .catch(error => console.error('Error:', error));
+}
+
+function updateBufferForPaintedCells() {
+    // Only the painted cells are sent, the server returns the buffered cells that changed
+    if (!sessionId || paintedCells.size === 0) {
+        return;
+    }
+    const edits = Array.from(paintedCells).map(key => {
+        const [floor, row, col] = key.split(',').map(Number);
+        return { floor, row, col, element_type: gridData.grids[floor][row][col] };
+    });
+    paintedCells.clear();
+    fetch(`/sessions/${sessionId}/edits`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            base_version: sessionVersion,
+            edits: edits
+        })
+    })
+    .then(response => response.json().then(data => ({ status: response.status, data })))
+    .then(({ status, data }) => {
+        if (status === 409) {
+            console.warn(data.error);
+            reloadSession();
+            return;
+        }
+        sessionVersion = data.version;
+        applyBufferedCells(data.buffered_cells);
         renderGrid(gridData.buffered_grids[currentFloor]);
-        paintedCells.clear();
     })
     .catch(error => console.error('Error:', error));
 }
 
 function updateWallBuffer(newBufferValue) {
+    if (!sessionId) {
+        return;
+    }
     fetch('/apply-wall-buffer', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
         },
         body: JSON.stringify({
-            grids: gridData.grids,
-            wall_buffer: newBufferValue
+            session_id: sessionId,
+            wall_buffer: newBufferValue * gridData.grid_size
         })
     })
     .then(response => response.json())
     .then(data => {
-        gridData.buffered_grids = data.buffered_grids;
+        applyBufferedCells(data.buffered_cells);
         renderGrid(gridData.buffered_grids[currentFloor]);
     })
     .catch(error => console.error('Error:', error));
@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The modules of the web app are imported by their flat names, as app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def divided_floor(rows=24, cols=24):
+    """One floor split by a wall with a gap at its far end, so the path from left to right makes a detour."""
+    grid = np.full((rows, cols), 'floor', dtype=object)
+    grid[0, :] = grid[-1, :] = grid[:, 0] = grid[:, -1] = 'wall'
+    grid[1:-3, cols // 2] = 'wall'
+    return grid
+
+
+@pytest.fixture
+def building():
+    """Two floors, the upper one divided, with a stair between them and an exit door on the ground floor."""
+    ground = divided_floor()
+    ground[1:-1, 12] = 'floor'
+    ground[5:8, 0] = 'door'
+    upper = divided_floor()
+    for grid in (ground, upper):
+        grid[18:20, 3:5] = 'stair'
+    return {'grids': [ground, upper], 'grid_size': 0.5,
+            'floors': [{'elevation': 0.0, 'height': 3.0}, {'elevation': 3.0, 'height': 3.0}],
+            'bbox': {'min_x': 0.0, 'min_y': 0.0, 'min_z': 0.0, 'max_x': 12.0, 'max_y': 12.0, 'max_z': 6.0}}
+
+
+@pytest.fixture(scope='session')
+def office():
+    """Small synthetic office: rooms on both sides of a corridor, doors, exits and a stairwell on two floors."""
+    from benchmarks.generators import synthetic_building
+    return synthetic_building(width=16.0, depth=12.0, floors=2, grid_size=0.4)
+
+
+@pytest.fixture
+def client():
+    app = pytest.importorskip('app')
+    # Results and fields of earlier tests on the same grids would answer queries without a search
+    app.path_results.clear()
+    app.distance_fields.clear()
+    app.app.config['TESTING'] = True
+    return app.app.test_client()
+
+
+@pytest.fixture
+def session_id(client, building):
+    """Server-side session holding the building."""
+    payload = {**building, 'grids': [grid.tolist() for grid in building['grids']]}
+    response = client.post('/sessions', json=payload)
+    assert response.status_code == 200
+    return response.get_json()['session_id']
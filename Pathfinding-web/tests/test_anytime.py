@@ -0,0 +1,38 @@
+import pytest
+
+from anytime import AnytimeSearch
+from benchmarks.differential import DifferentialChecker, make_pathfinder, random_queries
+
+
+@pytest.mark.parametrize('allow_diagonal', [True, False])
+@pytest.mark.parametrize('minimize_cost', [True, False])
+def test_finished_searches_are_optimal(office, minimize_cost, allow_diagonal):
+    checker = DifferentialChecker(office, minimize_cost=minimize_cost, allow_diagonal=allow_diagonal)
+    queries = random_queries(checker.pathfinder, count=15, max_goals=3, seed=10)
+    assert checker.check('Anytime', queries) == []
+    pathfinder = checker.pathfinder
+    pathfinder.start, pathfinder.goals = queries[0]
+    pathfinder.run_anytime(time_budget=60.0)
+    assert pathfinder.search_completed and pathfinder.suboptimality == 1.0
+
+
+def test_solutions_improve_within_their_bounds(office):
+    checker = DifferentialChecker(office)
+    search = AnytimeSearch(checker.pathfinder.compile_search_grid(), initial_epsilon=5.0)
+    for start, goals in random_queries(checker.pathfinder, count=10, max_goals=1, seed=12):
+        optimum = checker.reference_cost(start, goals)
+        solutions = list(search.solutions(start, goals))
+        assert search.completed
+        costs = [cost for _, cost, _ in solutions]
+        assert costs == sorted(costs, reverse=True)
+        for path, cost, bound in solutions:
+            assert checker.path_error(path, start, goals, cost) is None
+            assert optimum - 1e-9 <= cost <= bound * optimum + 1e-9
+        assert solutions[-1][2] == 1.0 and costs[-1] == pytest.approx(optimum)
+
+
+def test_an_expired_budget_is_not_reported_as_no_path(building):
+    pathfinder = make_pathfinder(building)
+    pathfinder.start, pathfinder.goals = (2, 4, 0), [(20, 20, 1)]
+    assert pathfinder.run_anytime(time_budget=0.0) is None or pathfinder.suboptimality is None
+    assert not pathfinder.search_completed
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from batch import route_batch
+from benchmarks.differential import make_pathfinder, random_queries
+from distance_field import DistanceField, DistanceFieldCache
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_batches_match_single_fields(office, workers):
+    search_grid = make_pathfinder(office).compile_search_grid()
+    queries = random_queries(make_pathfinder(office), count=12, max_goals=2, seed=14)
+    starts = [start for start, _ in queries]
+    goal_sets = [queries[i % 3][1] for i in range(len(queries))]  # Three goal sets, shared by four starts each
+    cache = DistanceFieldCache()
+    results = sorted(route_batch(search_grid, starts, goal_sets, cache, workers), key=lambda result: result['index'])
+    assert [result['index'] for result in results] == list(range(len(starts)))
+    for result, start, goals in zip(results, starts, goal_sets):
+        field = DistanceField(search_grid, goals)
+        assert result['path'] == field.path_from(start)
+        assert result['length'] == pytest.approx(field.cost_to_goal(start))
+    assert (cache.hits, cache.misses) == (0, 3)
+    # A second batch finds every field in the cache
+    list(route_batch(search_grid, starts, goal_sets, cache, workers))
+    assert cache.hits == 3
+
+
+def test_find_paths_streams_a_result_per_start(client, session_id):
+    starts = [[2, 4, 0], [2, 20, 1], [0, 0, 0]]
+    response = client.post('/find-paths', json={'session_id': session_id, 'starts': starts, 'goals': [[20, 20, 1]]})
+    assert response.content_type.startswith('text/event-stream')
+    events = [json.loads(line[len('data: '):]) for line in response.get_data(as_text=True).split('\n\n') if line]
+    assert events[-1] == {'complete': True, 'count': 3}
+    results = {event['index']: event for event in events[:-1]}
+    assert sorted(results) == [0, 1, 2]
+    assert all(results[i]['path'][-1] == [20, 20, 1] for i in range(3))
+    assert results[0]['length'] > results[1]['length']
@@ -0,0 +1,30 @@
+import pytest
+
+from benchmarks.differential import DifferentialChecker, random_queries
+
+
+@pytest.mark.parametrize('heuristic_style', ['min', 'alt'])
+@pytest.mark.parametrize('allow_diagonal', [True, False])
+@pytest.mark.parametrize('minimize_cost', [True, False])
+def test_bidirectional_finds_optimal_paths(office, minimize_cost, allow_diagonal, heuristic_style):
+    checker = DifferentialChecker(office, minimize_cost=minimize_cost, allow_diagonal=allow_diagonal)
+    checker.pathfinder.heuristic_style = heuristic_style
+    # One goal for the guided search, several for the backward Dijkstra from all goals
+    queries = random_queries(checker.pathfinder, count=15, max_goals=1, seed=5) + \
+        random_queries(checker.pathfinder, count=5, max_goals=3, seed=6)
+    assert checker.check('Bidirectional', queries) == []
+
+
+def test_landmark_potentials_expand_fewer_cells_than_astar(office):
+    checker = DifferentialChecker(office)
+    pathfinder = checker.pathfinder
+    expanded = {}
+    for name, heuristic_style, run in [('A*', 'min', pathfinder.run_astar), ('A* alt', 'alt', pathfinder.run_astar),
+                                       ('Bidirectional', 'alt', pathfinder.run_bidirectional)]:
+        pathfinder.heuristic_style = heuristic_style
+        expanded[name] = 0
+        for start, goals in random_queries(pathfinder, count=20, max_goals=1, seed=5):
+            pathfinder.start, pathfinder.goals = start, goals
+            run()
+            expanded[name] += pathfinder.nodes_expanded
+    assert expanded['Bidirectional'] < expanded['A* alt'] < expanded['A*']
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from benchmarks.differential import DifferentialChecker, make_pathfinder
+from cost_profiles import COST_PROFILES, UnknownCostProfile, cost_profile
+from pathfinder import Node
+from search_grid import SearchGrid
+
+
+def test_profiles_are_found_by_name():
+    assert cost_profile().name == 'cost' and cost_profile(minimize_cost=False).name == 'distance'
+    assert cost_profile('wheelchair') is COST_PROFILES['wheelchair']
+    with pytest.raises(UnknownCostProfile):
+        cost_profile('skateboard')
+
+
+@pytest.mark.parametrize('name', sorted(COST_PROFILES))
+def test_compiled_costs_match_get_cost(building, name):
+    pathfinder = make_pathfinder(building, wall_buffer=0.5)
+    pathfinder.cost_profile = name
+    search_grid = pathfinder.compile_search_grid()
+    for position in [(2, 4, 0), (6, 1, 0), (18, 3, 0), (5, 12, 1), (1, 1, 1)]:
+        node = Node(position)
+        for neighbor in pathfinder.get_neighbors(node):
+            moves = dict(search_grid.neighbors(search_grid.index(position)))
+            assert moves[search_grid.index(neighbor.position)] == pytest.approx(pathfinder.get_cost(node, neighbor))
+
+
+def test_other_profiles_share_the_encoded_cells(building):
+    pathfinder = make_pathfinder(building)
+    cost = pathfinder.compile_search_grid()
+    pathfinder.cost_profile = 'responder'
+    responder = pathfinder.compile_search_grid()
+    assert responder.flat_codes is cost.flat_codes
+    fresh = SearchGrid(pathfinder.buffered_grids, pathfinder.grid_size, cost_profile=COST_PROFILES['responder'])
+    for name in ['straight_cost', 'diagonal_cost', 'vertical_cost', 'passable']:
+        assert np.array_equal(getattr(responder, name), getattr(fresh, name))
+    assert responder.profile != cost.profile
+
+
+def test_wheelchair_routes_do_not_take_stairs(building):
+    checker = DifferentialChecker(building)
+    pathfinder = checker.pathfinder
+    pathfinder.cost_profile = 'wheelchair'
+    assert checker.check('A*', [((2, 4, 0), [(20, 20, 1)]), ((2, 4, 0), [(20, 20, 0)])]) == []
+    assert pathfinder.run_astar() is not None
+    assert all(pathfinder.grids[z][x, y] != 'stair' for x, y, z in pathfinder.path)
+
+
+def test_unknown_profiles_are_rejected(client, session_id):
+    names = [profile['name'] for profile in client.get('/cost-profiles').get_json()]
+    assert names == list(COST_PROFILES)
+    response = client.post('/find-path', json={'session_id': session_id, 'start': [2, 4, 0], 'goals': [[20, 20, 1]],
+                                               'cost_profile': 'skateboard'})
+    assert response.status_code == 400
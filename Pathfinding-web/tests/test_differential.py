@@ -0,0 +1,43 @@
+from benchmarks.differential import DifferentialChecker, random_queries
+from pathfinder import Node
+
+
+def detour(pathfinder):
+    """An engine that steps to a neighbour and back before taking the optimal path."""
+    path = pathfinder.run_distance_field()
+    if path is None or len(path) < 2:
+        return path
+    start, step = Node(path[0]), Node(path[1])
+    pathfinder.pathlength += pathfinder.get_cost(start, step) + pathfinder.get_cost(step, start)
+    return [path[0], path[1]] + path
+
+
+def test_the_reference_is_the_distance_field(office):
+    checker = DifferentialChecker(office)
+    queries = random_queries(checker.pathfinder, count=10, seed=2)
+    assert checker.check('Distance Field', queries) == []
+
+
+def test_more_expensive_paths_are_mismatches(office):
+    checker = DifferentialChecker(office)
+    queries = [(start, goals) for start, goals in random_queries(checker.pathfinder, count=10, seed=2)
+               if checker.reference_cost(start, goals)]
+    mismatches = checker.check(detour, queries)
+    assert len(mismatches) == len(queries)
+    assert {mismatch['error'] for mismatch in mismatches} == {"more expensive than the reference"}
+
+
+def test_misreported_lengths_are_mismatches(office):
+    checker = DifferentialChecker(office)
+
+    def understated(pathfinder):
+        path = pathfinder.run_distance_field()
+        if path is not None:
+            pathfinder.pathlength /= 2
+        return path
+
+    queries = [(start, goals) for start, goals in random_queries(checker.pathfinder, count=5, seed=2)
+               if checker.reference_cost(start, goals)]
+    mismatches = checker.check(understated, queries)
+    assert len(mismatches) == len(queries)
+    assert all(mismatch['error'].startswith("reported length") for mismatch in mismatches)
@@ -0,0 +1,86 @@
+import heapq
+
+import numpy as np
+import pytest
+
+from benchmarks.differential import make_pathfinder
+from distance_field import DistanceField, DistanceFieldCache
+from pathfinder import Node
+
+
+def dijkstra(pathfinder, start, goals):
+    """Cost from start to the nearest goal over get_neighbors and get_cost, the moves of run_astar."""
+    costs, heap, goals = {start: 0.0}, [(0.0, start)], set(goals)
+    while heap:
+        d, position = heapq.heappop(heap)
+        if position in goals:
+            return d
+        if d > costs[position]:
+            continue
+        node = Node(position)
+        for neighbor in pathfinder.get_neighbors(node):
+            nd = d + pathfinder.get_cost(node, neighbor)
+            if nd < costs.get(neighbor.position, np.inf):
+                costs[neighbor.position] = nd
+                heapq.heappush(heap, (nd, neighbor.position))
+    return None
+
+
+@pytest.mark.parametrize('allow_diagonal', [True, False])
+@pytest.mark.parametrize('minimize_cost', [True, False])
+def test_field_costs_are_shortest_path_costs(building, minimize_cost, allow_diagonal):
+    pathfinder = make_pathfinder(building, minimize_cost=minimize_cost, allow_diagonal=allow_diagonal)
+    goals = [(20, 20, 1), (6, 1, 0)]
+    field = DistanceField(pathfinder.compile_search_grid(), goals)
+    for start in [(2, 4, 0), (2, 4, 1), (2, 20, 1), (12, 12, 0), (22, 22, 1)]:
+        assert field.cost_to_goal(start) == pytest.approx(dijkstra(pathfinder, start, goals))
+        path = field.path_from(start)
+        assert path[0] == start and path[-1] in goals
+        steps = zip(map(Node, path), map(Node, path[1:]))
+        assert sum(pathfinder.get_cost(a, b) for a, b in steps) == pytest.approx(field.cost_to_goal(start))
+
+
+def test_unreachable_and_outside_cells_have_no_path(building):
+    building['grids'][0][9:12, 15:18] = 'wall'
+    building['grids'][0][10, 16] = 'floor'  # A sealed pocket
+    pathfinder = make_pathfinder(building)
+    field = DistanceField(pathfinder.compile_search_grid(), [(20, 20, 1)])
+    assert field.path_from((10, 16, 0)) is None
+    assert field.cost_to_goal((30, 4, 0)) == np.inf
+    assert np.isinf(field.cost_grid()[0][10, 16])
+    # A wall can be a start, it is left with the first step
+    assert field.path_from((0, 0, 0))[1] == (1, 1, 0)
+
+
+def test_cache_reuses_fields_per_grid_goals_and_profile(building):
+    pathfinder = make_pathfinder(building)
+    cache = DistanceFieldCache(maxsize=2)
+    search_grid = pathfinder.compile_search_grid()
+    field = cache.get(search_grid, [(20, 20, 1), (6, 1, 0)])
+    assert cache.get(search_grid, [(6, 1, 0), (20, 20, 1)]) is field  # The goal order does not matter
+    pathfinder.minimize_cost = False
+    assert cache.lookup(pathfinder.compile_search_grid(), [(20, 20, 1), (6, 1, 0)]) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cache_drops_the_least_recently_used_field(building):
+    search_grid = make_pathfinder(building).compile_search_grid()
+    cache = DistanceFieldCache(maxsize=2)
+    first = cache.get(search_grid, [(2, 2, 0)])
+    cache.get(search_grid, [(3, 3, 0)])
+    cache.get(search_grid, [(2, 2, 0)])  # Used again, so the next field replaces the other one
+    cache.get(search_grid, [(4, 4, 0)])
+    assert cache.lookup(search_grid, [(2, 2, 0)]) is first
+    assert cache.lookup(search_grid, [(3, 3, 0)]) is None
+
+
+def test_cached_queries_expand_no_cells(building):
+    pathfinder = make_pathfinder(building)
+    cache = DistanceFieldCache()
+    pathfinder.start, pathfinder.goals = (2, 4, 0), [(20, 20, 1)]
+    first = pathfinder.run_distance_field(cache)
+    assert pathfinder.nodes_expanded > 0
+    pathfinder.start = (3, 4, 0)
+    pathfinder.run_distance_field(cache)
+    assert pathfinder.nodes_expanded == 0
+    assert first[-1] == pathfinder.path[-1] == (20, 20, 1)
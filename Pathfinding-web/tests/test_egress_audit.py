@@ -0,0 +1,59 @@
+import numpy as np
+
+from benchmarks.differential import make_pathfinder
+from egress_audit import audit_space, floor_of, rasterize_footprint
+
+BBOX = {'min_x': 0.0, 'min_y': 0.0}
+
+
+def rectangle(x0, y0, x1, y1, z=0.0):
+    """Vertices and two triangles of a horizontal rectangle."""
+    verts = [x0, y0, z, x1, y0, z, x1, y1, z, x0, y1, z]
+    return verts, [0, 1, 2, 0, 2, 3]
+
+
+def test_spaces_stand_on_the_floor_their_geometry_starts_on():
+    floors = [{'elevation': 0.0, 'height': 3.0}, {'elevation': 3.0, 'height': 3.0}]
+    assert floor_of(0.0, floors) == 0
+    assert floor_of(2.9, floors) == 1  # Within the tolerance below the upper floor
+    assert floor_of(-1.0, floors) is None and floor_of(7.0, floors) is None
+
+
+def test_footprints_cover_the_cells_whose_centre_they_contain():
+    verts, faces = rectangle(1.0, 1.0, 3.0, 2.0)
+    rows, cols = rasterize_footprint(verts, faces, (10, 10), BBOX, 0.5)
+    assert sorted(zip(rows.tolist(), cols.tolist())) == [(x, y) for x in range(2, 6) for y in range(2, 4)]
+    # Vertical faces and geometry outside the grid cover nothing
+    wall = [0.0, 0.0, 0.0, 2.0, 0.0, 0.0, 2.0, 0.0, 3.0]
+    assert len(rasterize_footprint(wall, [0, 1, 2], (10, 10), BBOX, 0.5)[0]) == 0
+    assert len(rasterize_footprint(*rectangle(8.0, 8.0, 9.0, 9.0), (10, 10), BBOX, 0.5)[0]) == 0
+
+
+def space(footprint, floor=0, centroid=(2.0, 2.0)):
+    return {'global_id': 'id', 'name': 'Room', 'long_name': None, 'floor': floor, 'centroid': np.array(centroid),
+            'footprint': footprint}
+
+
+def test_rooms_report_their_most_remote_cell_and_its_exit(building):
+    pathfinder = make_pathfinder(building, minimize_cost=False)
+    search_grid = pathfinder.compile_search_grid()
+    field = pathfinder.compile_sparse_graph().distance_field([(6, 1, 0)])
+    cost = field.cost_grid()
+    footprint = rasterize_footprint(*rectangle(0.5, 0.5, 4.0, 4.0), (24, 24), BBOX, 0.5)
+    row = audit_space(space(footprint), cost, field.next_index, search_grid, BBOX, 0.5)
+    assert row['status'] == 'ok' and row['cells'] == row['walkable_cells'] == 49
+    assert row['remote_distance'] == round(float(cost[0][1:8, 1:8].max()), 3)
+    assert (row['centroid_row'], row['centroid_col']) == (3, 3)
+    assert (row['exit_row'], row['exit_col'], row['exit_floor']) == (6, 1, 0)
+
+
+def test_rooms_without_walkable_cells_are_flagged(building):
+    building['grids'][0][9:12, 15:18] = 'wall'
+    building['grids'][0][10, 16] = 'floor'
+    pathfinder = make_pathfinder(building)
+    field = pathfinder.compile_sparse_graph().distance_field([(6, 1, 0)])
+    args = field.cost_grid(), field.next_index, pathfinder.compile_search_grid(), BBOX, 0.5
+    sealed = (np.array([10]), np.array([16]))
+    assert audit_space(space(sealed), *args)['status'] == 'unreachable'
+    assert audit_space(space(None), *args)['status'] == 'unplaced'
+    assert audit_space(space(sealed, floor=None), *args)['status'] == 'unplaced'
@@ -0,0 +1,50 @@
+import numpy as np
+
+from benchmarks.differential import make_pathfinder
+from distance_field import DistanceField
+from evacuation import group_ranks
+from exits import find_exits
+
+
+def test_group_ranks_count_within_each_group():
+    assert group_ranks(np.array([3, 1, 3, 3, 1])).tolist() == [0, 0, 1, 2, 1]
+
+
+def test_every_agent_leaves_through_an_exit(office):
+    pathfinder = make_pathfinder(office)
+    pathfinder.goals = []
+    result = pathfinder.run_evacuation(count=60, seed=1)
+    assert (result['evacuated'], result['unreachable'], result['stuck']) == (60, 0, 0)
+    assert result['total_time'] == result['egress_times'].max() > 0
+    assert pathfinder.nodes_expanded > 0
+    assert result['max_density'].shape == result['mean_density'].shape
+    assert result['max_density'].max() > 0
+
+
+def test_agents_are_not_faster_than_their_free_walk(office):
+    pathfinder = make_pathfinder(office)
+    agents = [(6, 10, 0), (20, 30, 1)]
+    result = pathfinder.run_evacuation(agents)
+    field = DistanceField(pathfinder.compile_search_grid(), find_exits(office['grids']))
+    for agent, egress in zip(agents, result['egress_times']):
+        steps = len(field.path_from(agent)) - 1
+        assert egress >= steps * pathfinder.grid_size / 1.2 - 1e-9
+
+
+def test_narrow_doors_slow_the_crowd_down(office):
+    pathfinder = make_pathfinder(office)
+    agents = [(x, y, 0) for x, y in np.argwhere(pathfinder.buffered_grids[0] == 'floor')[:120].tolist()]
+    fast = pathfinder.run_evacuation(agents, door_flow=1.3)
+    slow = pathfinder.run_evacuation(agents, door_flow=0.2)
+    assert fast['evacuated'] == slow['evacuated'] == len(agents)
+    assert slow['total_time'] > fast['total_time']
+
+
+def test_sealed_agents_are_unreachable(building):
+    building['grids'][0][9:12, 15:18] = 'wall'
+    building['grids'][0][10, 16] = 'floor'
+    pathfinder = make_pathfinder(building)
+    pathfinder.goals = [(6, 1, 0)]
+    result = pathfinder.run_evacuation([(10, 16, 0), (2, 4, 0)])
+    assert (result['evacuated'], result['unreachable']) == (1, 1)
+    assert np.isinf(result['egress_times'][0])
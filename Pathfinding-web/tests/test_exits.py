@@ -0,0 +1,39 @@
+import numpy as np
+
+from benchmarks.differential import make_pathfinder
+from exits import exterior_mask, find_exits
+
+
+def two_rooms():
+    """Two rooms inside a walled outline on an empty plot, with a door between them and one to the outside."""
+    floor = np.full((10, 12), 'empty', dtype=object)
+    floor[1:9, 1:11] = 'wall'
+    floor[2:8, 2:10] = 'floor'
+    floor[2:8, 6] = 'wall'
+    floor[4:6, 6] = 'door'
+    floor[1, 3:5] = 'door'
+    return floor
+
+
+def test_only_doors_to_the_outside_are_exits():
+    floor = two_rooms()
+    assert find_exits([floor]) == [(1, 3, 0)]
+    outside = exterior_mask(floor)
+    assert outside[0, 0] and outside[9, 11] and not outside[3, 3]
+
+
+def test_a_courtyard_open_to_the_outside_is_exterior():
+    floor = two_rooms()
+    floor[1, 3:5] = 'wall'
+    floor[2:8, 7:10] = 'empty'  # The right room loses its roof and outer wall
+    floor[2:8, 10] = 'empty'
+    assert exterior_mask(floor)[5, 8]
+    assert find_exits([floor, two_rooms()]) == [(1, 3, 1), (4, 6, 0)]
+
+
+def test_identify_exits_adds_every_exit_as_a_goal(office):
+    pathfinder = make_pathfinder(office)
+    pathfinder.goals = []
+    pathfinder.identify_exits(None)
+    pathfinder.identify_exits(None)
+    assert pathfinder.goals == find_exits(office['grids']) and len(pathfinder.goals) == 2
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from grid_codec import InvalidGridPayload, decode_grids, encode_grids
+
+
+def test_codes_are_read_with_the_payload_element_types(building):
+    payload = encode_grids(building['grids'])
+    # The same payload from an encoder that numbers 'wall' 0 and 'empty' 1
+    payload['element_types'] = ['wall', 'empty'] + payload['element_types'][2:]
+    for grid, decoded in zip(building['grids'], decode_grids(payload)):
+        swapped = np.where(grid == 'wall', 'empty', np.where(grid == 'empty', 'wall', grid))
+        assert (decoded == swapped).all()
+
+
+@pytest.mark.parametrize('change', [
+    {'element_types': ['empty', 'wall', 'portal']},
+    {'encoding': 'png'},
+    {'floors': None},
+])
+def test_malformed_payloads_are_rejected(building, change):
+    with pytest.raises(InvalidGridPayload):
+        decode_grids({**encode_grids(building['grids']), **change})
+
+
+@pytest.mark.parametrize('change', [{'values': 'not base64!'}, {'lengths': 'AAAA'}, {'shape': [3]}])
+def test_malformed_floors_are_a_bad_request(client, building, change):
+    payload = encode_grids(building['grids'])
+    payload['floors'][0] = {**payload['floors'][0], **change}
+    response = client.post('/sessions', json={'grids': payload, 'grid_size': building['grid_size'],
+                                              'floors': building['floors'], 'bbox': building['bbox']})
+    assert response.status_code == 400
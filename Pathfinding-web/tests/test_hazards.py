@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from benchmarks.differential import DifferentialChecker, make_pathfinder, random_queries
+
+
+@pytest.mark.parametrize('allow_diagonal', [True, False])
+@pytest.mark.parametrize('minimize_cost', [True, False])
+def test_routes_without_a_fire_are_optimal(office, minimize_cost, allow_diagonal):
+    checker = DifferentialChecker(office, minimize_cost=minimize_cost, allow_diagonal=allow_diagonal)
+    queries = random_queries(checker.pathfinder, count=10, max_goals=3, seed=13)
+    assert checker.check('Hazard', queries) == []
+
+
+def test_routes_keep_out_of_untenable_cells(building):
+    pathfinder = make_pathfinder(building)
+    pathfinder.start, pathfinder.goals = (12, 2, 0), [(12, 21, 0)]
+    shortest = pathfinder.run_distance_field()
+    length = pathfinder.pathlength
+    levels = np.zeros((1, 2, 24, 24))
+    levels[0, 0, 8:16, 10:13] = 1.0  # A fire across the straight line
+    pathfinder.set_hazard(levels=levels)
+    path = pathfinder.run_hazard_route()
+    assert path[0] == shortest[0] and path[-1] == shortest[-1]
+    assert not any(levels[0, z, x, y] for x, y, z in path)
+    assert pathfinder.pathlength > length
+
+
+def test_the_rest_of_a_route_is_reused_while_it_stays_good(building):
+    pathfinder = make_pathfinder(building)
+    pathfinder.start, pathfinder.goals = (12, 2, 0), [(12, 21, 0)]
+    pathfinder.set_hazard(ignitions=[(2, 20, 0)])
+    path = pathfinder.run_hazard_route()
+    router = pathfinder.hazard_router
+    pathfinder.start = path[3]
+    assert pathfinder.run_hazard_route(start_time=pathfinder.hazard_times[3]) == path[3:]
+    assert (router.searches, router.reuses) == (1, 1)
+    # A fire on the rest of the route needs a new search
+    pathfinder.set_hazard(ignitions=[path[-3]])
+    pathfinder.run_hazard_route(start_time=1.0)
+    assert router.searches == 2
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from benchmarks.differential import make_pathfinder
+from heuristics import HeuristicMapCache
+
+
+@pytest.mark.parametrize('heuristic_style', ['min', 'sum', 'alt'])
+def test_maps_hold_the_heuristic_of_every_cell(building, heuristic_style):
+    pathfinder = make_pathfinder(building, wall_buffer=0.5)
+    pathfinder.heuristic_style = heuristic_style
+    pathfinder.goals = [(20, 20, 1), (6, 1, 0)]
+    for floor in range(2):
+        values = pathfinder.heuristic_map(floor)
+        walls = building['grids'][floor] == 'wall'
+        assert np.isnan(values[walls]).all()
+        for x, y in np.argwhere(~walls)[::7].tolist():
+            assert values[x, y] == pathfinder.heuristic((x, y, floor), None)
+
+
+def test_maps_are_cached_per_goal_set_and_grid(building):
+    pathfinder = make_pathfinder(building)
+    cache = HeuristicMapCache(maxsize=4)
+    pathfinder.goals = [(20, 20, 1), (6, 1, 0)]
+    first = pathfinder.heuristic_map(0, cache)
+    pathfinder.goals = [(6, 1, 0), (20, 20, 1)]
+    assert pathfinder.heuristic_map(0, cache) is first  # The goal order does not matter
+    pathfinder.buffered_grids[0][2, 2] = 'wall'
+    pathfinder.search_grid = None
+    assert pathfinder.heuristic_map(0, cache) is not first
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_heuristic_map_endpoint_leaves_out_walls(client, session_id):
+    response = client.post('/heuristic-map', json={'session_id': session_id, 'floor': 1, 'goals': [[20, 20, 1]]})
+    result = response.get_json()
+    assert result['floor'] == 1
+    assert result['values'][0][0] is None and result['values'][20][20] == 0.0
+    assert result['min'] == 0.0 and result['max'] > 0
+    assert client.post('/heuristic-map', json={'session_id': session_id, 'floor': 5, 'goals': [[20, 20, 1]]}) \
+        .status_code == 400
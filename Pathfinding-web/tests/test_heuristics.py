@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from benchmarks.differential import make_pathfinder
+from heuristics import GoalHeuristic
+
+
+def per_goal_heuristic(pathfinder, a):
+    """The heuristic as a loop over the goals, one nearest stair search per goal on another floor."""
+    values = []
+    for b in pathfinder.goals:
+        dx, dy, dz = abs(b[0] - a[0]), abs(b[1] - a[1]), abs(b[2] - a[2])
+        if pathfinder.minimize_cost:
+            h = np.sqrt(dx ** 2 + dy ** 2) * pathfinder.grid_size
+            if dz > 0:
+                stair = pathfinder.find_nearest_stairs(a, b)
+                if stair:
+                    h += (np.sqrt((stair[0] - a[0]) ** 2 + (stair[1] - a[1]) ** 2) +
+                          np.sqrt((b[0] - stair[0]) ** 2 + (b[1] - stair[1]) ** 2)) * pathfinder.grid_size
+                    h += dz * 3 * pathfinder.grid_size
+                else:
+                    h = float('inf')
+        else:
+            h = np.sqrt(dx ** 2 + dy ** 2 + (dz * 3) ** 2) * pathfinder.grid_size
+        if pathfinder.buffered_grids[a[2]][a[0], a[1]] == 'walla':
+            h += 10 * pathfinder.grid_size
+        values.append(h)
+    return sum(values) if pathfinder.heuristic_style == 'sum' else min(values)
+
+
+@pytest.mark.parametrize('heuristic_style', ['min', 'sum'])
+@pytest.mark.parametrize('minimize_cost', [True, False])
+def test_batches_match_the_per_goal_loop(building, minimize_cost, heuristic_style):
+    pathfinder = make_pathfinder(building, wall_buffer=0.5, minimize_cost=minimize_cost)
+    pathfinder.heuristic_style = heuristic_style
+    pathfinder.goals = [(20, 20, 1), (6, 1, 0), (3, 22, 1)]
+    heuristic = GoalHeuristic(pathfinder.grids, pathfinder.buffered_grids, pathfinder.goals, pathfinder.grid_size,
+                              minimize_cost, heuristic_style)
+    positions = [(x, y, z) for z in range(2) for x in range(0, 24, 3) for y in range(0, 24, 2)]
+    expected = [per_goal_heuristic(pathfinder, position) for position in positions]
+    assert heuristic.evaluate(positions).tolist() == expected
+    assert [heuristic(position) for position in positions[:10]] == expected[:10]
+    assert heuristic.heuristic_calls == len(positions) + 10
+
+
+def test_floors_without_a_shared_stair_are_unreachable(building):
+    building['grids'][1][18:20, 3:5] = 'floor'
+    pathfinder = make_pathfinder(building)
+    heuristic = GoalHeuristic(pathfinder.grids, pathfinder.buffered_grids, [(20, 20, 1), (6, 1, 0)], 0.5)
+    values = heuristic.evaluate_per_goal(np.array([[2, 4, 0], [2, 4, 1]]))
+    assert np.isinf(values[0, 0]) and np.isinf(values[1, 1])
+    assert np.isfinite(values[0, 1]) and np.isfinite(values[1, 0])
@@ -0,0 +1,46 @@
+import pytest
+
+from benchmarks.differential import DifferentialChecker, random_queries
+from hierarchical import HierarchicalGraph
+
+
+@pytest.mark.parametrize('allow_diagonal', [True, False])
+@pytest.mark.parametrize('minimize_cost', [True, False])
+def test_hierarchical_paths_are_exact(office, minimize_cost, allow_diagonal):
+    checker = DifferentialChecker(office, minimize_cost=minimize_cost, allow_diagonal=allow_diagonal)
+    queries = random_queries(checker.pathfinder, count=20, max_goals=3, seed=8)
+    assert checker.check('HPA*', queries) == []
+
+
+def test_an_edit_rebuilds_only_the_regions_it_touches(office):
+    checker = DifferentialChecker(office)
+    pathfinder = checker.pathfinder
+    hierarchy = HierarchicalGraph(pathfinder.compile_search_grid())
+    regions = hierarchy.rebuilt_regions
+    # A pillar in the middle of a room
+    floor = pathfinder.buffered_grids[0]
+    x, y = next((x, y) for x, y in zip(*(floor == 'floor').nonzero()) if (floor[x - 1:x + 2, y - 1:y + 2] == 'floor').all())
+    floor[x, y] = 'wall'
+    pathfinder.search_grid = None
+    search_grid = pathfinder.compile_search_grid()
+    assert 0 < hierarchy.update(search_grid) < regions
+
+    fresh = HierarchicalGraph(search_grid)
+    for start, goals in random_queries(pathfinder, count=10, max_goals=2, seed=9):
+        updated_path, updated_cost = hierarchy.search(start, goals)
+        fresh_path, fresh_cost = fresh.search(start, goals)
+        assert (updated_path is None) == (fresh_path is None)
+        if fresh_path is not None:
+            assert updated_cost == pytest.approx(fresh_cost)
+
+
+def test_another_cost_profile_rebuilds_the_hierarchy(office):
+    checker = DifferentialChecker(office)
+    pathfinder = checker.pathfinder
+    hierarchy = HierarchicalGraph(pathfinder.compile_search_grid())
+    pathfinder.minimize_cost = False
+    search_grid = pathfinder.compile_search_grid()
+    hierarchy.update(search_grid)
+    assert hierarchy.search_grid is search_grid
+    for start, goals in random_queries(pathfinder, count=5, seed=10):
+        assert hierarchy.search(start, goals)[1] == pytest.approx(checker.reference_cost(start, goals))
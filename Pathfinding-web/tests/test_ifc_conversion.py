@@ -0,0 +1,26 @@
+import numpy as np
+
+from benchmarks.ifc_conversion import STAGES, benchmark_model, convert
+from benchmarks.ifc_models import model_scales, write_synthetic_ifc
+
+
+def test_scales_have_a_wall_per_storey():
+    assert model_scales(walls=(1, 10), storeys=(1, 5)) == [(1, 1), (10, 1), (10, 5)]
+
+
+def test_synthetic_models_convert_to_walls_doors_and_stairs(tmp_path):
+    filename = write_synthetic_ifc(str(tmp_path / 'model.ifc'), walls=8, storeys=2)
+    stages, grids, elements = convert(filename, 0.25)
+    assert list(stages) == STAGES and all(stage['time'] >= 0 for stage in stages.values())
+    assert len(grids) == 2 and elements > 8
+    for grid in grids:
+        assert {'wall', 'door', 'stair'} <= set(np.unique(grid).tolist())
+
+
+def test_reports_keep_every_run(tmp_path):
+    filename = write_synthetic_ifc(str(tmp_path / 'model.ifc'), walls=4, storeys=1)
+    report = benchmark_model(filename, 0.5, repeat=2)
+    assert len(report['timings']['total']['runs']) == 2
+    assert report['timings']['total']['min'] <= report['timings']['total']['median']
+    assert report['floors'] == 1 and report['cells'] > 0
+    assert set(report['memory']) == set(STAGES)
@@ -0,0 +1,44 @@
+import pytest
+
+from benchmarks.differential import DifferentialChecker, make_pathfinder, random_queries
+from incremental import DStarLite
+
+
+@pytest.mark.parametrize('allow_diagonal', [True, False])
+@pytest.mark.parametrize('minimize_cost', [True, False])
+def test_dstar_lite_finds_optimal_paths(office, minimize_cost, allow_diagonal):
+    checker = DifferentialChecker(office, minimize_cost=minimize_cost, allow_diagonal=allow_diagonal)
+    queries = random_queries(checker.pathfinder, count=20, max_goals=3, seed=8)
+    # The same goals from other starts reuse the search of the query before
+    queries += [(start, queries[0][1]) for start, _ in random_queries(checker.pathfinder, count=10, seed=9)]
+    assert checker.check('D* Lite', queries) == []
+
+
+def test_repaired_searches_match_fresh_fields_after_edits(building):
+    checker = DifferentialChecker(building)
+    pathfinder = checker.pathfinder
+    pathfinder.start, pathfinder.goals = (2, 4, 0), [(20, 20, 1)]
+    pathfinder.run_incremental()
+    planner = pathfinder.incremental
+    for x, y, z in [(12, 10, 1), (13, 10, 1), (14, 10, 1), (6, 6, 0)]:
+        pathfinder.buffered_grids[z][x, y] = 'wall'
+        pathfinder.search_grid = None
+        checker.reference.clear()
+        pathfinder.start = (2, 4 + x % 3, 0)
+        assert checker.check(lambda p: p.run_incremental(planner), [(pathfinder.start, pathfinder.goals)]) == []
+        assert planner.changed_cells == 1
+        repaired = planner.nodes_expanded
+        fresh = DStarLite(pathfinder.compile_search_grid())
+        fresh.search(pathfinder.start, pathfinder.goals)
+        assert repaired < fresh.nodes_expanded
+
+
+def test_other_cost_options_start_over(building):
+    pathfinder = make_pathfinder(building)
+    pathfinder.start, pathfinder.goals = (2, 4, 0), [(20, 20, 1)]
+    pathfinder.run_incremental()
+    planner = pathfinder.incremental
+    pathfinder.allow_diagonal = False
+    pathfinder.run_incremental(planner)
+    assert planner.changed_cells is None
+    assert pathfinder.incremental is planner and planner.search_grid is pathfinder.compile_search_grid()
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from benchmarks.differential import DifferentialChecker, make_pathfinder, random_queries
+
+
+@pytest.mark.parametrize('allow_diagonal', [True, False])
+@pytest.mark.parametrize('minimize_cost', [True, False])
+def test_jps_finds_optimal_paths_with_a_consistent_heuristic(office, minimize_cost, allow_diagonal):
+    checker = DifferentialChecker(office, minimize_cost=minimize_cost, allow_diagonal=allow_diagonal)
+    # JPS takes the heuristic of run_astar; only 'alt' never overestimates near doors and stairs
+    checker.pathfinder.heuristic_style = 'alt'
+    queries = random_queries(checker.pathfinder, count=20, max_goals=3, seed=7)
+    assert checker.check('JPS', queries) == []
+
+
+def test_jps_jumps_over_open_floor(office):
+    hall = np.full((60, 60), 'floor', dtype=object)
+    hall[0, :] = hall[-1, :] = hall[:, 0] = hall[:, -1] = 'wall'
+    hall[20:40, 30] = 'wall'
+    building = {**office, 'grids': [hall], 'floors': office['floors'][:1]}
+    pathfinder = make_pathfinder(building)
+    pathfinder.start, pathfinder.goals = (30, 5, 0), [(30, 55, 0)]
+    pathfinder.run_astar()
+    astar_cost, astar_expanded = pathfinder.pathlength, pathfinder.nodes_expanded
+    path = pathfinder.run_jps()
+    assert pathfinder.pathlength == pytest.approx(astar_cost)
+    assert path[0] == (30, 5, 0) and path[-1] == (30, 55, 0)
+    assert pathfinder.nodes_expanded * 5 < astar_expanded
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from benchmarks.differential import DifferentialChecker, random_queries
+from landmarks import LandmarkCache, Landmarks
+from sparse_graph import SparseGraph
+
+
+@pytest.mark.parametrize('allow_diagonal', [True, False])
+@pytest.mark.parametrize('minimize_cost', [True, False])
+def test_astar_with_alt_finds_optimal_paths(office, minimize_cost, allow_diagonal):
+    checker = DifferentialChecker(office, minimize_cost=minimize_cost, allow_diagonal=allow_diagonal)
+    checker.pathfinder.heuristic_style = 'alt'
+    queries = random_queries(checker.pathfinder, count=40, max_goals=3, seed=3)
+    assert checker.check('A*', queries) == []
+
+
+def test_bounds_never_overestimate(office):
+    checker = DifferentialChecker(office)
+    search_grid = checker.pathfinder.compile_search_grid()
+    landmarks = Landmarks(search_grid, office['grids'], count=6)
+    cells = np.flatnonzero(search_grid.passable)
+    graph = SparseGraph(search_grid)
+    for target in cells[::97]:
+        to_target, _ = graph.dijkstra([search_grid.position(int(target))], reverse=True)
+        assert (landmarks.bounds(cells, int(target)) <= to_target[cells] + 1e-9).all()
+        from_target, _ = graph.dijkstra([search_grid.position(int(target))])
+        assert (landmarks.bounds_from(int(target), cells) <= from_target[cells] + 1e-9).all()
+
+
+def test_landmarks_are_rebuilt_for_an_edited_grid(building):
+    checker = DifferentialChecker(building)
+    pathfinder = checker.pathfinder
+    cache = LandmarkCache()
+    first = cache.get(pathfinder.compile_search_grid(), count=4)
+    assert cache.get(pathfinder.compile_search_grid(), count=4) is first
+    pathfinder.buffered_grids[1][5, 5] = 'wall'
+    pathfinder.search_grid = None
+    assert cache.get(pathfinder.compile_search_grid(), count=4) is not first
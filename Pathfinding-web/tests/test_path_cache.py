@@ -0,0 +1,61 @@
+from path_cache import PathResultCache
+
+
+def cache_key(version, heuristic_style):
+    return PathResultCache.key(version, (2, 4, 0), [(2, 20, 0)], 0.5, True, True, 0, heuristic_style)
+
+
+def test_edit_away_from_footprint_keeps_entry():
+    cache = PathResultCache()
+    cache.put(cache_key(0, 'min'), {'length': 1.0}, explored=[(2, 4, 0), (2, 5, 0)])
+    assert cache.invalidate(0, 1, [(20, 20, 0)]) == 0
+    assert cache.get(cache_key(1, 'min')) == {'length': 1.0}
+
+
+def test_edit_next_to_footprint_drops_entry():
+    cache = PathResultCache()
+    cache.put(cache_key(0, 'min'), {'length': 1.0}, explored=[(2, 4, 0), (2, 5, 0)])
+    assert cache.invalidate(0, 1, [(3, 6, 0)]) == 1
+    assert cache.get(cache_key(1, 'min')) is None
+
+
+def test_alt_entries_are_dropped_on_every_edit():
+    # Landmark bounds depend on the whole grid, an edit far from the footprint can change the path
+    cache = PathResultCache()
+    cache.put(cache_key(0, 'alt'), {'length': 1.0}, explored=[(2, 4, 0), (2, 5, 0)])
+    assert cache.invalidate(0, 1, [(20, 20, 0)]) == 1
+    assert cache.get(cache_key(1, 'alt')) is None
+
+
+def test_goal_order_does_not_change_the_key():
+    assert PathResultCache.key(0, (2, 4, 0), [(2, 20, 0), (6, 1, 0)], 0.5, True, True, 0, 'min') == \
+        PathResultCache.key(0, [2, 4, 0], [(6, 1, 0), (2, 20, 0), (6, 1, 0)], 0.5, True, True, 0, 'min')
+
+
+def test_edits_reach_footprints_through_the_wall_buffer_and_stairs():
+    explored = [(2, 4, 0), (2, 5, 0)]
+    for cells, wall_buffer, dropped in [([(2, 8, 0)], 0.0, False), ([(2, 8, 0)], 1.0, True), ([(3, 6, 0)], 0.0, True),
+                                        ([(2, 5, 1)], 0.0, True), ([(9, 5, 1)], 0.0, False)]:
+        cache = PathResultCache()
+        key = PathResultCache.key(0, (2, 4, 0), [(2, 20, 0)], 0.5, True, True, wall_buffer, 'min')
+        cache.put(key, {'length': 1.0}, explored=explored)
+        assert cache.invalidate(0, 1, cells) == dropped
+
+
+def test_entries_without_footprint_or_after_stair_edits_are_dropped():
+    cache = PathResultCache()
+    cache.put(cache_key(0, 'min'), {'length': 1.0})
+    cache.put(PathResultCache.key(0, (3, 4, 0), [(2, 20, 0)], 0.5, True, True, 0, 'min'), {'length': 2.0},
+              explored=[(3, 4, 0)])
+    assert cache.invalidate(0, 1, [(20, 20, 0)], stairs_changed=True) == 2
+    assert not cache.entries
+
+
+def test_least_recently_used_entries_go_first():
+    cache = PathResultCache(maxsize=2)
+    for version in range(3):
+        cache.put(cache_key(version, 'min'), {'length': version})
+        cache.get(cache_key(0, 'min'))  # Keeps the first entry in use
+    assert cache.get(cache_key(0, 'min')) == {'length': 0}
+    assert cache.get(cache_key(1, 'min')) is None
+    assert cache.get(cache_key(2, 'min')) == {'length': 2}
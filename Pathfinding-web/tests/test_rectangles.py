@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from benchmarks.differential import DifferentialChecker, make_pathfinder, random_queries
+from rectangles import RectangleGraph, RectangleGraphCache
+
+
+@pytest.mark.parametrize('allow_diagonal', [True, False])
+@pytest.mark.parametrize('minimize_cost', [True, False])
+def test_rectangle_paths_are_exact(office, minimize_cost, allow_diagonal):
+    checker = DifferentialChecker(office, minimize_cost=minimize_cost, allow_diagonal=allow_diagonal)
+    queries = random_queries(checker.pathfinder, count=20, max_goals=3, seed=11)
+    assert checker.check('Rectangles', queries) == []
+
+
+def test_rectangles_cover_the_walkable_cells_once(office):
+    search_grid = make_pathfinder(office).compile_search_grid()
+    graph = RectangleGraph(search_grid)
+    assert np.array_equal(graph.rect_of >= 0, search_grid.passable)
+    codes = search_grid.flat_codes.reshape(search_grid.padded_shape)
+    covered = np.zeros(search_grid.padded_shape, dtype=int)
+    for z, x0, y0, x1, y1 in graph.rectangles:
+        assert (codes[z, x0:x1, y0:y1] == codes[z, x0, y0]).all()
+        covered[z, x0:x1, y0:y1] += 1
+    assert np.array_equal(covered.ravel() == 1, search_grid.passable)
+    # Only the border cells are searched
+    assert graph.node_count * 4 < search_grid.passable.sum()
+
+
+def test_cache_shares_decompositions_per_version_and_profile(office):
+    pathfinder = make_pathfinder(office)
+    cache = RectangleGraphCache(maxsize=2)
+    graph = cache.get(pathfinder.compile_search_grid())
+    assert cache.get(pathfinder.compile_search_grid()) is graph
+    pathfinder.allow_diagonal = False
+    assert cache.get(pathfinder.compile_search_grid()) is not graph
+    assert (cache.hits, cache.misses) == (1, 2)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+app = pytest.importorskip('app')
+
+
+def post_find_path(client, building, algorithm, grids):
+    query = {**building, 'grids': [grid.tolist() for grid in grids], 'start': [2, 4, 0], 'goals': [[2, 20, 0]],
+             'algorithm': algorithm}
+    response = client.post('/find-path', json=query)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+@pytest.mark.parametrize('algorithm, states', [('HPA*', app.hierarchies), ('D* Lite', app.incremental_planners)])
+def test_search_states_are_bounded(client, building, algorithm, states):
+    states.clear()
+    app.path_results.clear()
+    for extra in range(app.MAX_SEARCH_STATES + 3):
+        # Every grid shape gets its own search state
+        grids = [np.pad(grid, ((0, extra), (0, 0)), constant_values='wall') for grid in building['grids']]
+        post_find_path(client, building, algorithm, grids)
+    assert len(states) == app.MAX_SEARCH_STATES
+    # The most recent shape is kept, the first one was dropped
+    assert (2, (24 + app.MAX_SEARCH_STATES + 2, 24), 'cost', True) in states
+    assert (2, (24, 24), 'cost', True) not in states
+
+
+def test_a_kept_hierarchy_is_reused_after_an_edit(client, building):
+    app.hierarchies.clear()
+    app.path_results.clear()  # A cached result would skip the search
+    before = post_find_path(client, building, 'HPA*', building['grids'])
+    hierarchy = app.hierarchies[(2, (24, 24), 'cost', True)]
+    grids = [grid.copy() for grid in building['grids']]
+    grids[0][20, 6] = 'wall'
+    after = post_find_path(client, building, 'HPA*', grids)
+    assert app.hierarchies[(2, (24, 24), 'cost', True)] is hierarchy
+    assert after['length'] == pytest.approx(before['length'])
@@ -0,0 +1,40 @@
+from benchmarks.differential import make_pathfinder
+from search_stats import COUNTERS, SearchStats, StatsAggregator
+
+
+def test_queries_add_up_in_the_pathfinder_stats(building):
+    pathfinder = make_pathfinder(building)
+    pathfinder.start, pathfinder.goals = (2, 4, 0), [(20, 20, 1)]
+    stats = pathfinder.reset_stats()
+    pathfinder.run_astar()
+    first = pathfinder.nodes_expanded
+    assert stats.counters['nodes_expanded'] == first > 0
+    assert stats.counters['nodes_pushed'] >= first and stats.counters['heuristic_calls'] > 0
+    assert stats.phases['search'] > 0
+    pathfinder.run_astar()
+    assert stats.counters['nodes_expanded'] == 2 * first
+    assert pathfinder.reset_stats().counters['nodes_expanded'] == 0
+
+
+def test_aggregates_keep_sums_and_maxima():
+    aggregator = StatsAggregator()
+    for expanded, open_size in [(10, 4), (30, 2)]:
+        stats = SearchStats()
+        stats.counters.update(nodes_expanded=expanded, max_open_size=open_size)
+        aggregator.record('A*', stats)
+    totals = aggregator.snapshot()['A*']
+    assert totals['queries'] == 2
+    assert (totals['nodes_expanded'], totals['max_open_size']) == (40, 4)
+    aggregator.clear()
+    assert aggregator.snapshot() == {}
+
+
+def test_find_path_reports_stats_on_request(client, session_id):
+    assert client.delete('/stats').status_code == 200
+    query = {'session_id': session_id, 'start': [2, 4, 0], 'goals': [[20, 20, 1]], 'algorithm': 'JPS'}
+    result = client.post('/find-path', json={**query, 'stats': True}).get_json()
+    assert set(COUNTERS) <= set(result['stats']) and not result['stats']['cached']
+    assert result['stats']['nodes_expanded'] > 0
+    totals = client.get('/stats').get_json()['algorithms']['JPS']
+    assert totals['queries'] == 1 and totals['nodes_expanded'] == result['stats']['nodes_expanded']
+    assert 'stats' not in client.post('/find-path', json=query).get_json()
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from pathfinder import InteractiveBIMPathfinder
+
+
+def find_path(client, session_id, **query):
+    query = {'session_id': session_id, 'start': [2, 4, 1], 'goals': [[2, 20, 1]], 'stats': True, **query}
+    response = client.post('/find-path', json=query)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def edit(client, session_id, *edits):
+    response = client.post(f'/sessions/{session_id}/edits', json={'edits': list(edits)})
+    assert response.status_code == 200
+
+
+def test_alt_result_is_recomputed_after_an_edit_far_from_its_search(client, session_id):
+    before = find_path(client, session_id, heuristic_style='alt')
+    assert not before['stats']['cached']
+    # Open the dividing wall next to the start, away from the detour the search explored
+    edit(client, session_id, {'floor': 1, 'row': 1, 'col': 12, 'element_type': 'floor'})
+    after = find_path(client, session_id, heuristic_style='alt')
+    exact = find_path(client, session_id, algorithm='Distance Field')
+    assert not after['stats']['cached']
+    assert after['length'] < before['length']
+    assert abs(after['length'] - exact['length']) < 1e-6
+
+
+def test_heuristic_map_follows_session_edits(client, session_id, building):
+    query = {'goals': [[2, 20, 1]], 'floor': 0}
+    assert client.post('/heuristic-map', json={'session_id': session_id, **query}).status_code == 200
+    # Move the stairwell next to the goal and wall in the goal side of the lower floor
+    edits = [{'floor': floor, 'row': row, 'col': col, 'element_type': element_type}
+             for floor in (0, 1) for row in (18, 19)
+             for col, element_type in ((3, 'floor'), (4, 'floor'), (18, 'stair'), (19, 'stair'))]
+    edits += [{'floor': 0, 'row': row, 'col': 12, 'element_type': 'wall'} for row in range(1, 23)]
+    edit(client, session_id, *edits)
+
+    grids = building['grids']
+    for change in edits:
+        grids[change['floor']][change['row'], change['col']] = change['element_type']
+    session = client.post('/heuristic-map', json={'session_id': session_id, **query}).get_json()['values']
+    # Built apart from the app, so a stale map in the shared overlay cache cannot hide the difference
+    fresh = InteractiveBIMPathfinder(grids, building['grid_size'], building['floors'], building['bbox'])
+    fresh.goals = [(2, 20, 1)]
+    values = fresh.heuristic_map(0)
+    assert session == [[round(float(v), 3) if np.isfinite(v) else None for v in row] for row in values]
+
+
+def test_distance_field_reports_its_own_expansions(client, session_id):
+    astar = find_path(client, session_id)  # Leaves its expansions on the session pathfinder
+    assert astar['nodes_expanded'] > 0
+    query = {'goals': [[20, 20, 1]], 'algorithm': 'Distance Field'}
+    computed = find_path(client, session_id, start=[2, 4, 0], **query)
+    assert computed['nodes_expanded'] > 0 and computed['nodes_expanded'] != astar['nodes_expanded']
+    # Another start on the same goals reuses the cached field, which costs no expansions
+    cached = find_path(client, session_id, start=[3, 4, 0], **query)
+    assert cached['nodes_expanded'] == 0
+
+
+def test_unsupported_algorithms_are_rejected(client, session_id):
+    query = {'session_id': session_id, 'start': [2, 4, 1], 'goals': [[2, 20, 1]]}
+    for algorithm in ('bogus', 'Hazard', 'Tour'):
+        response = client.post('/find-path', json={**query, 'algorithm': algorithm})
+        assert response.status_code == 400
+    # Nothing was cached under the rejected names, so A* still searches
+    assert not find_path(client, session_id, algorithm='A*')['stats']['cached']
+
+
+@pytest.mark.parametrize('cells', [{'agents': [[2, 4, 1], [2, 24, 1]]}, {'agents': [[2, 4, 2]]},
+                                   {'agents': [[2, 4, 1]], 'exits': [[-1, 6, 0]]}])
+def test_evacuation_rejects_cells_outside_the_grid(client, session_id, cells):
+    response = client.post('/evacuate', json={'session_id': session_id, 'exits': [[6, 0, 0]], **cells})
+    assert response.status_code == 400
+
+
+def test_a_query_without_path_reports_no_length(client, session_id):
+    assert find_path(client, session_id)['length'] is not None
+    # The only way up is the stair, which a wheelchair cannot take
+    result = find_path(client, session_id, start=[2, 4, 0], cost_profile='wheelchair')
+    assert result['path'] is None and result['length'] is None
+
+
+@pytest.mark.parametrize('queries', [
+    [{}, {'minimize_cost': False}, {'allow_diagonal': False}],
+    [{'cost_profile': 'wheelchair'}, {}],
+])
+def test_hierarchy_follows_the_cost_options(client, session_id, queries):
+    for query in queries:
+        query = {'start': [2, 4, 0], 'goals': [[20, 20, 1]], **query}
+        exact = find_path(client, session_id, algorithm='Distance Field', **query)
+        routed = find_path(client, session_id, algorithm='HPA*', **query)
+        assert routed['length'] == pytest.approx(exact['length'])
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from benchmarks.differential import make_pathfinder
+from distance_field import DistanceField
+from sparse_graph import SparseGraph, cache_path
+
+
+@pytest.mark.parametrize('allow_diagonal', [True, False])
+@pytest.mark.parametrize('minimize_cost', [True, False])
+def test_scipy_fields_equal_the_python_fields(office, minimize_cost, allow_diagonal):
+    search_grid = make_pathfinder(office, minimize_cost=minimize_cost, allow_diagonal=allow_diagonal) \
+        .compile_search_grid()
+    goals = [(5, 5, 0), (20, 30, 1)]
+    expected = DistanceField(search_grid, goals).cost
+    actual = SparseGraph(search_grid).distance_field(goals).cost
+    assert np.array_equal(np.isinf(expected), np.isinf(actual))
+    finite = np.isfinite(expected)
+    assert np.allclose(actual[finite], expected[finite])
+
+
+def test_forward_search_runs_along_the_edges(building):
+    search_grid = make_pathfinder(building).compile_search_grid()
+    graph = SparseGraph(search_grid)
+    start, goal = (2, 4, 0), (20, 20, 1)
+    cost, predecessor = graph.dijkstra([start])
+    path, length = graph.path(start, [goal])
+    assert cost[search_grid.index(goal)] == pytest.approx(length)
+    # The predecessors lead back from the goal to the start
+    index, steps = search_grid.index(goal), 0
+    while predecessor[index] != -1:
+        index, steps = int(predecessor[index]), steps + 1
+    assert search_grid.position(index) == start and steps > 0
+
+
+def test_sealed_rooms_are_separate_components(building):
+    graph = SparseGraph(make_pathfinder(building).compile_search_grid())
+    count, labels = graph.connected_components()
+    assert count == 1
+    building['grids'][0][9:12, 15:18] = 'wall'
+    building['grids'][0][10, 16] = 'floor'
+    count, labels = SparseGraph(make_pathfinder(building).compile_search_grid()).connected_components()
+    assert count == 2
+    assert labels[0][10, 16] != labels[0][2, 4]
+    assert labels[0][0, 0] == -1
+
+
+def test_saved_graphs_are_only_loaded_for_the_same_grid(building, tmp_path):
+    pathfinder = make_pathfinder(building)
+    search_grid = pathfinder.compile_search_grid()
+    filename = cache_path(str(tmp_path / 'building.json'), search_grid)
+    SparseGraph(search_grid).save(filename)
+    loaded = SparseGraph.load(filename, search_grid)
+    assert (loaded.matrix != SparseGraph(search_grid).matrix).nnz == 0
+    pathfinder.minimize_cost = False
+    assert SparseGraph.load(filename, pathfinder.compile_search_grid()) is None
+    assert SparseGraph.load(str(tmp_path / 'missing.npz'), search_grid) is None
@@ -0,0 +1,56 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from benchmarks.differential import DifferentialChecker, make_pathfinder, random_queries
+from distance_field import DistanceField
+from tours import nearest_neighbour, or_opt, route_cost, two_opt
+
+
+@pytest.mark.parametrize('closed', [False, True])
+def test_improvements_keep_the_ends_and_never_cost_more(closed):
+    rng = np.random.default_rng(15)
+    for _ in range(20):
+        matrix = rng.uniform(1.0, 10.0, size=(7, 7))  # Not symmetric, like costs of entered cells
+        route = nearest_neighbour(matrix, closed)
+        improved = two_opt(route, matrix)
+        assert route_cost(improved, matrix) <= route_cost(route, matrix) + 1e-9
+        final = or_opt(improved, matrix)
+        assert route_cost(final, matrix) <= route_cost(improved, matrix) + 1e-9
+        assert final[0] == 0 and sorted(final[1:len(final) - closed]) == list(range(1, 7))
+        assert not closed or final[-1] == 0
+        # Never better than the best order
+        best = min(route_cost([0, *order] + [0] * closed, matrix) for order in itertools.permutations(range(1, 7)))
+        assert route_cost(final, matrix) >= best - 1e-9
+
+
+def test_tours_visit_every_goal_along_optimal_legs(office):
+    checker = DifferentialChecker(office)
+    pathfinder = checker.pathfinder
+    (start, _), = random_queries(pathfinder, count=1, seed=16)
+    pathfinder.start = start
+    pathfinder.goals = [goal for _, goals in random_queries(pathfinder, count=3, max_goals=2, seed=17) for goal in goals]
+    path = pathfinder.run_tour(closed=True)
+    tour = pathfinder.tour
+    assert sorted(tour['order']) == list(range(len(pathfinder.goals))) and tour['unreachable'] == []
+    assert path[0] == path[-1] == start
+    assert checker.path_error(path, start, [start], pathfinder.pathlength) is None
+    search_grid = pathfinder.compile_search_grid()
+    for leg in tour['legs']:
+        a = start if leg['from'] is None else pathfinder.goals[leg['from']]
+        b = start if leg['to'] is None else pathfinder.goals[leg['to']]
+        assert leg['length'] == pytest.approx(DistanceField(search_grid, [b]).cost_to_goal(a))
+    assert sum(leg['length'] for leg in tour['legs']) == pytest.approx(pathfinder.pathlength)
+
+
+def test_unreachable_goals_are_left_out(building):
+    building['grids'][0][9:12, 15:18] = 'wall'
+    building['grids'][0][10, 16] = 'floor'
+    pathfinder = make_pathfinder(building)
+    pathfinder.start, pathfinder.goals = (2, 4, 0), [(20, 20, 1), (10, 16, 0), (6, 1, 0)]
+    pathfinder.run_tour()
+    assert pathfinder.tour['unreachable'] == [1] and sorted(pathfinder.tour['order']) == [0, 2]
+    # The fields of the goals are kept, touring them again computes none
+    pathfinder.run_tour()
+    assert pathfinder.nodes_expanded == 0
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from benchmarks.differential import make_pathfinder, random_queries
+from search_grid import SearchGrid
+from waypoints import WaypointCompressor, segment_cells
+
+
+def test_segments_include_both_cells_beside_a_corner():
+    assert segment_cells((0, 0), (2, 2)) == [(0, 0), (1, 0), (0, 1), (1, 1), (2, 1), (1, 2), (2, 2)]
+
+
+def test_a_straight_corridor_is_one_segment():
+    grid = np.full((3, 1002), 'floor', dtype=object)
+    compressor = WaypointCompressor(SearchGrid([grid], 0.5))
+    result = compressor.compress([(1, y, 0) for y in range(1, 1001)])
+    assert result['waypoints'] == [(1, 1, 0), (1, 1000, 0)]
+    assert result['length'] == 999 * 0.5
+
+
+def test_a_corner_is_kept_and_floor_changes_keep_both_stair_cells():
+    ground = np.full((12, 12), 'wall', dtype=object)
+    ground[1, 1:11] = ground[1:11, 10] = 'floor'  # An L-shaped corridor
+    ground[10, 10] = 'stair'
+    upper = np.full((12, 12), 'floor', dtype=object)
+    upper[10, 10] = 'stair'
+    floors = [{'elevation': 0.0}, {'elevation': 3.0}]
+    compressor = WaypointCompressor(SearchGrid([ground, upper], 1.0), floors)
+    path = [(1, y, 0) for y in range(1, 11)] + [(x, 10, 0) for x in range(2, 11)] + \
+        [(10 - k, 10 - k, 1) for k in range(6)]
+    result = compressor.compress(path)
+    assert result['waypoints'] == [(1, 1, 0), (1, 10, 0), (10, 10, 0), (10, 10, 1), (5, 5, 1)]
+    assert [segment['floor'] for segment in result['segments']] == [0, 1]
+    assert result['length'] == pytest.approx(9 + 9 + 3 + 5 * 2 ** 0.5)
+
+
+def test_waypoints_see_each_other(office):
+    pathfinder = make_pathfinder(office)
+    compressor = WaypointCompressor(pathfinder.compile_search_grid(), pathfinder.floors)
+    for start, goals in random_queries(pathfinder, count=10, seed=4):
+        pathfinder.start, pathfinder.goals = start, goals
+        path = pathfinder.run_distance_field()
+        if path is None:
+            continue
+        waypoints = compressor.compress(path)['waypoints']
+        assert waypoints[0] == tuple(path[0]) and waypoints[-1] == tuple(path[-1])
+        for a, b in zip(waypoints, waypoints[1:]):
+            neighbours = max(abs(a[0] - b[0]), abs(a[1] - b[1])) <= 1
+            assert a[2] != b[2] or neighbours or compressor.line_of_sight(a, b)
+
+
+def test_waypoints_are_only_computed_when_asked_for(client, session_id):
+    query = {'session_id': session_id, 'start': [2, 4, 1], 'goals': [[20, 20, 1]]}
+    cells = client.post('/find-path', json=query).get_json()
+    assert cells['path'] and cells['waypoints'] is None
+    # The cached result gets the waypoints of its path
+    compact = client.post('/find-path', json={**query, 'path_format': 'waypoints', 'stats': True}).get_json()
+    assert compact['stats']['cached']
+    assert 'path' not in compact
+    assert compact['waypoints'][0] == [2, 4, 1] and compact['waypoints'][-1] == [20, 20, 1]
+    assert compact['metric_length'] > 0
@@ -0,0 +1,165 @@
+import time
+
+import numpy as np
+
+
+def route_cost(route, matrix):
+    """Cost of visiting the points of route in order; matrix[i, j] is the cost from point i to point j."""
+    return float(sum(matrix[a, b] for a, b in zip(route, route[1:])))
+
+
+def nearest_neighbour(matrix, closed=False):
+    """Route from point 0 that always moves on to the cheapest unvisited point; back to 0 when closed."""
+    route = [0]
+    unvisited = set(range(1, len(matrix)))
+    while unvisited:
+        current = route[-1]
+        following = min(unvisited, key=lambda point: matrix[current, point])
+        route.append(following)
+        unvisited.remove(following)
+    return route + [0] if closed else route
+
+
+def two_opt(route, matrix):
+    """
+    Reverse stretches of the route while that makes it cheaper; the first point (and the last of a
+    closed route) stays in place.
+
+    Costs need not be symmetric (a move costs the cell it enters), so a reversed stretch is priced with
+    prefix sums of the forward and backward costs along the route, each candidate in O(1).
+    """
+    route = list(route)
+    last = len(route) - 1 if route[-1] == route[0] and len(route) > 2 else len(route)
+    improved = True
+    while improved:
+        improved = False
+        steps = list(zip(route, route[1:]))
+        forward = np.concatenate(([0.0], np.cumsum([matrix[a, b] for a, b in steps])))
+        backward = np.concatenate(([0.0], np.cumsum([matrix[b, a] for a, b in steps])))
+        for i in range(1, last - 1):
+            for j in range(i + 1, last):
+                before, after = route[i - 1], route[j + 1] if j + 1 < len(route) else None
+                old = matrix[before, route[i]] + forward[j] - forward[i]
+                new = matrix[before, route[j]] + backward[j] - backward[i]
+                if after is not None:
+                    old += matrix[route[j], after]
+                    new += matrix[route[i], after]
+                if new < old - 1e-9:
+                    route[i:j + 1] = route[i:j + 1][::-1]
+                    improved = True
+                    break
+            if improved:
+                break
+    return route
+
+
+def or_opt(route, matrix, segment_lengths=(1, 2, 3)):
+    """Move runs of up to three consecutive points elsewhere in the route while that makes it cheaper."""
+    route = list(route)
+    closed = route[-1] == route[0] and len(route) > 2
+    last = len(route) - 1 if closed else len(route)
+    improved = True
+    while improved:
+        improved = False
+        for length in segment_lengths:
+            for i in range(1, last - length + 1):
+                segment = route[i:i + length]
+                before, after = route[i - 1], route[i + length] if i + length < len(route) else None
+                removed = matrix[before, segment[0]]
+                if after is not None:
+                    removed += matrix[segment[-1], after] - matrix[before, after]
+                rest = route[:i] + route[i + length:]
+                for p in range(len(rest) - (1 if closed else 0)):
+                    if p == i - 1:
+                        continue  # Where the segment came from
+                    inserted = matrix[rest[p], segment[0]]
+                    if p + 1 < len(rest):
+                        inserted += matrix[segment[-1], rest[p + 1]] - matrix[rest[p], rest[p + 1]]
+                    if inserted < removed - 1e-9:
+                        route = rest[:p + 1] + segment + rest[p + 1:]
+                        improved = True
+                        break
+                if improved:
+                    break
+            if improved:
+                break
+    return route
+
+
+class TourPlanner:
+    """
+    Inspection tour from a start through every goal, in the cheapest order found.
+
+    The goal-to-goal cost matrix comes from one distance field per goal (one reverse Dijkstra each, from
+    the cache when the goal was toured before), so a tour of n goals needs n searches instead of n * n.
+    The order is a nearest-neighbour tour improved with 2-opt and Or-opt moves until neither helps, and
+    the legs are stitched by following the fields' next-step pointers.
+    """
+
+    def __init__(self, search_grid, distance_field, cache=None, closed=False):
+        """
+        :param search_grid: Compiled SearchGrid
+        :param distance_field: Function computing the DistanceField toward a list of goals
+        :param cache: Optional DistanceFieldCache to read fields from and store new fields in
+        :param closed: Return to the start after the last goal
+        """
+        self.search_grid = search_grid
+        self.distance_field = distance_field
+        self.cache = cache
+        self.closed = closed
+        self.nodes_expanded = 0
+        self.nodes_pushed = 0
+        self.max_open_size = 0
+        self.fields_computed = 0
+
+    def field(self, point):
+        """Distance field toward one point and the seconds it took, 0 when it came from the cache."""
+        started = time.perf_counter()
+        field = self.cache.lookup(self.search_grid, [point]) if self.cache is not None else None
+        if field is not None:
+            return field, 0.0
+        field = self.distance_field([point])
+        self.nodes_expanded += field.nodes_expanded
+        self.nodes_pushed += field.nodes_pushed
+        self.max_open_size = max(self.max_open_size, field.max_open_size)
+        self.fields_computed += 1
+        if self.cache is not None:
+            self.cache.put(self.search_grid, [point], field)
+        return field, time.perf_counter() - started
+
+    def plan(self, start, goals):
+        """
+        Order the goals and stitch the path.
+
+        :return: Dict with order (goal indices in visiting order), path, length, legs (from, to, length,
+                 steps and the seconds spent on the leg's field and path) and the indices of unreachable
+                 goals, which are left out of the tour
+        """
+        sg = self.search_grid
+        points = [tuple(start)] + [tuple(goal) for goal in goals]
+        fields, seconds = zip(*(self.field(point) for point in points))
+        cells = [sg.index(point) if sg.contains(point) else None for point in points]
+        # matrix[i, j]: cost from point i to point j, read from the field toward j
+        matrix = np.array([[field.cost[cell] if cell is not None else np.inf for field in fields]
+                           for cell in cells])
+
+        reachable = [0] + [i for i in range(1, len(points)) if np.isfinite(matrix[0, i]) and np.isfinite(matrix[i, 0])]
+        unreachable = [i - 1 for i in range(1, len(points)) if i not in reachable]
+        sub = matrix[np.ix_(reachable, reachable)]
+        route = or_opt(two_opt(nearest_neighbour(sub, self.closed), sub), sub)
+        route = [reachable[i] for i in route]
+
+        path, legs = [points[0]], []
+        for a, b in zip(route, route[1:]):
+            started = time.perf_counter()
+            leg = fields[b].path_from(points[a])
+            path.extend(leg[1:])
+            legs.append({'from': a - 1 if a else None, 'to': b - 1 if b else None, 'length': float(matrix[a, b]),
+                         'steps': len(leg) - 1, 'seconds': seconds[b] + time.perf_counter() - started})
+        return {
+            'order': [point - 1 for point in route[1:] if point],
+            'path': path,
+            'length': route_cost(route, matrix),
+            'legs': legs,
+            'unreachable': unreachable,
+        }
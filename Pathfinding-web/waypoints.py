@@ -0,0 +1,125 @@
+import math
+
+
+def segment_cells(a, b):
+    """
+    Grid cells touched by the straight segment between the centres of cells a and b, on one floor.
+
+    Where the segment passes exactly through a cell corner, both cells beside the corner are included,
+    so a line of sight never slips between two diagonally touching walls.
+    """
+    (x, y), (x1, y1) = a, b
+    nx, ny = abs(x1 - x), abs(y1 - y)
+    sx = (x1 > x) - (x1 < x)
+    sy = (y1 > y) - (y1 < y)
+    cells = [(x, y)]
+    ix = iy = 0
+    while ix < nx or iy < ny:
+        # Compare where the segment crosses the next row boundary and the next column boundary
+        d = (1 + 2 * ix) * ny - (1 + 2 * iy) * nx
+        if d == 0:
+            cells.append((x + sx, y))
+            cells.append((x, y + sy))
+            x += sx
+            y += sy
+            ix += 1
+            iy += 1
+        elif d < 0:
+            x += sx
+            ix += 1
+        else:
+            y += sy
+            iy += 1
+        cells.append((x, y))
+    return cells
+
+
+class WaypointCompressor:
+    """
+    Reduce a cell path to its turning waypoints, with any-angle shortcuts where there is line of sight.
+
+    From each waypoint the path is followed as far as the straight segment to a later cell stays on
+    passable cells of the buffered grid (walls and wall buffer block the view), as Theta* does for the
+    parents of a node. Floor changes always keep both stair cells as waypoints.
+
+    The next waypoint is searched with steps that double while the view holds, then by bisection
+    between the last cell in sight and the first one out of sight, so a straight stretch of n cells
+    takes O(log n) line-of-sight checks instead of one per cell.
+    """
+
+    def __init__(self, search_grid, floors=None):
+        """
+        :param search_grid: Compiled SearchGrid of the buffered grids
+        :param floors: Optional list of floor dicts with an 'elevation', to include the height climbed
+                       on stairs in the metric length
+        """
+        self.search_grid = search_grid
+        self.passable = search_grid.passable
+        self.floors = floors
+
+    def line_of_sight(self, a, b):
+        if a[2] != b[2]:
+            return False
+        sg = self.search_grid
+        z = a[2]
+        for x, y in segment_cells(a[:2], b[:2])[1:-1]:
+            if not sg.contains((x, y, z)) or not self.passable[sg.index((x, y, z))]:
+                return False
+        return True
+
+    def compress(self, path):
+        """
+        :param path: List of (x, y, z) cells as returned by the search engines
+        :return: Dict with 'waypoints', the metric 'length' in metres and per-floor 'segments'
+        """
+        path = [tuple(int(v) for v in point) for point in path] if path else []
+        # run_end[i]: index of the last cell of the stretch on the floor of path[i]
+        run_end = list(range(len(path)))
+        for i in range(len(path) - 2, -1, -1):
+            if path[i + 1][2] == path[i][2]:
+                run_end[i] = run_end[i + 1]
+        waypoints = path[:1]
+        i = 0
+        while i < len(path) - 1:
+            j = self.farthest_in_sight(path, i, run_end[i]) if run_end[i] > i else i + 1
+            waypoints.append(path[j])
+            i = j
+
+        segments = []
+        length = 0.0
+        for point in waypoints:
+            if segments and segments[-1]['floor'] == point[2]:
+                last = segments[-1]['points'][-1]
+                step = math.hypot(point[0] - last[0], point[1] - last[1]) * self.search_grid.grid_size
+                segments[-1]['length'] += step
+                length += step
+            else:
+                if segments:
+                    length += self.climb(segments[-1]['floor'], point[2])
+                segments.append({'floor': point[2], 'points': [], 'length': 0.0})
+            segments[-1]['points'].append(point)
+        return {'waypoints': waypoints, 'length': length, 'segments': segments}
+
+    def farthest_in_sight(self, path, i, end):
+        """Index of a cell of path[i + 1:end + 1] in sight of path[i] whose successor is not in sight (or end)."""
+        seen, step = i + 1, 1  # The next cell is a neighbour, always in sight
+        while seen < end:
+            probe = min(seen + step, end)
+            if not self.line_of_sight(path[i], path[probe]):
+                hidden = probe
+                break
+            seen, step = probe, step * 2
+        else:
+            return end
+        while hidden - seen > 1:
+            middle = (seen + hidden) // 2
+            if self.line_of_sight(path[i], path[middle]):
+                seen = middle
+            else:
+                hidden = middle
+        return seen
+
+    def climb(self, z0, z1):
+        if not self.floors:
+            return 0.0
+        return abs(self.floors[z1]['elevation'] - self.floors[z0]['elevation'])
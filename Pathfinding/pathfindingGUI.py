@@ -7,7 +7,6 @@ import heapq
 from matplotlib.widgets import Button, Slider, TextBox, RadioButtons, CheckButtons
 import tkinter as tk
 from tkinter.filedialog import askopenfilename
-from scipy.interpolate import griddata
 import time
 
 tk.Tk().withdraw()  # part of the import if you are not using other tkinter functions
@@ -55,7 +54,7 @@ class InteractiveBIMPathfinder:
         self.fps = 1
         self.heuristic_style = 'Min'
         self.show_heuristic = False
-        self.heuristic_resolution = 10
+        self.heuristic_maps = {}  # Heuristic overlays per goal set, floor and options
         self.allow_diagonal = True
         self.wall_buffer = 0
         self.buffered_grids = None
@@ -479,39 +478,62 @@ class InteractiveBIMPathfinder:
             return min(goal_heuristics)
 
     def calculate_sparse_heuristic(self):
-        if self.goals is None:
-            return None
-
-        floor_shape = self.grids[self.current_floor].shape
-        x = np.linspace(0, floor_shape[0] - 1, self.heuristic_resolution)
-        y = np.linspace(0, floor_shape[1] - 1, self.heuristic_resolution)
-        xx, yy = np.meshgrid(x, y)
-
-        heuristic_values = []
-        for i in range(self.heuristic_resolution):
-            for j in range(self.heuristic_resolution):
-                x_coord = int(xx[i, j])
-                y_coord = int(yy[i, j])
-                if self.grids[self.current_floor][x_coord, y_coord] != 'wall':
-                    h_value = self.heuristic((x_coord, y_coord, self.current_floor), self.goals)
-                    heuristic_values.append((x_coord, y_coord, h_value))
-
-        if not heuristic_values:
+        # The same values as heuristic() for every cell of the floor at once, kept per goal set and options
+        if not self.goals:
             return None
+        z = self.current_floor
+        key = (tuple(map(tuple, self.goals)), z, self.minimize_cost, self.heuristic_style, self.wall_buffer)
+        if key in self.heuristic_maps:
+            return self.heuristic_maps[key]
+
+        grid = self.grids[z]
+        x, y = np.indices(grid.shape)
+        walla = self.buffered_grids[z] == 'walla'
+        heuristic_map = None
+        for b in self.goals:
+            dx = np.abs(b[0] - x)
+            dy = np.abs(b[1] - y)
+            dz = abs(b[2] - z)
+            if self.minimize_cost:
+                h = np.sqrt(dx ** 2 + dy ** 2) * self.grid_size
+                if dz > 0:
+                    h += self.stair_transfer(x, y, z, b)
+            else:
+                h = np.sqrt(dx ** 2 + dy ** 2 + (dz * 3) ** 2) * self.grid_size
+            h[walla] += 10 * self.grid_size  # Add a cost for wall-adjacent cells
+            if heuristic_map is None:
+                heuristic_map = h
+            elif self.heuristic_style == 'sum':
+                heuristic_map = heuristic_map + h
+            else:
+                heuristic_map = np.minimum(heuristic_map, h)
 
-        x_sparse, y_sparse, z_sparse = zip(*heuristic_values)
-
-        grid_x, grid_y = np.mgrid[0:floor_shape[0], 0:floor_shape[1]]
-        heuristic_map = griddata((x_sparse, y_sparse), z_sparse, (grid_x, grid_y), method='cubic')
-
-        # Set walls to NaN
-        for i in range(floor_shape[0]):
-            for j in range(floor_shape[1]):
-                if self.grids[self.current_floor][i, j] == 'wall':
-                    heuristic_map[i, j] = np.nan
-
+        heuristic_map[grid == 'wall'] = np.nan
+        if len(self.heuristic_maps) >= 32:
+            self.heuristic_maps.clear()  # Dragging a goal around leaves many maps nobody looks at again
+        self.heuristic_maps[key] = heuristic_map
         return heuristic_map
 
+    def stair_transfer(self, x, y, z, goal):
+        # Detour over the nearest stair to the goal floor and the floor change penalty, as in heuristic()
+        zg = goal[2]
+        rows = min(self.grids[z].shape[0], self.grids[zg].shape[0])
+        cols = min(self.grids[z].shape[1], self.grids[zg].shape[1])
+        stairs = np.argwhere((self.grids[z][:rows, :cols] == 'stair') & (self.grids[zg][:rows, :cols] == 'stair'))
+        if len(stairs) == 0:
+            return np.full(x.shape, np.inf)
+        # Scan the stairs in row-major order keeping the first nearest one, like find_nearest_stairs
+        best = np.full(x.shape, np.inf)
+        nearest = np.zeros(x.shape + (2,), dtype=np.int64)
+        for i, j in stairs:
+            d2 = (x - i) ** 2 + (y - j) ** 2
+            closer = d2 < best
+            best[closer] = d2[closer]
+            nearest[closer] = (i, j)
+        to_stair = np.sqrt(best)
+        from_stair = np.sqrt((goal[0] - nearest[..., 0]) ** 2 + (goal[1] - nearest[..., 1]) ** 2)
+        return (to_stair + from_stair) * self.grid_size + abs(zg - z) * 3 * self.grid_size
+
     def get_neighbors(self, current):
         x, y, z = current.position
         neighbors = []